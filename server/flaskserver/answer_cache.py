@@ -0,0 +1,218 @@
+"""Semantic answer cache for /query.
+
+A question whose embedding is within ``ANSWER_CACHE_THRESHOLD`` cosine
+similarity of a previously answered one, asked against the same document
+set, gets the stored answer without retrieval or an LLM call.
+
+Entries live in Redis, grouped under a corpus version: every ingest bumps
+the version, so answers about an older document set are never served and
+expire on their own. A caller reads the version once, before retrieval, and
+passes it to both ``get`` and ``set``, so an answer built from the old
+document set is never stored under a newer version. Each worker keeps the embeddings of the current
+version in memory and catches up with entries added by other workers from
+an append-only log of entry ids, so a lookup costs a few small Redis reads
+and one matrix product. At most ``ANSWER_CACHE_MAX_ENTRIES`` answers are
+kept per version, least recently used first out, each for at most
+``ANSWER_CACHE_TTL`` seconds. Evicted ids stay in the log until it holds
+twice that many; it is then rewritten from the live entries under a new
+generation, and every worker reloads its matrix without the evicted rows.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import redis
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+
+KEY_PREFIX = "answer:"
+CORPUS_KEY = "answer:corpus_version"
+STATS_KEY = "answer:stats"
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    def __init__(self, redis_client, version, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.redis = redis_client
+        self.version = version  # prompt and retrieval settings; part of every key
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._corpus = None
+        self._generation = None
+        self._ids = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def _prefix(self, corpus):
+        return f"{KEY_PREFIX}{self.version}:{corpus}:"
+
+    def corpus_version(self):
+        """The current document set's version, or None if Redis is unavailable."""
+        try:
+            return self.redis.get(CORPUS_KEY) or "0"
+        except redis.RedisError as e:
+            logger.warning(f"Answer cache read failed: {e}")
+            return None
+
+    def invalidate(self):
+        """The document set changed: stop serving every cached answer."""
+        try:
+            self.redis.incr(CORPUS_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Answer cache invalidation failed: {e}")
+
+    def _sync(self, corpus, dimension):
+        """Load the embeddings other workers added to this corpus version since the last lookup."""
+        prefix = self._prefix(corpus)
+        with self._lock:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(prefix + "generation")
+            pipe.llen(prefix + "log")
+            generation, length = pipe.execute()
+            if corpus != self._corpus or generation != self._generation or length < len(self._ids):
+                # New document set, a compacted log, or the log expired and was started again.
+                self._corpus, self._generation, self._ids = corpus, generation, []
+                self._vectors = np.zeros((0, dimension), dtype=np.float32)
+            new_ids = self.redis.lrange(prefix + "log", len(self._ids), -1)
+            if not new_ids:
+                return
+            entries = self.redis.hmget(prefix + "entries", new_ids)
+            # Entries already evicted keep their slot in the log; a zero vector never matches.
+            rows = np.zeros((len(new_ids), dimension), dtype=np.float32)
+            for i, entry in enumerate(entries):
+                if entry:
+                    vector = json.loads(entry)["embedding"]
+                    if len(vector) == dimension:
+                        rows[i] = _unit(vector)
+            self._vectors = np.vstack([self._vectors, rows])
+            self._ids = self._ids + list(new_ids)
+
+    def get(self, embedding, corpus):
+        """Return (answer, similarity) for the closest question cached for ``corpus``, or (None, best similarity)."""
+        if corpus is None:
+            return None, None
+        try:
+            self._sync(corpus, len(embedding))
+            with self._lock:
+                ids, vectors = self._ids, self._vectors
+            if not ids:
+                self._count(misses=1)
+                return None, None
+            similarities = vectors @ _unit(embedding)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._count(misses=1)
+                return None, similarity
+            prefix = self._prefix(corpus)
+            entry = self.redis.hget(prefix + "entries", ids[best])
+            entry = json.loads(entry) if entry else None
+            if entry is None or entry["created"] + self.ttl < time.time():
+                if entry is not None:
+                    self.redis.hdel(prefix + "entries", ids[best])
+                    self.redis.zrem(prefix + "lru", ids[best])
+                with self._lock:
+                    if self._corpus == corpus and best < len(self._vectors):
+                        self._vectors[best] = 0
+                self._count(misses=1)
+                return None, similarity
+            self.redis.zadd(prefix + "lru", {ids[best]: time.time()})
+            self._count(hits=1, seconds_saved=entry["seconds"])
+            return entry["answer"], similarity
+        except redis.RedisError as e:
+            logger.warning(f"Answer cache read failed: {e}")
+            return None, None
+
+    def set(self, question, embedding, answer, seconds, corpus):
+        """Store an answer built from the ``corpus`` version that took ``seconds`` to produce."""
+        if corpus is None:
+            return
+        try:
+            prefix = self._prefix(corpus)
+            entry_id = hashlib.sha256(f"{question}\0{time.time()}".encode()).hexdigest()[:16]
+            entry = {"question": question, "embedding": [round(float(x), 6) for x in embedding],
+                     "answer": answer, "seconds": round(seconds, 4), "created": time.time()}
+            pipe = self.redis.pipeline()
+            pipe.hset(prefix + "entries", entry_id, json.dumps(entry))
+            pipe.rpush(prefix + "log", entry_id)
+            pipe.zadd(prefix + "lru", {entry_id: time.time()})
+            for key in ("entries", "log", "lru"):
+                pipe.expire(prefix + key, self.ttl)
+            pipe.zcard(prefix + "lru")
+            results = pipe.execute()
+            log_length, size = results[1], results[-1]
+            if size > self.max_entries:
+                evicted = [member for member, _ in self.redis.zpopmin(prefix + "lru", size - self.max_entries)]
+                if evicted:
+                    self.redis.hdel(prefix + "entries", *evicted)
+                    self._count(evictions=len(evicted))
+            if log_length > 2 * self.max_entries:
+                self._compact(prefix)
+            self._count(stores=1)
+        except redis.RedisError as e:
+            logger.warning(f"Answer cache write failed: {e}")
+
+    def _compact(self, prefix):
+        """Rewrite the log as the ids still in the LRU set and start a new generation."""
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(prefix + "log")
+                live = pipe.zrange(prefix + "lru", 0, -1)
+                pipe.multi()
+                pipe.delete(prefix + "log")
+                if live:
+                    pipe.rpush(prefix + "log", *live)
+                pipe.incr(prefix + "generation")
+                for key in ("log", "generation"):
+                    pipe.expire(prefix + key, self.ttl)
+                pipe.execute()
+            self._count(compactions=1)
+        except redis.WatchError:
+            pass  # another worker stored an entry meanwhile; a later store compacts
+
+    def _count(self, seconds_saved=0.0, **counters):
+        try:
+            pipe = self.redis.pipeline()
+            for name, amount in counters.items():
+                pipe.hincrby(STATS_KEY, name, amount)
+            if seconds_saved:
+                pipe.hincrbyfloat(STATS_KEY, "seconds_saved", seconds_saved)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+            corpus = self.corpus_version()
+            size = self.redis.zcard(self._prefix(corpus) + "lru")
+        except redis.RedisError:
+            return {}
+        hits, misses = int(raw.get("hits", 0)), int(raw.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "seconds_saved": round(float(raw.get("seconds_saved", 0)), 3),
+            "stores": int(raw.get("stores", 0)),
+            "evictions": int(raw.get("evictions", 0)),
+            "compactions": int(raw.get("compactions", 0)),
+            "entries": size,
+            "corpus_version": corpus,
+            "threshold": self.threshold,
+        }
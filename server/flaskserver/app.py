@@ -1,50 +1,64 @@
-from flask import Flask, request, jsonify
-from youtube_transcript_api import YouTubeTranscriptApi
+from flask import Flask, request, jsonify, Response, send_file, stream_with_context
 from youtube_transcript_api.formatters import TextFormatter
-from threading import Thread
-import pyttsx3
 import html
 from bs4 import BeautifulSoup
 from flask_cors import CORS 
 import re
 import json
-from langchain_community.llms import GPT4All  
-from langchain_groq import ChatGroq
+from llm_registry import get_llm
+from upstream import upstream_llm
+import upstream
+from streaming import stream_json, sse
+from structured import StructuredOutput, StructuredOutputError
+from youtube import parse_video_id, resolve_transcript
+from ingest import ingest_document
+from extraction import iter_pdf_pages, iter_pptx_slides
+from embedding_cache import EmbeddingCache, CachedEncoder
+import hashlib
 import os
+import tempfile
+import time
 from dotenv import load_dotenv
 load_dotenv()
 from pymongo import MongoClient
-import PyPDF2
-import google.generativeai as genai
-import io
-from google.generativeai import GenerativeModel
 import jwt
 from functools import wraps
 from werkzeug.utils import secure_filename
 import logging
-from bson.objectid import ObjectId
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-#from langchain_community.indexes import VectorstoreIndexCreator  # Commented out due to ImportError
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain.chains import RetrievalQA
-from io import BytesIO
-from PyPDF2 import PdfReader  
-from langchain.schema import Document  
-import chromadb
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
-#from langchain.document_loaders import PyPDFLoader
-from pptx import Presentation
+from embeddings import embedding_service
+from lazy import LazyResource, warm_in_background
+from tts import SpeechWorker
+import lazy
+import metrics
+from metrics import stage
 import redis
+from transcript_store import TranscriptStore
+from artifact_cache import ArtifactCache, template_version
+from jobs import JobQueue
+from singleflight import SingleFlight
+from recommendations import RecommendationCache
+import longform
+from answer_cache import AnswerCache
+from retrieval import KeywordIndex, hybrid_search, pack_context, RETRIEVAL_MODE, QUERY_CONTEXT_TOKENS
+from cleaning import TranscriptCleaner, RelevanceClassifier, LOCAL_CLEANER_VERSION, TRANSCRIPT_CLEANER
+from local_llm import LocalRouter, local_pool
 redis_client = redis.StrictRedis(host='localhost', port=6379, db=0, decode_responses=True)
+transcript_store = TranscriptStore(redis_client)
+artifact_cache = ArtifactCache(redis_client)
+job_queue = JobQueue(redis_client)
+structured_output = StructuredOutput(redis_client)
+# Concurrent identical quiz/mind map requests (e.g. a whole class opening one video) share one generation.
+single_flight = SingleFlight(redis_client)
+# Topic quizzes and short mind maps go to a local CPU model when LOCAL_LLM_ROUTES allows.
+local_router = LocalRouter(redis_client, local_pool)
 
 app = Flask(__name__)
+metrics.configure_logging()
+metrics.init_app(app)
+logger = logging.getLogger(__name__)
 SECRET_KEY = "quick" 
-mongo_client = MongoClient("mongodb://localhost:27017/quicklearnai") 
+# connect=False: the socket is opened on first use, i.e. after gunicorn forks its workers.
+mongo_client = MongoClient("mongodb://localhost:27017/quicklearnai", connect=False)
 db = mongo_client["quicklearnai"]
 topics_collection = db["statistics"]
 
@@ -59,49 +73,133 @@ CORS(app, resources={
 
 formatter = TextFormatter()
 
-def get_and_enhance_transcript(youtube_url):
+# Transcript language preference per endpoint, most preferred first.
+QUIZ_TRANSCRIPT_LANGUAGES = os.getenv("QUIZ_TRANSCRIPT_LANGUAGES", "hi,en").split(",")
+MIND_MAP_TRANSCRIPT_LANGUAGES = os.getenv("MIND_MAP_TRANSCRIPT_LANGUAGES", "en,hi").split(",")
+
+def request_flag(data, name):
+    """True when a boolean flag such as force_refresh or stream is set in the body or query string."""
+    flag = (data or {}).get(name, request.args.get(name))
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def wants_refresh(data):
+    return request_flag(data, 'force_refresh')
+
+def submit_job(name, payload):
+    """Queue a task for the worker pool and return the 202 response pointing at its status."""
     try:
-        video_id = youtube_url.split('v=')[-1]
-        transcript = None
-        language = None
+        job_id = job_queue.submit(name, payload, callback_url=payload.get('callback_url'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
 
-        try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['hi'])
-            language = 'hi'
-        except:
-            try:
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-                language = 'en'
-            except:
-                return None, None
+def event_stream(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def coalesced_events(kind, cache_params, generate, replay):
+    """Stream ``generate(flight)`` as the single-flight leader for (kind, cache_params), or replay its result.
 
-        formatted_transcript = formatter.format_transcript(transcript)
+    ``generate`` must call ``flight.finish([artifact, 200])`` when it produces the artifact;
+    ``replay(artifact)`` yields the events a follower sends before 'done'.
+    """
+    flight = single_flight.lead(kind, cache_params) if single_flight.enabled else None
+    if single_flight.enabled and flight is None:
+        yield sse('progress', {'stage': 'waiting_for_identical_request'})
+        outcome = single_flight.wait(kind, cache_params)
+        if outcome is not None:
+            if 'error' in outcome:
+                yield sse('error', {"error": outcome['error']})
+                return
+            body, status = outcome['result']
+            if status != 200:
+                yield sse('error', body)
+                return
+            yield from replay(body)
+            yield sse('done', body)
+            return
+        # The leader went away or took too long: generate it here.
+    try:
+        yield from generate(flight)
+    except GeneratorExit:
+        # The client disconnected: hand the work to a follower rather than fail every one of them.
+        if flight is not None:
+            flight.abandon()
+        raise
+    finally:
+        if flight is not None:
+            flight.fail(f"{kind} generation did not complete")  # no-op once finished or abandoned
+
+def get_transcript_entries(video_id, languages):
+    """Return (caption entries, language) in the preferred available language, via the transcript store."""
+    language = transcript_store.get_language(video_id, languages)
+    if language is not None:
+        entries = transcript_store.get_raw(video_id, language)
+        if entries is not None:
+            return entries, language
+
+    with stage('transcript_fetch'):
+        entries, language = resolve_transcript(video_id, languages)
+    if entries is None:
+        return None, None
+    transcript_store.set_raw(video_id, language, entries)
+    transcript_store.set_language(video_id, languages, language)
+    return entries, language
 
-        prompt = f"""
+# Prompt templates are versioned by their own text (template_version), so editing one
+# automatically stops cached transcripts and artifacts built from the old text being served.
+CLEANER_PROMPT = """
         Act as a transcript cleaner. Generate a new transcript with the same context and the content only covered in the given transcript. 
         If there is a revision portion, differentiate it with the actual transcript.
         Give the results in sentences line by line, not in a single line. Also check whether the transcript words have any educational content relevance or not; if not then just give output as: 'Fake transcript'.
         Transcript: {formatted_transcript}
         """
-        # apikey = os.getenv("GROQ_API_KEY")
-        llm = ChatGroq(
-            model="llama-3.3-70b-specdec",
-            temperature=0,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+# The cleaned transcript also depends on which tier is allowed to produce it.
+CLEANER_PROMPT_VERSION = template_version(CLEANER_PROMPT + LOCAL_CLEANER_VERSION + TRANSCRIPT_CLEANER)
 
+def llm_clean_transcript(formatted_transcript):
+    llm = upstream_llm()
+    if longform.is_long(formatted_transcript):
+        enhanced_transcript = longform.clean_long_transcript(llm, formatted_transcript, CLEANER_PROMPT)
+    else:
+        prompt = CLEANER_PROMPT.format(formatted_transcript=formatted_transcript)
         enhanced_transcript = llm.invoke(prompt)
+        enhanced_transcript = getattr(enhanced_transcript, 'content', str(enhanced_transcript))
+    return enhanced_transcript
+
+CLEANER_EMBEDDING_MODEL = os.getenv("CLEANER_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+transcript_cleaner = TranscriptCleaner(
+    RelevanceClassifier(embedding_service.encoder(CLEANER_EMBEDDING_MODEL)), llm_clean_transcript, redis_client)
+
+def clean_transcript(video_id, transcript, language):
+    """Clean caption entries (locally or with the LLM), reusing the cached result for the current prompt."""
+    cached = transcript_store.get_cleaned(video_id, language, CLEANER_PROMPT_VERSION)
+    if cached is not None:
+        return cached
+
+    formatted_transcript = formatter.format_transcript(transcript)
+    with stage('transcript_clean'):
+        enhanced_transcript, tier = transcript_cleaner.clean(transcript, formatted_transcript)
+    logger.info(f"Cleaned transcript for {video_id} with the {tier} cleaner")
+    transcript_store.set_cleaned(video_id, language, CLEANER_PROMPT_VERSION, enhanced_transcript)
+    return enhanced_transcript
 
-        return enhanced_transcript, language
+def get_and_enhance_transcript(youtube_url):
+    try:
+        video_id = parse_video_id(youtube_url)
+        if video_id is None:
+            return None, None
+
+        transcript, language = get_transcript_entries(video_id, QUIZ_TRANSCRIPT_LANGUAGES)
+        if transcript is None:
+            return None, None
+
+        return clean_transcript(video_id, transcript, language), language
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.error(f"Error: {str(e)}")
         return None, None
 
-def generate_summary_and_quiz(transcript, num_questions, language, difficulty):
-
-    try:
-        
-        prompt = f"""
+SUMMARY_QUIZ_PROMPT = """
      
         Summarize the following transcript by identifying the key topics covered, and provide a detailed summary of each topic in 6-7 sentences.
         Each topic should be labeled clearly as "Topic X", where X is the topic name. Provide the full summary for each topic in English, even if the transcript is in a different language.
@@ -137,30 +235,134 @@ def generate_summary_and_quiz(transcript, num_questions, language, difficulty):
 
         Transcript: {transcript}
         """
-        llm = ChatGroq(
-            model="llama-3.3-70b-specdec",
-            temperature=0,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
-        response = llm.invoke(prompt)
-        if hasattr(response, 'content'):
-            response_content = response.content
-            try:
-                print("response_content:",response_content)
-                response_dict = json.loads(response_content)
-                print("response_dict:",response_dict)
-                return response_dict
-            except json.JSONDecodeError as e:
-                print(f"JSONDecodeError: {e}")
-                return None
-        else:
-            print("Response does not have a 'content' attribute.")
-            return None
+
+def generate_summary_and_quiz(transcript, num_questions, language, difficulty):
+
+    try:
+        with stage('llm_quiz'):
+            if longform.is_long(transcript):
+                return longform.summarize_and_quiz(upstream_llm(), transcript, num_questions, difficulty)
+
+            prompt = SUMMARY_QUIZ_PROMPT.format(num_questions=num_questions, difficulty=difficulty, transcript=transcript)
+            return structured_output.generate(upstream_llm(), prompt, 'quiz')
 
     except Exception as e:
-        print(f"Error generating summary and quiz: {str(e)}")
+        logger.error(f"Error generating summary and quiz: {str(e)}")
         return None
 
+# The quiz artifact depends on the cleaned transcript as well as the summary/quiz prompt.
+QUIZ_ARTIFACT_VERSION = template_version(
+    CLEANER_PROMPT_VERSION + SUMMARY_QUIZ_PROMPT + longform.SEGMENT_QUIZ_PROMPT + longform.REDUCE_SUMMARY_PROMPT)
+
+def quiz_event(path, value):
+    """Map a completed value of the summary/quiz JSON to an SSE event, or None if it is not streamed."""
+    if len(path) == 2 and path[0] == 'summary':
+        return sse('summary', {'topic': path[1], 'text': value})
+    if len(path) == 3 and path[0] == 'questions' and isinstance(value, dict):
+        return sse('question', {'difficulty': path[1], 'index': path[2], **value})
+    return None
+
+def quiz_events(result):
+    """The summary and question events for a complete summary/quiz document."""
+    events = [quiz_event(('summary', topic), text) for topic, text in result.get('summary', {}).items()]
+    for level, questions in result.get('questions', {}).items():
+        events += [quiz_event(('questions', level, index), question) for index, question in enumerate(questions)]
+    return filter(None, events)
+
+def stream_quiz_events(youtube_link, num_questions, difficulty, cache_params, refresh):
+    """Streaming variant of /quiz: progress events, then summary topics and questions as they are generated."""
+    if not refresh:
+        cached = artifact_cache.get('quiz', QUIZ_ARTIFACT_VERSION, cache_params)
+        if cached is not None:
+            yield from quiz_events(cached)
+            yield sse('done', cached)
+            return
+
+    yield from coalesced_events('quiz', cache_params, lambda flight: generate_quiz_events(
+        youtube_link, num_questions, difficulty, cache_params, flight), quiz_events)
+
+def generate_quiz_events(youtube_link, num_questions, difficulty, cache_params, flight):
+    try:
+        video_id = parse_video_id(youtube_link)
+        transcript, language = get_transcript_entries(video_id, QUIZ_TRANSCRIPT_LANGUAGES) if video_id else (None, None)
+        if transcript is None:
+            yield sse('error', {"error": "Failed to fetch transcript"})
+            return
+        yield sse('progress', {'stage': 'transcript_fetched', 'language': language})
+
+        cleaned = clean_transcript(video_id, transcript, language)
+        yield sse('progress', {'stage': 'transcript_cleaned'})
+
+        if longform.is_long(cleaned):
+            # Segments are generated concurrently, so there is no single token stream to follow.
+            yield sse('progress', {'stage': 'long_transcript', 'segments': len(longform.split_segments(cleaned))})
+            result = longform.summarize_and_quiz(upstream_llm(), cleaned, num_questions, difficulty)
+            if result is None:
+                yield sse('error', {"error": "Failed to generate quiz"})
+                return
+            artifact_cache.set('quiz', QUIZ_ARTIFACT_VERSION, cache_params, result)
+            if flight:
+                flight.finish([result, 200])
+            yield from quiz_events(result)
+            yield sse('done', result)
+            return
+
+        prompt = SUMMARY_QUIZ_PROMPT.format(num_questions=num_questions, difficulty=difficulty, transcript=cleaned)
+        llm = upstream_llm()
+        for path, value in stream_json(llm, prompt):
+            if path == ():
+                try:
+                    value = structured_output.complete(llm, prompt, 'quiz', value)
+                except StructuredOutputError as e:
+                    yield sse('error', {"error": "Failed to generate quiz", "details": e.errors})
+                    return
+                artifact_cache.set('quiz', QUIZ_ARTIFACT_VERSION, cache_params, value)
+                if flight:
+                    flight.finish([value, 200])
+                yield sse('done', value)
+                return
+            event = quiz_event(path, value)
+            if event:
+                yield event
+    except Exception as e:
+        logger.error(f"Error streaming quiz: {str(e)}")
+        yield sse('error', {"error": str(e)})
+
+@job_queue.task('quiz')
+def quiz_task(data, job):
+    youtube_link = data.get('link')
+    num_questions = data.get('qno', 5)
+    difficulty = data.get('difficulty')
+
+    if not youtube_link:
+        return {"error": "No YouTube URL provided"}, 400
+    video_id = parse_video_id(youtube_link)
+    if video_id is None:
+        return {"error": "Invalid YouTube URL"}, 400
+
+    cache_params = {'video_id': video_id, 'qno': num_questions, 'difficulty': difficulty}
+    if not data.get('force_refresh'):
+        cached = artifact_cache.get('quiz', QUIZ_ARTIFACT_VERSION, cache_params)
+        if cached is not None:
+            return cached, 200
+
+    body, status = single_flight.do('quiz', cache_params, lambda: build_quiz(
+        youtube_link, num_questions, difficulty, cache_params, job))
+    return body, status
+
+def build_quiz(youtube_link, num_questions, difficulty, cache_params, job):
+    transcript, language = get_and_enhance_transcript(youtube_link)
+    if not transcript:
+        return [{"error": "Failed to fetch transcript"}, 404]
+    job.progress('transcript_cleaned', 50)
+
+    summary_and_quiz = generate_summary_and_quiz(transcript, num_questions, language, difficulty)
+    if not summary_and_quiz:
+        raise RuntimeError("Failed to generate quiz")
+
+    artifact_cache.set('quiz', QUIZ_ARTIFACT_VERSION, cache_params, summary_and_quiz)
+    return [summary_and_quiz, 200]
+
 @app.route('/quiz', methods=['POST', 'OPTIONS'])
 def quiz():
     if request.method == 'OPTIONS':
@@ -168,24 +370,21 @@ def quiz():
         
     data = request.json
     youtube_link = data.get('link')
-    num_questions = data.get('qno')
-    difficulty = data.get('difficulty')
 
-    if youtube_link:
-        transcript, language = get_and_enhance_transcript(youtube_link)
-        
-        if transcript:
-            summary_and_quiz = generate_summary_and_quiz(transcript, num_questions, language, difficulty)
-            
-            if summary_and_quiz: 
-                return jsonify(summary_and_quiz)
+    if youtube_link and request_flag(data, 'stream'):
+        video_id = parse_video_id(youtube_link)
+        if video_id is None:
+            return jsonify({"error": "Invalid YouTube URL"}), 400
+        num_questions = data.get('qno', 5)
+        cache_params = {'video_id': video_id, 'qno': num_questions, 'difficulty': data.get('difficulty')}
+        return event_stream(stream_quiz_events(youtube_link, num_questions, data.get('difficulty'), cache_params, wants_refresh(data)))
 
-            else:
-                return jsonify({"error": "Failed to generate quiz"}), 500
-        else:
-            return jsonify({"error": "Failed to fetch transcript"}), 404
-    else:
-        return jsonify({"error": "No YouTube URL provided"}), 400
+    payload = dict(data, force_refresh=wants_refresh(data))
+    if youtube_link and request_flag(data, 'async'):
+        return submit_job('quiz', payload)
+
+    body, status = job_queue.run('quiz', payload)
+    return jsonify(body), status
     
 
 
@@ -210,34 +409,48 @@ def validate_token_middleware():
             except jwt.ExpiredSignatureError:
                 return jsonify({"message": "Unauthorized: Token has expired"}), 401
             except jwt.InvalidTokenError as e:
-                print(f"Token decoding error: {e}")
+                logger.warning(f"Token decoding error: {e}")
                 return jsonify({"message": "Unauthorized: Invalid token"}), 401
         
         return wrapper
     return middleware
 
 
+RECOMMENDATION_PROMPT = """
+        Act as an intelligent recommendation generator. Based on the topic provided, generate a structured JSON response 
+        with an overview, recommendations, and five YouTube video URLs for the topic. Ensure the output is in strict JSON 
+        format without markdown or extra formatting. Use the following JSON structure:
+        {{
+            "topics": {{
+                "{topic}": {{
+                    "overview": "<brief overview>",
+                    "recommendations": "<recommended steps to learn>",
+                    "youtube_links": [
+                        "<video_link_1>",
+                        "<video_link_2>",
+                        "<video_link_3>",
+                        "<video_link_4>",
+                        "<video_link_5>"
+                    ]
+                }}
+            }}
+        }}
+
+        The topic is: {topic}
+        """
+
 # Function to interact with LLaMA API
-def llama_generate_recommendations(prompt):
-    try:
-        llm = ChatGroq(
-            model="llama-3.3-70b-specdec",
-            temperature=0,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
-        
-        response = llm.invoke(prompt)
-        
-        if hasattr(response, 'content'):
-            return response.content
-        else:
-            return "Error: No content in response"
-    except Exception as e:
-        return f"Error connecting to Groq API: {e}"
- 
- 
- 
-import json
+def llama_generate_recommendations(topic):
+    """Recommendations for one topic; raises StructuredOutputError if the model never produces them."""
+    result = structured_output.generate(upstream_llm(), RECOMMENDATION_PROMPT.format(topic=topic), 'recommendations')
+    topics = result["topics"]
+    if not topics:
+        raise StructuredOutputError('recommendations', ["$.topics is empty"])
+    # The model occasionally rewrites the topic name; there is only one entry either way.
+    return topics.get(topic) or next(iter(topics.values()))
+
+recommendation_cache = RecommendationCache(
+    redis_client, llama_generate_recommendations, template_version(RECOMMENDATION_PROMPT))
 
 @app.route('/getonly', methods=['GET'])
 @validate_token_middleware()
@@ -260,128 +473,78 @@ def get_recommendations():
         # Extract only topic names
         topics_list = list(topics_data.keys())
 
-        # Format recommendations prompt
-        prompt = f"""
-        Act as an intelligent recommendation generator. Based on the topics provided, generate a structured JSON response 
-        with an overview, recommendations, and five YouTube video URLs for each topic. Ensure the output is in strict JSON 
-        format without markdown or extra formatting. Use the following JSON structure:
-        {{
-            "topics": {{
-                "<topic_name>": {{
-                    "overview": "<brief overview>",
-                    "recommendations": "<recommended steps to learn>",
-                    "youtube_links": [
-                        "<video_link_1>",
-                        "<video_link_2>",
-                        "<video_link_3>",
-                        "<video_link_4>",
-                        "<video_link_5>"
-                    ]
-                }}
-            }}
-        }}
-
-        The topics are: {', '.join(topics_list)}
-        """
+        # Cached topics are served as is; only the missing ones are generated, in parallel.
+        with stage('recommendations'):
+            recommendations, errors = recommendation_cache.recommendations(topics_list)
+        if not recommendations:
+            return jsonify({"message": "Failed to generate recommendations", "details": errors}), 500
 
-        # Generate recommendations
-        recommendations_raw = llama_generate_recommendations(prompt)
-
-        # Ensure the response is valid JSON
-        try:
-            recommendations = json.loads(recommendations_raw)
-        except json.JSONDecodeError:
-            return jsonify({"message": "Failed to parse AI response as JSON", "raw_response": recommendations_raw}), 500
-
-        return jsonify({
+        body = {
             "message": "Recommendations generated successfully",
-            "recommendations": recommendations["topics"]  # Extract only relevant content
-        }), 200
+            "recommendations": recommendations
+        }
+        if errors:
+            body["failed_topics"] = list(errors)
+        return jsonify(body), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.error(f"Error: {str(e)}")
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
 
 
-import faiss 
-from sentence_transformers import SentenceTransformer
-from huggingface_hub import login
-groq_api_key = os.getenv("GROQ_API_KEY")
-groq_model_name = "llama3-8b-8192"
-login(token=os.getenv("HUGGINGFACE_TOKEN")) 
-
-groq_chat = ChatGroq(
-    groq_api_key=groq_api_key,
-    model_name=groq_model_name,
-)
-
-
-# Define the Groq system prompt
-groq_sys_prompt = ChatPromptTemplate.from_template(
-    "You are very smart at everything, you always give the best, the most accurate and most precise answers. "
-    "Answer the following questions: {user_prompt}. Add more information as per your knowledge so that user can get proper knowledge, but make sure information is correct"
-)
-import threading
-import time
+FAISS_EMBEDDING_MODEL = os.getenv("FAISS_EMBEDDING_MODEL", "multi-qa-mpnet-base-cos-v1")
+embedding_model = embedding_service.encoder(FAISS_EMBEDDING_MODEL)  # Pre-trained model for embeddings
+pdf_storage = {}
 
+def load_vector_index():
+    from vector_index import VectorIndex
+    return VectorIndex(embedding_model.get_sentence_embedding_dimension())
 
-embedding_model = SentenceTransformer('multi-qa-mpnet-base-cos-v1')  # Pre-trained model for embeddings
-dimension = embedding_model.get_sentence_embedding_dimension()
-faiss_index = faiss.IndexFlatL2(dimension) 
-metadata_store = {}
-pdf_storage = {}
+vector_index = LazyResource("vector_index", load_vector_index)
 
 def store_in_faiss(filename, text):
     chunks = [text[i:i+1000] for i in range(0, len(text), 1000)]
     embeddings = embedding_model.encode(chunks)
-    faiss_index.add(embeddings)  
-    metadata_store.update({i: filename for i in range(len(metadata_store), len(metadata_store) + len(chunks))})
-genai.configure(api_key=os.getenv("GENAI_API_KEY"))
-model = SentenceTransformer("all-MiniLM-L6-v2")
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="pdf_documents")
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+    vector_index.get().add(embeddings, filename)
 
-class TextToSpeechManager:
-    def __init__(self):
-        self.lock = threading.Lock()
-    
-    def speak(self, text):
-        try:
-            with self.lock:  # Ensure only one speech operation happens at a time
-                engine = None
-                try:
-                    engine = pyttsx3.init()
-                    engine.setProperty('rate', 150)
-                    engine.setProperty('volume', 1.0)
-                    engine.say(text)
-                    engine.runAndWait() 
-                    print("spoke")
-                    engine.startLoop(False)  # Start the event loop without blocking
-                    engine.iterate()  # Process queued commands
-                    engine.endLoop()  # End the event loop
-                    logger.info("Speech completed successfully")
-                finally:
-                    if engine:
-                        try:
-                            engine.stop()
-                        except:
-                            pass
-                        del engine
-        except Exception as e:
-            logger.error(f"Text-to-speech error: {str(e)}")
-            
-    def start_speaking(self, text):
-        """Start a new thread for speaking"""
-        thread = Thread(target=self.speak, args=(text,))
-        thread.daemon = True  # Make thread daemon so it doesn't block program exit
-        thread.start()
-        return thread
+def search_faiss(query, k=5):
+    """Return (distance, {"id", "filename", "chunk"}) for the k chunks nearest to query."""
+    return vector_index.get().search(embedding_model.encode(query), k)
+
+CHROMA_EMBEDDING_MODEL = os.getenv("CHROMA_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+model = embedding_service.encoder(CHROMA_EMBEDDING_MODEL)
+embedding_cache = EmbeddingCache()
+cached_model = CachedEncoder(model, CHROMA_EMBEDDING_MODEL, embedding_cache)
+
+def load_chroma_collection():
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    return chroma_client.get_or_create_collection(name="pdf_documents")
+
+chroma_collection = LazyResource("chroma", load_chroma_collection)
+
+def get_collection():
+    return chroma_collection.get()
 
-# Create a global instance of the TTS manager
-tts_manager = TextToSpeechManager()
+def load_keyword_index():
+    index = KeywordIndex()
+    index.backfill(get_collection())
+    return index
+
+keyword_index = LazyResource("keyword_index", load_keyword_index)
+
+# Subsystems warmed in the background at startup and reported by /ready.
+LazyResource("embeddings:chroma", lambda: embedding_service.model(CHROMA_EMBEDDING_MODEL))
+LazyResource("embeddings:faiss", lambda: embedding_service.model(FAISS_EMBEDDING_MODEL))
+LazyResource("llm:groq", lambda: get_llm("groq"))
+LazyResource("llm:gemini", lambda: get_llm("gemini", temperature=None))
+if local_router.enabled:
+    LazyResource("llm:local", local_pool.warm)
+
+# One long-lived speech worker; requests only enqueue text and never wait on audio.
+TTS_MODE = os.getenv("TTS_MODE", "speak")  # speak (on the server) | render (return audio to the client) | off
+TTS_RENDER_TIMEOUT = float(os.getenv("TTS_RENDER_TIMEOUT", 30))
+tts_manager = SpeechWorker()
 
 def clean_response(text):
     """Clean and format the LLM response."""
@@ -396,14 +559,72 @@ def speak_text(text):
     """Convert text to speech using the TTS manager."""
     tts_manager.speak(text)
 
-def extract_text_from_pdf(pdf_file):
-    reader = PdfReader(pdf_file)
-    return " ".join(page.extract_text() for page in reader.pages if page.extract_text())
+def tts_mode(data):
+    """The operator's TTS_MODE; a client may turn speech off for its request, never on."""
+    return "off" if data.get("audio") == "off" else TTS_MODE
+
+def voice_response(text, mode):
+    """Hand ``text`` to the speech worker; returns the fields /query adds to its response."""
+    if mode == "render":
+        key = tts_manager.render(text)
+        if key:
+            return {"voice_enabled": True, "audio_url": f"/audio/{key}", "status": "Audio rendering"}
+    elif mode == "speak" and tts_manager.speak(text):
+        return {"voice_enabled": True, "status": "Speech initiated"}
+    return {"voice_enabled": False, "status": "Speech skipped"}
+
+def save_upload(file, directory="./uploads"):
+    """Stream an upload to disk, hashing it on the way. Returns (path, sha256 hex digest).
+
+    The file is stored as ``<sha256><ext>``: concurrent uploads that share a
+    name never write to the same path, and identical bytes share one file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, partial_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: file.stream.read(1024 * 1024), b""):
+                digest.update(block)
+                out.write(block)
+        file_ext = os.path.splitext(secure_filename(file.filename))[-1].lower()
+        file_path = os.path.join(directory, digest.hexdigest() + file_ext)
+        os.replace(partial_path, file_path)
+    finally:
+        # Left behind only when the upload failed part-way.
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return file_path, digest.hexdigest()
+
+@job_queue.task('upload')
+def upload_task(data, job):
+    file_path = data["file_path"]
+    filename = data["filename"]
+    doc_hash = data["doc_hash"]
+    file_ext = os.path.splitext(filename)[-1].lower()
+
+    # Identical bytes were indexed before (possibly under another name): skip extraction and embedding.
+    # Documents are keyed by their content hash, so that is the doc_id.
+    existing = get_collection().get(where={"doc_id": doc_hash}, limit=1, include=["metadatas"])
+    if existing["ids"]:
+        embedding_cache.record(duplicate_documents=1)
+        source = existing["metadatas"][0]["source"]
+        return {"message": "File already indexed.", "duplicate_of": source, "chunks": 0}, 200
+
+    if file_ext == ".pdf":
+        pages, unit = iter_pdf_pages(file_path), "page"
+    elif file_ext == ".pptx":
+        pages, unit = iter_pptx_slides(file_path), "slide"
+    else:
+        return {"error": "Unsupported file format. Only PDF and PPTX are allowed."}, 400
 
-def extract_text_from_pptx(pptx_path):
-    prs = Presentation(pptx_path)
-    text = [shape.text for slide in prs.slides for shape in slide.shapes if hasattr(shape, "text")]
-    return " ".join(text)
+    with stage('ingest'):
+        chunks = ingest_document(get_collection(), cached_model, doc_hash, filename, pages, unit=unit,
+                                 keyword_index=keyword_index.get())
+    # The document set changed, so cached /query answers may be stale.
+    answer_cache.invalidate()
+    
+    return {"message": "File uploaded and processed successfully.", "chunks": chunks}, 200
 
 @app.route("/upload", methods=["POST"])
 def upload_file():
@@ -414,28 +635,19 @@ def upload_file():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), 400
     
-    file_ext = os.path.splitext(file.filename)[-1].lower()
-    file_path = os.path.join("./uploads", file.filename)
-    os.makedirs("./uploads", exist_ok=True)
-    file.save(file_path)
-    
-    try:
-        if file_ext == ".pdf":
-            content = extract_text_from_pdf(file_path)
-        elif file_ext == ".pptx":
-            content = extract_text_from_pptx(file_path)
-        else:
-            return jsonify({"error": "Unsupported file format. Only PDF and PPTX are allowed."}), 400
-        
-        existing_ids = collection.get()["ids"]
-        if existing_ids:
-            collection.delete(ids=existing_ids)
-        embedding = model.encode(content).tolist()
-        collection.add(documents=[content], embeddings=[embedding], ids=[file.filename])
-        
-        return jsonify({"message": "File uploaded and processed successfully."}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    with stage('save_upload'):
+        file_path, doc_hash = save_upload(file)
+
+    payload = {"file_path": file_path, "filename": file.filename, "doc_hash": doc_hash}
+    if request_flag(request.form, 'async'):
+        return submit_job('upload', dict(payload, callback_url=request.form.get('callback_url')))
+
+    body, status = job_queue.run('upload', payload)
+    return jsonify(body), status
+
+@app.route("/upload/stats", methods=["GET"])
+def upload_stats():
+    return jsonify(embedding_cache.stats())
 
 @app.route("/test-audio", methods=["GET"])
 def test_audio():
@@ -443,8 +655,7 @@ def test_audio():
         test_text = "This is a test of the text to speech system"
         logger.info("Testing text-to-speech with test message")
         
-        # Start speech in a new thread
-        speech_thread = tts_manager.start_speaking(test_text)
+        tts_manager.speak(test_text)
         
         return jsonify({
             "message": "Audio test initiated",
@@ -458,6 +669,20 @@ def test_audio():
             "details": str(e)
         }), 500
 
+QUERY_PROMPT = """
+        Based on the following context, please provide a clear and concise answer to the question.
+        If the answer cannot be found in the context, please say so.
+        
+        Context: {context}
+        
+        Question: {query}
+        """
+# /query has always been answered by Gemini first; Groq and the local model are its fallbacks.
+QUERY_PROVIDERS = os.getenv("QUERY_PROVIDERS", "gemini,groq,gpt4all")
+# Answers depend on the prompt, the embedding model and how context is retrieved.
+answer_cache = AnswerCache(redis_client, template_version(
+    QUERY_PROMPT + CHROMA_EMBEDDING_MODEL + RETRIEVAL_MODE + str(QUERY_CONTEXT_TOKENS)))
+
 @app.route("/query", methods=["POST"])
 def query_file():
     try:
@@ -466,31 +691,38 @@ def query_file():
         
         logger.info(f"Received query: {query}")
         
-        query_embedding = model.encode(query).tolist()
-        results = collection.query(query_embeddings=[query_embedding], n_results=3)
-        retrieved_texts = "\n".join(results["documents"][0])
-        
-        prompt = f"""
-        Based on the following context, please provide a clear and concise answer to the question.
-        If the answer cannot be found in the context, please say so.
-        
-        Context: {retrieved_texts}
-        
-        Question: {query}
-        """
+        started = time.perf_counter()
+        with stage('embed'):
+            query_embedding = model.encode(query).tolist()
+        # Read once: an upload during retrieval must not file this answer under the new document set.
+        corpus = answer_cache.corpus_version()
+        if not wants_refresh(data):
+            with stage('answer_cache'):
+                answer, similarity = answer_cache.get(query_embedding, corpus)
+            if answer is not None:
+                logger.info(f"Answer cache hit (similarity {similarity:.3f})")
+                with stage('tts'):
+                    voice = voice_response(answer, tts_mode(data))
+                return jsonify({"answer": answer, "cached": True, **voice})
+        candidates = hybrid_search(query, query_embedding, get_collection(), keyword_index.get())
+        # Only as much context as QUERY_CONTEXT_TOKENS allows, best chunks first.
+        retrieved_texts, packed, context_tokens = pack_context(candidates, QUERY_CONTEXT_TOKENS)
+        metrics.CONTEXT_TOKENS.labels(RETRIEVAL_MODE).observe(context_tokens)
+        logger.info(f"Packed {len(packed)} of {len(candidates)} chunks ({context_tokens} tokens)")
         
-        response = genai.GenerativeModel("gemini-1.5-flash").generate_content(prompt)
-        cleaned_response = clean_response(response.text)
+        prompt = QUERY_PROMPT.format(context=retrieved_texts, query=query)
         
-        # Add a small delay before starting new speech
-        time.sleep(0.1)  # 100ms delay
-        
-        speech_thread = tts_manager.start_speaking(cleaned_response)
+        with stage('llm_answer'):
+            response = upstream_llm(QUERY_PROVIDERS, temperature=None).generate_content(prompt)
+        with stage('clean_response'):
+            cleaned_response = clean_response(response.text)
+        answer_cache.set(query, query_embedding, cleaned_response, time.perf_counter() - started, corpus)
+        with stage('tts'):
+            voice = voice_response(cleaned_response, tts_mode(data))
         
         return jsonify({
             "answer": cleaned_response,
-            "voice_enabled": True,
-            "status": "Speech initiated"
+            **voice,
         })
         
     except Exception as e:
@@ -502,6 +734,24 @@ def query_file():
             "voice_enabled": False
         }), 500
 
+@app.route("/query/stats", methods=["GET"])
+def query_stats():
+    return jsonify(answer_cache.stats())
+
+@app.route("/audio/<key>", methods=["GET"])
+def get_audio(key):
+    """Rendered speech for a /query answer; waits briefly if it is still being synthesized."""
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        return jsonify({"error": "Invalid audio key"}), 400
+    path = tts_manager.wait(key, timeout=TTS_RENDER_TIMEOUT)
+    if path is None:
+        return jsonify({"error": "Audio not found or not ready"}), 404
+    return send_file(os.path.abspath(path), mimetype="audio/wav", max_age=86400)
+
+@app.route("/audio/stats", methods=["GET"])
+def audio_stats():
+    return jsonify({**tts_manager.stats, "queue_depth": tts_manager.queue_depth(), "mode": TTS_MODE})
+
 
 # # Configure text-to-speech settings (optional)
 # @app.route("/configure-voice", methods=["POST"])
@@ -553,14 +803,17 @@ def query_file():
 
 def fetch_youtube_transcript(video_url):
     try:
-        video_id = video_url.split("v=")[-1]
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'hi'])
+        video_id = parse_video_id(video_url)
+        if video_id is None:
+            raise ValueError(f"Invalid YouTube URL: {video_url}")
+        transcript, _ = get_transcript_entries(video_id, MIND_MAP_TRANSCRIPT_LANGUAGES)
+        if transcript is None:
+            raise ValueError(f"No transcript available for video {video_id}")
         return " ".join([entry["text"] for entry in transcript])  # Clean transcript
     except Exception as e:
         return {"error": f"Error fetching transcript: {str(e)}"}
 
-def generate_mind_map(content):
-    prompt = f"""
+MIND_MAP_PROMPT = """
     Extract key concepts from the following text and structure them into a JSON-based mind map.
     Organize it into: "Topic" -> "Subtopics" -> "Details".
 
@@ -575,52 +828,117 @@ def generate_mind_map(content):
         ]
     }}
     """
+MIND_MAP_VERSION = template_version(MIND_MAP_PROMPT)
 
-    llm = ChatGroq(
-        model="llama-3.3-70b-specdec",
-        temperature=0,
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-    )      
-
-    response = llm.invoke(prompt)
-
-    # Ensure response is a string
-    raw_json = response.content.strip() if hasattr(response, "content") else str(response)
-
-    # Remove unwanted formatting (like triple backticks and newlines)
-    cleaned_json_str = raw_json.replace("```json", "").replace("```", "").replace("\n", "").strip()
-
-    # Convert to valid JSON
+def generate_mind_map(content):
+    prompt = MIND_MAP_PROMPT.format(content=content)
     try:
-        return json.loads(cleaned_json_str)
-    except json.JSONDecodeError:
-        return {"error": f"Invalid JSON response: {cleaned_json_str}"}
+        with stage('llm_mind_map'):
+            return local_router.generate(structured_output, prompt, 'mind_map', upstream_llm())
+    except StructuredOutputError as e:
+        return {"error": f"Invalid JSON response: {e.raw}", "details": e.errors}
+
+def stream_mind_map_events(video_url, cache_params, refresh):
+    """Streaming variant of /generate_mind_map: the main topic, then each subtopic as it is generated."""
+    if not refresh:
+        cached = artifact_cache.get('mind_map', MIND_MAP_VERSION, cache_params)
+        if cached is not None:
+            yield sse('done', cached)
+            return
+
+    yield from coalesced_events('mind_map', cache_params, lambda flight: generate_mind_map_events(
+        video_url, cache_params, flight), lambda mind_map: ())
+
+def generate_mind_map_events(video_url, cache_params, flight):
+    try:
+        transcript = fetch_youtube_transcript(video_url)
+        if isinstance(transcript, dict) and "error" in transcript:
+            yield sse('error', transcript)
+            return
+        yield sse('progress', {'stage': 'transcript_fetched'})
+
+        prompt = MIND_MAP_PROMPT.format(content=transcript)
+        if local_router.accepts('mind_map', prompt):
+            # The local model answers in one piece, so the whole map is sent at once.
+            value = local_router.generate_local(structured_output, prompt, 'mind_map')
+            if value is not None:
+                artifact_cache.set('mind_map', MIND_MAP_VERSION, cache_params, value)
+                if flight:
+                    flight.finish([value, 200])
+                yield sse('done', value)
+                return
+
+        llm = upstream_llm()
+        started = time.perf_counter()
+        for path, value in stream_json(llm, prompt):
+            if path == ('topic',):
+                yield sse('topic', {'topic': value})
+            elif len(path) == 2 and path[0] == 'subtopics':
+                yield sse('subtopic', {'index': path[1], **value} if isinstance(value, dict) else {'index': path[1]})
+            elif path == ():
+                try:
+                    value = structured_output.complete(llm, prompt, 'mind_map', value)
+                except StructuredOutputError as e:
+                    yield sse('error', {"error": "Invalid JSON response", "details": e.errors})
+                    return
+                local_router.record('mind_map', 'hosted', time.perf_counter() - started)
+                artifact_cache.set('mind_map', MIND_MAP_VERSION, cache_params, value)
+                if flight:
+                    flight.finish([value, 200])
+                yield sse('done', value)
+                return
+    except Exception as e:
+        logger.error(f"Error streaming mind map: {str(e)}")
+        yield sse('error', {"error": str(e)})
+
+@job_queue.task('mind_map')
+def mind_map_task(data, job):
+    video_url = data['video_url']
+    video_id = parse_video_id(video_url)
+    if video_id is None:
+        return {"error": "Invalid YouTube URL"}, 400
+    cache_params = {'video_id': video_id}
+    if not data.get('force_refresh'):
+        cached = artifact_cache.get('mind_map', MIND_MAP_VERSION, cache_params)
+        if cached is not None:
+            return cached, 200
+
+    body, status = single_flight.do('mind_map', cache_params, lambda: build_mind_map(video_url, cache_params, job))
+    return body, status
+
+def build_mind_map(video_url, cache_params, job):
+    transcript = fetch_youtube_transcript(video_url)
+    if isinstance(transcript, dict) and "error" in transcript:
+        return [transcript, 400]
+    job.progress('transcript_fetched', 50)
+
+    mind_map = generate_mind_map(transcript)
+    if "error" not in mind_map:
+        artifact_cache.set('mind_map', MIND_MAP_VERSION, cache_params, mind_map)
+    return [mind_map, 200]
 
 @app.route("/generate_mind_map", methods=['GET'])
 def generate_mind_map_endpoint():
-    print("✅ Endpoint called!")  # Debugging
     video_url = request.args.get('video_url')
 
     if not video_url:
         return jsonify({"error": "No video URL provided"}), 400
 
-    transcript = fetch_youtube_transcript(video_url)
-    if isinstance(transcript, dict) and "error" in transcript:
-        return jsonify(transcript), 400
+    if request_flag(request.args, 'stream'):
+        video_id = parse_video_id(video_url)
+        if video_id is None:
+            return jsonify({"error": "Invalid YouTube URL"}), 400
+        cache_params = {'video_id': video_id}
+        return event_stream(stream_mind_map_events(video_url, cache_params, wants_refresh(request.args)))
 
-    mind_map = generate_mind_map(transcript)
-   
-    return jsonify(mind_map)
+    payload = {'video_url': video_url, 'force_refresh': wants_refresh(request.args)}
+    if request_flag(request.args, 'async'):
+        return submit_job('mind_map', dict(payload, callback_url=request.args.get('callback_url')))
 
-llm = ChatGroq(
-    model="llama-3.3-70b-specdec",
-    temperature=0,
-    groq_api_key=os.getenv("GROQ_API_KEY"),
-)
+    body, status = job_queue.run('mind_map', payload)
+    return jsonify(body), status
 
-def generate_quiz(topic: str, num_questions: int, difficulty: str):
-    """Generate a quiz based on the given topic."""
-    prompt = f"""
+TOPIC_QUIZ_PROMPT = """
     Create a quiz on the topic: "{topic}". Generate {num_questions} multiple-choice questions.
     The questions should be of {difficulty} difficulty.
     Format the output strictly in JSON format as follows:
@@ -638,103 +956,113 @@ def generate_quiz(topic: str, num_questions: int, difficulty: str):
         }}
     }}
     """
-    response = llm.invoke(prompt)
-    return response.content if hasattr(response, 'content') else response.text
+TOPIC_QUIZ_VERSION = template_version(TOPIC_QUIZ_PROMPT)
+
+def generate_quiz(topic: str, num_questions: int, difficulty: str):
+    """Generate a quiz based on the given topic."""
+    prompt = TOPIC_QUIZ_PROMPT.format(topic=topic, num_questions=num_questions, difficulty=difficulty)
+    with stage('llm_quiz'):
+        return local_router.generate(structured_output, prompt, 'topic_quiz', upstream_llm())
 
 @app.route("/llm_quiz", methods=["POST"])
 def quiz_endpoint():
     data = request.json
     topic = data.get("topic")
-    num_questions = data.get("num_questions")
-    difficulty = data.get("difficulty")
+    num_questions = data.get("num_questions", 5)
+    difficulty = data.get("difficulty", "medium").lower()
+    logger.info(f"Topic: {topic} num_questions: {num_questions} difficulty: {difficulty}")
     
     if not topic:
         return jsonify({"error": "Topic is required"}), 400
+
+    cache_params = {'topic': topic, 'num_questions': num_questions, 'difficulty': difficulty}
+    if not wants_refresh(data):
+        cached = artifact_cache.get('llm_quiz', TOPIC_QUIZ_VERSION, cache_params)
+        if cached is not None:
+            return jsonify(cached)
     
     try:
-        response_content = generate_quiz(topic, num_questions, difficulty)
-
-        
         try:
-            result = json.loads(response_content)
-        except json.JSONDecodeError:
-            json_start = response_content.find('{')
-            json_end = response_content.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = response_content[json_start:json_end]
-                result = json.loads(json_str)
-            else:
-                return jsonify({"error": "Could not parse JSON from response"}), 500
-        
+            result = generate_quiz(topic, num_questions, difficulty)
+        except StructuredOutputError as e:
+            return jsonify({"error": "Could not parse JSON from response", "details": e.errors}), 500
+
+        artifact_cache.set('llm_quiz', TOPIC_QUIZ_VERSION, cache_params, result)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+ARTIFACT_VERSIONS = {
+    'quiz': QUIZ_ARTIFACT_VERSION,
+    'mind_map': MIND_MAP_VERSION,
+    'llm_quiz': TOPIC_QUIZ_VERSION,
+}
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"versions": ARTIFACT_VERSIONS, "stats": artifact_cache.stats()})
 
+@app.route('/structured/stats', methods=['GET'])
+def structured_stats():
+    return jsonify(structured_output.stats())
 
-llm = ChatGroq(
-    model="llama-3.3-70b-specdec",
-    temperature=0,
-    groq_api_key=os.getenv("GROQ_API_KEY")
-)
+@app.route('/upstream/stats', methods=['GET'])
+def upstream_stats():
+    return jsonify(upstream.stats())
 
-def generate_quiz(topic: str, num_questions: int, difficulty: str):
-    """Generate a quiz based on the given topic."""
-    prompt = f"""
-    Create a quiz on the topic: "{topic}". Generate {num_questions} multiple-choice questions.
-    The questions should be of {difficulty} difficulty.
-    Format the output strictly in JSON format as follows:
-    
-    {{
-       
-        "questions": {{
-            "{difficulty}": [
-                {{
-                    "question": "What is ...?",
-                    "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-                    "answer": "Option 1"
-                }}
-            ]
-        }}
-    }}
-    """
-    response = llm.invoke(prompt)
-    return response.content if hasattr(response, 'content') else response.text
+@app.route('/local/stats', methods=['GET'])
+def local_stats():
+    return jsonify(local_router.stats())
 
-@app.route("/llm_quiz", methods=["POST"])
-def quiz_endpoint():
-    data = request.json
-    topic = data.get("topic")
-    num_questions = data.get("num_questions", 5)
-    difficulty = data.get("difficulty", "medium").lower()
-    print("Topic:", topic,"num_questions:",num_questions,"difficulty:",difficulty)
-    
-    if not topic:
-        return jsonify({"error": "Topic is required"}), 400
-    
-    try:
-        response_content = generate_quiz(topic, num_questions, difficulty)
-        
-        try:
-            result = json.loads(response_content)
-        except json.JSONDecodeError:
-            json_start = response_content.find('{')
-            json_end = response_content.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = response_content[json_start:json_end]
-                result = json.loads(json_str)
-            else:
-                return jsonify({"error": "Could not parse JSON from response"}), 500
-        
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route('/singleflight/stats', methods=['GET'])
+def singleflight_stats():
+    return jsonify(single_flight.stats())
+
+@app.route('/cleaner/stats', methods=['GET'])
+def cleaner_stats():
+    return jsonify(transcript_cleaner.stats())
+
+@app.route('/cache/invalidate', methods=['POST'])
+@validate_token_middleware()
+def cache_invalidate():
+    data = request.json or {}
+    kind = data.get('kind')
+    if kind not in ARTIFACT_VERSIONS:
+        return jsonify({"error": f"Unknown artifact kind: {kind}"}), 400
+
+    params = data.get('params')
+    version = ARTIFACT_VERSIONS[kind] if params is not None else None
+    removed = artifact_cache.invalidate(kind, version=version, params=params)
+    return jsonify({"message": "Cache invalidated", "removed": removed})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not job_queue.cancel(job_id):
+        return jsonify({"error": "Job not found or already finished"}), 404
+    return jsonify({"job_id": job_id, "status": "cancel_requested"})
 
 @app.route('/', methods=['GET'])
 def health():
     return jsonify({"status": "ok"}) 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: which lazily loaded subsystems are warm. 503 until all of them are."""
+    subsystems = lazy.status()
+    is_ready = all(s["ready"] for s in subsystems.values())
+    return jsonify({"ready": is_ready, "subsystems": subsystems}), 200 if is_ready else 503
+
 if __name__ == '__main__':
+    # Heavy models and clients load on first use; warm them while the server starts listening.
+    # Under the debug reloader only the serving child (WERKZEUG_RUN_MAIN) warms up.
+    if os.getenv("WARMUP", "1") == "1" and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_in_background()
     app.run(debug=True, port=5001)
     
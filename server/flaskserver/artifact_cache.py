@@ -0,0 +1,113 @@
+"""Result cache for generated artifacts (quizzes, summaries, mind maps).
+
+Entries are keyed by the artifact kind, the version of the prompt template
+that produced them and a fingerprint of the normalized request parameters.
+Template versions are derived from the template text itself, so editing a
+prompt automatically stops old entries from being served.
+
+There is deliberately no in-process tier: explicit invalidation has to take
+effect in every worker at once, and Redis is the only place they all share.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_TTL = int(os.getenv("ARTIFACT_CACHE_TTL", 24 * 3600))
+
+KEY_PREFIX = "artifact:"
+STATS_KEY = "artifact:stats"
+
+
+def template_version(template):
+    """Short, stable version id for a prompt template."""
+    return hashlib.sha256(template.encode()).hexdigest()[:12]
+
+
+# Free-text parameters whose case does not change the artifact. Everything else,
+# video ids in particular (YouTube ids are case-sensitive), keeps its case.
+CASE_INSENSITIVE_PARAMS = {"topic", "difficulty"}
+
+
+def _normalize(value, fold_case=False):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.lower() if fold_case else value
+    if isinstance(value, dict):
+        return {k: _normalize(v, k in CASE_INSENSITIVE_PARAMS) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v, fold_case) for v in value]
+    return value
+
+
+def fingerprint(params):
+    """Hash of the normalized request parameters. '5' and 5 fingerprint the same, as do 'Calculus' and 'calculus'."""
+    normalized = _normalize(params)
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, redis_client, ttl=ARTIFACT_TTL):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    def key(self, kind, version, params):
+        return f"{KEY_PREFIX}{kind}:{version}:{fingerprint(params)}"
+
+    def get(self, kind, version, params):
+        key = self.key(kind, version, params)
+        payload = None
+        try:
+            payload = self.redis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Artifact cache read failed: {e}")
+        self._count(kind, "hits" if payload is not None else "misses")
+        return json.loads(payload) if payload is not None else None
+
+    def set(self, kind, version, params, artifact):
+        key = self.key(kind, version, params)
+        try:
+            self.redis.set(key, json.dumps(artifact), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Artifact cache write failed: {e}")
+
+    def invalidate(self, kind, version=None, params=None):
+        """Drop one entry, or every entry of a kind (optionally of one template version)."""
+        if params is not None and version is not None:
+            keys = [self.key(kind, version, params)]
+        else:
+            pattern = f"{KEY_PREFIX}{kind}:{version or '*'}:*"
+            try:
+                keys = list(self.redis.scan_iter(match=pattern, count=500))
+            except redis.RedisError as e:
+                logger.warning(f"Artifact cache invalidation failed: {e}")
+                keys = []
+        if keys:
+            try:
+                self.redis.delete(*keys)
+            except redis.RedisError as e:
+                logger.warning(f"Artifact cache invalidation failed: {e}")
+        return len(keys)
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {}
+        stats = {}
+        for field, count in raw.items():
+            kind, counter = field.rsplit(":", 1)
+            stats.setdefault(kind, {"hits": 0, "misses": 0})[counter] = int(count)
+        return stats
+
+    def _count(self, kind, counter):
+        try:
+            self.redis.hincrby(STATS_KEY, f"{kind}:{counter}", 1)
+        except redis.RedisError:
+            pass
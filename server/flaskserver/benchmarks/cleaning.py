@@ -0,0 +1,120 @@
+"""The transcript cleaning tiers (cleaning.py) on labelled fixture transcripts.
+
+    cd server/flaskserver
+    python -m benchmarks.cleaning
+    python -m benchmarks.cleaning -n 20 --minutes 10 --min-confidence 0.1
+    python -m benchmarks.cleaning --encoder all-MiniLM-L6-v2
+
+Every fixture transcript (fixtures.labelled_transcript: lectures, off-topic
+vlogs and lectures with sponsor breaks, all with caption noise) is cleaned
+by each TRANSCRIPT_CLEANER mode, ``llm``, ``local`` and ``auto``, through the
+app's own LLM cleaning prompt. The LLM is a fake that calls a transcript
+fake when most of its words are off-topic, so the ``llm`` verdicts are the
+reference. The relevance check embeds with fakes.WordHashEncoder, a
+bag-of-words stand-in; pass ``--encoder`` to load a sentence-transformers
+model instead.
+
+Reported per mode: latency percentiles per transcript, LLM calls and
+tokens, the transcripts each tier served, and the share of verdicts
+(educational or fake) that agree with the ``llm`` mode, overall and per
+kind of transcript.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+MODES = ("llm", "local", "auto")
+
+
+def run_mode(app_module, mode, transcripts, classifier, fake, args):
+    from cleaning import TranscriptCleaner, _verdict
+
+    app_module.redis_client.flushall()
+    cleaner = TranscriptCleaner(classifier, app_module.llm_clean_transcript, app_module.redis_client, mode=mode,
+                                min_confidence=args.min_confidence, shadow_rate=0.0)
+    calls = fake.calls
+    latencies, verdicts = [], []
+    for _, entries in transcripts:
+        started = time.perf_counter()
+        cleaned, _ = cleaner.clean(entries, app_module.formatter.format_transcript(entries))
+        latencies.append((time.perf_counter() - started) * 1000)
+        verdicts.append(_verdict(cleaned))
+    tiers = cleaner.stats()["tiers"]
+    return verdicts, {
+        "mode": mode,
+        "transcripts": len(transcripts),
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 1) for p in ("p50", "p95")},
+        "llm_calls": fake.calls - calls,
+        "llm_tokens": tiers["llm"]["tokens"],
+        "served": {"local": tiers["local"]["count"], "llm": tiers["llm"]["count"],
+                   "local_fallback": tiers["local_fallback"]["count"]},
+    }
+
+
+def agreement(verdicts, reference, kinds, kind=None):
+    pairs = [(v, r) for v, r, k in zip(verdicts, reference, kinds) if kind in (None, k)]
+    return round(sum(v == r for v, r in pairs) / len(pairs), 3) if pairs else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--transcripts", type=int, default=5, help="transcripts of each kind")
+    parser.add_argument("--minutes", type=int, default=2, help="length of every fixture transcript")
+    parser.add_argument("--min-confidence", type=float, default=0.05, help="CLEANER_MIN_CONFIDENCE for auto")
+    parser.add_argument("--encoder", help="a sentence-transformers model (default: fakes.WordHashEncoder)")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/cleaning-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("cleaning-%Y%m%d-%H%M%S") + ".json"))
+    os.chdir(tempfile.mkdtemp(prefix="quicklearn-cleaning-"))
+    os.environ.setdefault("TTS_MODE", "off")
+
+    if args.encoder:
+        # Loaded before fakes.install replaces the sentence_transformers module.
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(args.encoder)
+    else:
+        encoder = fakes.WordHashEncoder("word-hash")
+    fake = fakes.install(llm_latency=0.3, tokens_per_second=1000.0)
+    import app as app_module
+    from cleaning import RelevanceClassifier
+    fakes.patch_app(app_module)
+    import logging
+    logging.getLogger().setLevel(logging.ERROR)
+
+    transcripts = [(kind, fixtures.labelled_transcript(kind, n, args.minutes))
+                   for kind in fixtures.TRANSCRIPT_KINDS for n in range(args.transcripts)]
+    kinds = [kind for kind, _ in transcripts]
+    classifier = RelevanceClassifier(encoder)
+
+    results, reference = [], None
+    for mode in MODES:
+        verdicts, result = run_mode(app_module, mode, transcripts, classifier, fake, args)
+        reference = reference or verdicts
+        result["agreement"] = agreement(verdicts, reference, kinds)
+        result["agreement_by_kind"] = {kind: agreement(verdicts, reference, kinds, kind)
+                                       for kind in fixtures.TRANSCRIPT_KINDS}
+        results.append(result)
+        print(f"{mode:<6} p50 {result['latency_ms']['p50']:>8}  p95 {result['latency_ms']['p95']:>8} ms  "
+              f"LLM calls {result['llm_calls']:>3}  tokens {result['llm_tokens']:>7}  served {result['served']}  "
+              f"agreement {result['agreement']} {result['agreement_by_kind']}", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"encoder": args.encoder or "word-hash", "minutes": args.minutes,
+                   "min_confidence": args.min_confidence, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Cross-request embedding batching (embeddings.MicroBatcher) against direct encode calls.
+
+    cd server/flaskserver
+    python -m benchmarks.embeddings
+    python -m benchmarks.embeddings -c 1,8,32 --batches 16,64 --waits 0,2,5,10,20 --seconds 3
+    python -m benchmarks.embeddings --call-ms 15 --text-ms 1      # a slower CPU model
+
+Every client embeds one short query at a time, back to back, as /query
+does. The model is fakes.FakeDeviceEncoder: one call at a time, each
+costing a fixed overhead (``--call-ms``) plus a per-text cost
+(``--text-ms``). The defaults approximate all-MiniLM-L6-v2 on a CPU. Each
+``EMBED_MAX_BATCH`` x ``EMBED_MAX_WAIT_MS`` setting is compared with
+``direct``, where every request calls the model itself (before the
+embedding service).
+
+Reported per setting and concurrency: queries/sec, latency percentiles and
+the mean number of texts per model call.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+
+def run(encode, model, concurrency, seconds):
+    calls, texts = model.calls, model.texts
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        mine, i = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            encode([f"What is question {n}-{i}?"])
+            mine.append((time.perf_counter() - started) * 1000)
+            i += 1
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    calls = model.calls - calls
+    return {
+        "concurrency": concurrency,
+        "qps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 2) for p in ("p50", "p95")},
+        "texts_per_call": round((model.texts - texts) / calls, 2) if calls else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--batches", default="16,64", help="EMBED_MAX_BATCH values")
+    parser.add_argument("--waits", default="0,2,5,10,20", help="EMBED_MAX_WAIT_MS values")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of every run")
+    parser.add_argument("--call-ms", type=float, default=4.0, help="fixed cost of one model call")
+    parser.add_argument("--text-ms", type=float, default=0.5, help="cost per text in a call")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/embeddings-<time>.json)")
+    args = parser.parse_args()
+
+    from embeddings import MicroBatcher
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("embeddings-%Y%m%d-%H%M%S") + ".json"))
+    levels = [int(c) for c in args.concurrency.split(",")]
+    model = fakes.FakeDeviceEncoder("fake", call_seconds=args.call_ms / 1000, text_seconds=args.text_ms / 1000)
+
+    settings = [("direct", None, None, model.encode)]
+    for max_batch in (int(b) for b in args.batches.split(",")):
+        for max_wait in (float(w) for w in args.waits.split(",")):
+            batcher = MicroBatcher(model, max_batch=max_batch, max_wait_ms=max_wait)
+            settings.append((f"batch={max_batch} wait={max_wait:g}ms", max_batch, max_wait,
+                             lambda texts, batcher=batcher: batcher.submit(texts).result()))
+
+    results = []
+    for name, max_batch, max_wait, encode in settings:
+        for concurrency in levels:
+            result = dict(run(encode, model, concurrency, args.seconds), setting=name, max_batch=max_batch,
+                          max_wait_ms=max_wait)
+            results.append(result)
+            print(f"{name:<22} c={concurrency:<3} {result['qps']:>8} q/s  p50 {result['latency_ms']['p50']:>7} ms  "
+                  f"p95 {result['latency_ms']['p95']:>7} ms  texts/call {result['texts_per_call']}", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"call_ms": args.call_ms, "text_ms": args.text_ms, "seconds": args.seconds,
+                   "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Deterministic local stand-ins for every external service the app calls.
+
+``install()`` must run before ``app`` is imported: it swaps Redis for
+fakeredis, MongoDB for mongomock and SentenceTransformer for a hashing
+encoder, and routes LLM clients to ``FakeLLM``. ``patch_app(app)`` then
+points YouTube transcripts at the fixtures and Chroma at an in-process
+ephemeral client.
+"""
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+
+from benchmarks import fixtures
+
+CHARS_PER_TOKEN = 4
+
+
+class FakeResponse:
+    def __init__(self, text, input_tokens, output_tokens):
+        self.content = text
+        self.text = text
+        self.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                               "total_tokens": input_tokens + output_tokens}
+
+
+class RateLimitError(Exception):
+    """What a provider SDK raises for HTTP 429."""
+
+    status_code = 429
+
+
+class FakeLLM:
+    """Answers every prompt the app sends with a well-formed canned reply.
+
+    A call takes ``latency`` seconds plus ``output tokens / tokens_per_second``,
+    like a hosted model with a fixed time-to-first-token and decode rate; a
+    CPU model also pays ``input tokens / prompt_tokens_per_second`` to read
+    the prompt. Faults can be injected: a ``tail_rate`` fraction of calls
+    take ``tail_latency`` longer, and calls beyond ``max_concurrency`` in
+    flight (or an ``error_rate`` fraction of all calls) fail with a 429.
+    Weaker models can be imitated too: a ``malformed_rate`` fraction of
+    replies break the schema, a ``sloppy_rate`` fraction are valid but wrong
+    (a missing question, an answer that is not an option, too few subtopics).
+    """
+
+    def __init__(self, latency=0.2, tokens_per_second=500.0, tail_rate=0.0, tail_latency=0.0,
+                 max_concurrency=None, error_rate=0.0, seed=0, prompt_tokens_per_second=None,
+                 malformed_rate=0.0, sloppy_rate=0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.malformed_rate = malformed_rate
+        self.sloppy_rate = sloppy_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.max_concurrency = max_concurrency
+        self.error_rate = error_rate
+        self.calls = 0  # upstream calls, for scenarios that should make fewer of them
+        self.rejected = 0
+        self.inflight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            limited = self.max_concurrency is not None and self.inflight >= self.max_concurrency
+            if limited or self._random.random() < self.error_rate:
+                self.rejected += 1
+                raise RateLimitError("Rate limit reached (429)")
+            self.inflight += 1
+            return self.latency + (self.tail_latency if self._random.random() < self.tail_rate else 0.0)
+
+    def _done(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def reply(self, prompt):
+        if "transcript cleaner" in prompt:
+            transcript = prompt.split("Transcript:", 1)[-1].strip()
+            return transcript if fixtures.is_educational(transcript) else "Fake transcript"
+        if "Part summaries" in prompt:
+            return json.dumps({"summary": {"Overview": fixtures.SENTENCE * 6}})
+        part = re.search(r"part (\d+) of (\d+)", prompt)
+        if part:
+            n = int(re.search(r"create (\d+) multiple-choice", prompt).group(1))
+            return json.dumps({"summary": {f"Part {part.group(1)}": fixtures.SENTENCE * 3},
+                               "questions": fixtures.questions(n, prefix=f"Part {part.group(1)}")})
+        if "Summarize the following transcript" in prompt:
+            n = int(re.search(r"create a quiz with (\d+)", prompt).group(1))
+            difficulty = re.search(r"Only generate (\w+) difficulty", prompt).group(1)
+            return json.dumps({"summary": {f"Topic {i}": fixtures.SENTENCE * 6 for i in range(1, 4)},
+                               "questions": {difficulty: fixtures.questions(n)}})
+        if "Create a quiz on the topic" in prompt:
+            n = int(re.search(r"Generate (\d+) multiple-choice", prompt).group(1))
+            difficulty = re.search(r"of (\w+) difficulty", prompt).group(1)
+            return json.dumps({"questions": {difficulty: fixtures.questions(n)}})
+        if "mind map" in prompt:
+            return json.dumps({"topic": "Lecture", "subtopics": [
+                {"name": f"Subtopic {i}", "details": [fixtures.SENTENCE, fixtures.SENTENCE]} for i in range(1, 6)]})
+        if "recommendation generator" in prompt:
+            topic = prompt.rsplit("The topic is:", 1)[-1].strip()
+            return json.dumps({"topics": {topic: {
+                "overview": fixtures.SENTENCE * 2, "recommendations": fixtures.SENTENCE * 2,
+                "youtube_links": [f"https://www.youtube.com/watch?v=bench{i:05d}" for i in range(5)]}}})
+        if "Based on the following context" in prompt:
+            return fixtures.SENTENCE * 3
+        return "{}"
+
+    def _degrade(self, text):
+        with self._lock:
+            roll = self._random.random()
+        if roll >= self.malformed_rate + self.sloppy_rate or not text.startswith("{"):
+            return text
+        document = json.loads(text)
+        malformed = roll < self.malformed_rate
+        questions = document.get("questions")
+        if isinstance(questions, dict) and questions:
+            items = next(iter(questions.values()))
+            if items and malformed:
+                del items[0]["answer"]
+            elif items:
+                items.pop()
+                if items:
+                    items[0]["answer"] = "None of the above"
+        elif document.get("subtopics"):
+            if malformed:
+                del document["subtopics"][0]["details"]
+            else:
+                del document["subtopics"][2:]
+        return json.dumps(document)
+
+    def _respond(self, prompt):
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        text = self._degrade(self.reply(prompt))
+        input_tokens, output_tokens = len(prompt) // CHARS_PER_TOKEN, len(text) // CHARS_PER_TOKEN
+        return text, input_tokens, output_tokens
+
+    def _prefill(self, input_tokens):
+        return input_tokens / self.prompt_tokens_per_second if self.prompt_tokens_per_second else 0.0
+
+    def invoke(self, prompt, **kwargs):
+        latency = self._admit()
+        try:
+            text, input_tokens, output_tokens = self._respond(prompt)
+            time.sleep(latency + self._prefill(input_tokens) + output_tokens / self.tokens_per_second)
+            return FakeResponse(text, input_tokens, output_tokens)
+        finally:
+            self._done()
+
+    def generate(self, prompts, **kwargs):
+        """LangChain ``BaseLLM.generate``: one prompt after another, as a CPU model runs them."""
+        return types.SimpleNamespace(generations=[
+            [types.SimpleNamespace(text=self.invoke(prompt).content)] for prompt in prompts])
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return self.stream(prompt) if stream else self.invoke(prompt)
+
+    def stream(self, prompt, **kwargs):
+        latency = self._admit()
+        try:
+            text, input_tokens, output_tokens = self._respond(prompt)
+            time.sleep(latency + self._prefill(input_tokens))
+            step = 16 * CHARS_PER_TOKEN
+            for i in range(0, len(text), step):
+                time.sleep(16 / self.tokens_per_second)
+                last = i + step >= len(text)
+                yield FakeResponse(text[i:i + step], input_tokens if last else 0, output_tokens if last else 0)
+        finally:
+            self._done()
+
+
+class FakeTranscript:
+    def __init__(self, api, video_id, language_code, is_generated):
+        self.api = api
+        self.video_id = video_id
+        self.language_code = language_code
+        self.is_generated = is_generated
+
+    def fetch(self):
+        self.api._request()
+        return fixtures.caption_entries(self.video_id)
+
+
+class FakeYouTubeTranscriptApi:
+    """youtube-transcript-api (<1.0) over fixtures.transcript_languages; every request takes ``request_seconds``.
+
+    Patch it in as ``youtube.YouTubeTranscriptApi``. Listing a video's
+    transcripts and fetching one are a request each, as on YouTube.
+    """
+
+    def __init__(self, request_seconds=0.1):
+        self.request_seconds = request_seconds
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.request_seconds)
+
+    def list_transcripts(self, video_id):
+        from youtube_transcript_api._errors import TranscriptsDisabled
+
+        self._request()
+        available = fixtures.transcript_languages(video_id)
+        if not available:
+            raise TranscriptsDisabled(video_id)
+        return [FakeTranscript(self, video_id, code, generated) for code, generated in available]
+
+    def get_transcript(self, video_id, languages=("en",)):
+        """List, then fetch the first of ``languages`` available, manual before generated for each."""
+        from youtube_transcript_api._errors import NoTranscriptFound
+
+        transcripts = self.list_transcripts(video_id)
+        for language in languages:
+            for generated in (False, True):
+                for transcript in transcripts:
+                    if transcript.language_code == language and transcript.is_generated == generated:
+                        return transcript.fetch()
+        raise NoTranscriptFound(video_id, languages, transcripts)
+
+
+class FakeSentenceTransformer:
+    """Hash-seeded unit vectors; costs ``seconds_per_text`` per text to mimic CPU encoding.
+
+    Loading takes ``load_seconds``, as reading real weights from disk does,
+    and keeps ``weights_mb`` of memory resident, as the weights do.
+    """
+
+    seconds_per_text = 0.0005
+    load_seconds = 0.0
+    weights_mb = 0.0
+
+    def __init__(self, name, dimension=384, **kwargs):
+        time.sleep(self.load_seconds)
+        self.name = name
+        self.dimension = dimension
+        self.weights = np.ones(int(self.weights_mb * 2 ** 18), dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep(self.seconds_per_text * len(texts))
+        vectors = np.stack([
+            np.random.default_rng(int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little"))
+            .standard_normal(self.dimension).astype(np.float32)
+            for t in texts
+        ])
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+class FakeDeviceEncoder(FakeSentenceTransformer):
+    """A model on one device: calls run one at a time, each costing a fixed overhead plus a per-text cost.
+
+    The overhead is what batching amortises; FakeSentenceTransformer has none.
+    """
+
+    def __init__(self, name, call_seconds=0.004, text_seconds=0.0005, dimension=384, **kwargs):
+        super().__init__(name, dimension)
+        self.call_seconds = call_seconds
+        self.text_seconds = text_seconds
+        self.seconds_per_text = 0.0  # the device cost above replaces the base class's
+        self.calls = 0
+        self.texts = 0
+        self._device = threading.Lock()
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        count = 1 if isinstance(texts, str) else len(texts)
+        with self._device:
+            self.calls += 1
+            self.texts += count
+            time.sleep(self.call_seconds + self.text_seconds * count)
+        return super().encode(texts, batch_size)
+
+
+class WordHashEncoder(FakeSentenceTransformer):
+    """The sum of a hash-seeded vector per word, so texts that share words are close.
+
+    FakeSentenceTransformer's vectors carry no meaning; this stands in for a
+    model where similarity has to mean something, as in the relevance check.
+    """
+
+    def _word(self, word):
+        seed = int.from_bytes(hashlib.sha256(word.lower().strip(".,!?'").encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep(self.seconds_per_text * len(texts))
+        vectors = np.stack([sum((self._word(w) for w in t.split()), np.zeros(self.dimension, np.float32))
+                            for t in texts])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+def install(llm_latency=0.2, tokens_per_second=500.0, embed_seconds_per_text=0.0005, providers=None):
+    """Patch the service clients; call before importing ``app``.
+
+    Every LLM provider is served by one shared ``FakeLLM`` unless ``providers``
+    maps a provider name to its own fake.
+    """
+    import fakeredis
+    import mongomock
+    import pymongo
+    import redis
+
+    redis.StrictRedis = redis.Redis = fakeredis.FakeStrictRedis
+    pymongo.MongoClient = mongomock.MongoClient
+
+    FakeSentenceTransformer.seconds_per_text = embed_seconds_per_text
+    sys.modules["sentence_transformers"] = types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer)
+
+    import llm_registry
+    fake = FakeLLM(llm_latency, tokens_per_second)
+    providers = providers or {}
+    llm_registry.LLMRegistry._build = lambda self, provider, model, temperature: providers.get(provider, fake)
+    return fake
+
+
+def patch_app(app_module):
+    """Point the imported app at transcript fixtures and an in-process Chroma."""
+    import chromadb
+
+    def ephemeral_collection():
+        client = chromadb.EphemeralClient()
+        return client.get_or_create_collection(name="pdf_documents")
+
+    app_module.resolve_transcript = fixtures.resolve_transcript
+    app_module.chroma_collection.reset()
+    app_module.chroma_collection.factory = ephemeral_collection
@@ -0,0 +1,155 @@
+"""Transcript, question and document fixtures for the benchmarks."""
+import random
+
+SENTENCE = ("The derivative measures how a function changes as its input changes, "
+            "and the integral accumulates those changes over an interval. ")
+
+WORDS = ("function derivative integral limit slope tangent area curve rate change "
+         "theorem proof example equation variable constant matrix vector graph series").split()
+
+# Fixture videos: the first character of the 11-character id picks the length.
+TRANSCRIPT_MINUTES = {"T": 2, "S": 10, "M": 60, "L": 180}
+CAPTIONS_PER_MINUTE = 20
+
+
+def video_id(length, n):
+    return f"{length}{n:010d}"
+
+
+def video_url(length, n):
+    return f"https://www.youtube.com/watch?v={video_id(length, n)}"
+
+
+def caption_entries(video_id):
+    rng = random.Random(video_id)
+    minutes = TRANSCRIPT_MINUTES.get(video_id[0], 10)
+    return [
+        {"text": " ".join(rng.choice(WORDS) for _ in range(12)) + ".", "start": i * 3.0, "duration": 3.0}
+        for i in range(minutes * CAPTIONS_PER_MINUTE)
+    ]
+
+
+def resolve_transcript(video_id, languages):
+    """Stand-in for youtube.resolve_transcript."""
+    return caption_entries(video_id), languages[0]
+
+
+def transcript_languages(video_id):
+    """(language code, auto-generated) for each transcript a fixture video offers; some offer none."""
+    roll = random.Random(f"languages-{video_id}").random()
+    if roll < 0.5:
+        return [("en", True)]
+    if roll < 0.75:
+        return [("hi", False)]
+    if roll < 0.9:
+        return [("hi", False), ("en", True)]
+    return []
+
+
+# Topic-only quizzes (/llm_quiz).
+TOPICS = ["Calculus", "Photosynthesis", "The French Revolution", "Newton's laws of motion", "Binary search",
+          "Supply and demand", "The water cycle", "Chemical bonding", "World War I", "Probability"]
+
+
+def questions(n, prefix="Question"):
+    return [
+        {"question": f"{prefix} {i}: which operation undoes differentiation?",
+         "options": ["Integration", "Addition", "Division", "Rotation"],
+         "answer": "Integration"}
+        for i in range(1, n + 1)
+    ]
+
+
+def pdf(pages, seed=0, lines_per_page=40):
+    """A minimal text PDF that PyPDF2 can extract; ``seed`` makes every document distinct."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(10)) for _ in range(lines_per_page)]
+        text = b"BT /F1 10 Tf 12 TL 50 780 Td " + b" T* ".join(f"({line}) Tj".encode() for line in lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# Retrieval Q&A: each fact is planted in one page of a filler document; a hit means
+# the packed /query context contains the expected text.
+FACTS = [
+    ("The Nyquist-Shannon theorem requires sampling at twice the highest frequency in the signal.",
+     "What does the Nyquist-Shannon theorem require?", "twice the highest frequency"),
+    ("The TCP three-way handshake exchanges SYN, SYN-ACK and ACK segments.",
+     "Which segments does the TCP handshake exchange?", "SYN, SYN-ACK and ACK"),
+    ("Avogadro's number is 6.022e23 particles per mole.",
+     "What is Avogadro's number?", "6.022e23"),
+    ("The Krebs cycle takes place in the mitochondrial matrix.",
+     "Where does the Krebs cycle take place?", "mitochondrial matrix"),
+    ("Ohm's law states that V equals I times R.",
+     "What does Ohm's law state?", "V equals I times R"),
+    ("The RSA algorithm relies on the difficulty of factoring large semiprimes.",
+     "What does RSA rely on?", "factoring large semiprimes"),
+    ("Bernoulli's principle links higher fluid speed to lower pressure.",
+     "What does Bernoulli's principle say about fluid speed?", "lower pressure"),
+    ("Dijkstra's algorithm finds shortest paths when every edge weight is non-negative.",
+     "When does Dijkstra's algorithm find shortest paths?", "non-negative"),
+    ("The Haber process synthesizes ammonia from nitrogen and hydrogen over an iron catalyst.",
+     "What does the Haber process synthesize?", "ammonia"),
+    ("In SQL, a LEFT JOIN keeps every row of the left table even without a match.",
+     "What does a LEFT JOIN keep?", "every row of the left table"),
+]
+
+
+def fact_pages(pages=40, seed=0, lines_per_page=40):
+    """(page number, text) pairs of filler with every fact in FACTS planted on a random page."""
+    rng = random.Random(seed)
+    texts = [[" ".join(rng.choice(WORDS) for _ in range(10)) + "." for _ in range(lines_per_page)]
+             for _ in range(pages)]
+    for fact, _, _ in FACTS:
+        page = texts[rng.randrange(pages)]
+        page.insert(rng.randrange(len(page)), fact)
+    return [(n, " ".join(lines)) for n, lines in enumerate(texts, start=1)]
+
+
+# Labelled transcripts for the cleaning tiers (benchmarks/cleaning.py).
+LECTURE_WORDS = ("lecture lesson today we will learn the definition concept example theory formula "
+                 "solve problem step explain understand exam topic").split() + WORDS
+OFFTOPIC_WORDS = ("subscribe like share bell icon vlog unboxing phone room song love dance night "
+                  "game funny prank reaction discount code link description").split()
+CAPTION_NOISE = ["um", "uh", "you know", "[Music]", "[Applause]"]
+TRANSCRIPT_KINDS = ("lecture", "offtopic", "mixed")
+
+
+def labelled_transcript(kind, n, minutes=2):
+    """Noisy caption entries for a "lecture", an "offtopic" vlog or a "mixed" lecture with sponsor breaks."""
+    rng = random.Random(f"{kind}-{n}")
+    entries, previous = [], []
+    for i in range(minutes * CAPTIONS_PER_MINUTE):
+        offtopic = kind == "offtopic" or (kind == "mixed" and rng.random() < 0.25)
+        words = [rng.choice(OFFTOPIC_WORDS if offtopic else LECTURE_WORDS) for _ in range(10)]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(CAPTION_NOISE))
+        # Auto-generated captions repeat the tail of the previous line.
+        words = previous[-2:] + words
+        previous = words
+        entries.append({"text": " ".join(words), "start": i * 3.0, "duration": 3.0})
+    return entries
+
+
+def is_educational(text):
+    """The fake LLM cleaner's verdict: at most half of the words are off-topic."""
+    words = [word.strip(".,!?").lower() for word in text.split()]
+    return sum(word in OFFTOPIC_WORDS for word in words) * 2 <= len(words)
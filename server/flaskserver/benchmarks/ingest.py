@@ -0,0 +1,104 @@
+"""Document ingestion throughput and peak memory on a large PDF.
+
+    cd server/flaskserver
+    python -m benchmarks.ingest                       # a 500-page PDF
+    python -m benchmarks.ingest --pages 2000 --workers 4 --batch-sizes 16,64,256
+
+A fixture PDF (fixtures.pdf) is extracted with extraction.iter_pdf_pages and
+ingested with ingest.ingest_document into an in-process Chroma collection
+and a keyword index, embedding with the hashing fake
+(fakes.FakeSentenceTransformer, ``--embed-seconds`` per chunk). Each
+``INGEST_BATCH_SIZE`` runs in a fresh process so its peak memory is its
+own; ``all`` stores the whole document as one batch, holding every chunk
+and embedding in memory at once.
+
+Reported per batch size: chunks, seconds, chunks/sec, and the peak RSS of
+the process above what it used before ingestion started (extraction
+workers, ``--workers`` > 0, are children of the fork server and not
+counted).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(pdf_path, batch_size, workers, embed_seconds, workdir):
+    """Runs in the measured process; prints its result as JSON."""
+    import chromadb
+
+    from extraction import iter_pdf_pages
+    from ingest import ingest_document
+    from retrieval import KeywordIndex
+
+    fakes.FakeSentenceTransformer.seconds_per_text = embed_seconds
+    encoder = fakes.FakeSentenceTransformer("fake")
+    collection = chromadb.EphemeralClient().get_or_create_collection(name="ingest_bench")
+    keyword_index = KeywordIndex(os.path.join(workdir, f"keyword_index-{os.getpid()}.sqlite3"))
+
+    before = peak_mb()
+    started = time.perf_counter()
+    chunks = ingest_document(collection, encoder, "bench", "bench.pdf", iter_pdf_pages(pdf_path, workers=workers),
+                             batch_size=batch_size, keyword_index=keyword_index)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"chunks": chunks, "seconds": seconds, "peak_rss_mb": peak_mb() - before}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--batch-sizes", default="64,all", help="INGEST_BATCH_SIZE values; 'all' is one batch")
+    parser.add_argument("--workers", type=int, default=1, help="EXTRACT_WORKERS; 0 extracts in-process")
+    parser.add_argument("--embed-seconds", type=float, default=0.0005, help="embedding cost per chunk")
+    parser.add_argument("--child", nargs=2, metavar=("PDF", "BATCH_SIZE"), help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/ingest-<time>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quicklearn-ingest-")
+    if args.child:
+        pdf_path, batch_size = args.child
+        child(pdf_path, int(batch_size), args.workers, args.embed_seconds, workdir)
+        return
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("ingest-%Y%m%d-%H%M%S") + ".json"))
+    pdf_path = os.path.join(workdir, "bench.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(fixtures.pdf(args.pages))
+
+    results = []
+    for batch_size in args.batch_sizes.split(","):
+        size = 10 ** 9 if batch_size == "all" else int(batch_size)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", pdf_path, str(size),
+                              "--workers", str(args.workers), "--embed-seconds", str(args.embed_seconds)],
+                             capture_output=True, text=True, check=True).stdout
+        run = json.loads(out.strip().splitlines()[-1])
+        result = {"batch_size": batch_size, "pages": args.pages, "chunks": run["chunks"],
+                  "seconds": round(run["seconds"], 2), "chunks_per_second": round(run["chunks"] / run["seconds"], 1),
+                  "peak_rss_mb": round(run["peak_rss_mb"], 1)}
+        results.append(result)
+        print(f"batch {batch_size:<5} {result['pages']} pages  {result['chunks']} chunks  {result['seconds']:>7} s  "
+              f"{result['chunks_per_second']:>8} chunks/s  peak RSS +{result['peak_rss_mb']} MB", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"pages": args.pages, "workers": args.workers, "embed_seconds": args.embed_seconds,
+                   "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
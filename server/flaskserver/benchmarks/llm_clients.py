@@ -0,0 +1,159 @@
+"""Per-call client overhead: shared registry clients against a client per call.
+
+    cd server/flaskserver
+    python -m benchmarks.llm_clients
+    python -m benchmarks.llm_clients -c 1,8,32 -n 400 --handshake-ms 60 --reply-ms 0
+
+A local stub of Groq's OpenAI-compatible chat completions endpoint stands in
+for the provider. It answers at once (``--reply-ms``) but delays every new
+connection by ``--handshake-ms``, as the TCP and TLS handshakes with a
+remote API do. The same ChatGroq calls then run two ways:
+
+* ``per_call``: a new ChatGroq, and so a new HTTP client and connection,
+  for every call, as the app did before llm_registry.py;
+* ``registry``: llm_registry.get_llm, one client and keep-alive pool shared
+  by every call.
+
+Reported per mode and concurrency: calls/sec, percentiles of the invoke
+latency, connections the stub accepted, and the mean time spent getting a
+client (construction, for ``per_call``) on top of that latency.
+Needs langchain-groq; no network access or API key.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks.run import percentile  # noqa: E402
+
+COMPLETION = {
+    "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{\"ok\": true}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 16, "completion_tokens": 4, "total_tokens": 20},
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handshake_seconds, reply_seconds):
+        self.handshake_seconds = handshake_seconds
+        self.reply_seconds = reply_seconds
+        self.connections = 0
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), StubHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+        time.sleep(self.server.handshake_seconds)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.reply_seconds)
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_mode(mode, server, concurrency, calls):
+    from langchain_groq import ChatGroq
+
+    from llm_registry import GROQ_MODEL, LLMRegistry
+
+    registry = LLMRegistry()
+    build_seconds = []
+
+    def client():
+        started = time.perf_counter()
+        if mode == "per_call":
+            llm = ChatGroq(model=GROQ_MODEL, temperature=0, groq_api_key="stub")
+        else:
+            llm = registry.get("groq")
+        build_seconds.append(time.perf_counter() - started)
+        return llm
+
+    def one(i):
+        llm = client()
+        started = time.perf_counter()
+        llm.invoke(f"Call {i}")
+        return (time.perf_counter() - started) * 1000
+
+    one(-1)  # the registry's client exists before traffic arrives
+    connections = server.connections
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - started
+    registry.close()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "calls": calls,
+        "calls_per_second": round(calls / elapsed, 1),
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 2) for p in ("p50", "p95")},
+        "connections": server.connections - connections,
+        "client_build_ms": round(sum(build_seconds) / len(build_seconds) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("-n", "--calls", type=int, default=200, help="calls per mode and level")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="delay on every new connection")
+    parser.add_argument("--reply-ms", type=float, default=0.0, help="stub service time per call")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/llm-clients-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("llm-clients-%Y%m%d-%H%M%S") + ".json"))
+    server = StubServer(args.handshake_ms / 1000, args.reply_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Both the groq SDK and langchain-groq read the endpoint from the environment.
+    os.environ["GROQ_BASE_URL"] = os.environ["GROQ_API_BASE"] = server.url
+    os.environ["GROQ_API_KEY"] = "stub"
+    import logging
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = []
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        for mode in ("per_call", "registry"):
+            result = run_mode(mode, server, concurrency, args.calls)
+            results.append(result)
+            print(f"{mode:<9} c={concurrency:<3} {result['calls_per_second']:>8} calls/s  "
+                  f"p50 {result['latency_ms']['p50']:>7} ms  p95 {result['latency_ms']['p95']:>7} ms  "
+                  f"connections {result['connections']:>4}  client build {result['client_build_ms']} ms", flush=True)
+    server.shutdown()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"handshake_ms": args.handshake_ms, "reply_ms": args.reply_ms, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
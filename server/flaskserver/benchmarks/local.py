@@ -0,0 +1,202 @@
+"""The local model tier against the hosted path on the fixture set.
+
+    cd server/flaskserver
+    python -m benchmarks.local
+    python -m benchmarks.local -c 8 --rounds 3 --routes topic_quiz:1500,mind_map:3000
+    python -m benchmarks.local --model ~/models/orca-mini-3b-gguf2-q4_0.gguf
+
+The same workload runs through the app's own generate_quiz and
+generate_mind_map in three modes:
+
+* ``hosted``: the local tier switched off, as before local_llm.py;
+* ``local_only``: every request a rule allows goes to the local model,
+  however long the queue, to compare its quality and latency with hosted;
+* ``local``: the router as deployed, which sends work to the hosted chain
+  once the local queue's expected wait passes ``--max-wait``.
+
+The workload is a topic-only quiz for every fixtures.TOPICS entry and a mind
+map for short ("T", routed locally by default) and 10-minute ("S", too long
+for the default rule) fixture transcripts.
+
+Hosted providers are fakes with a network-like latency. The local model is
+a fake with a CPU-like prompt and decode rate that breaks the schema or
+gets answers wrong now and then; pass ``--model`` to load a real GPT4All
+model file instead, which needs no network either. Reported per mode and
+task: latency percentiles, calls to the hosted providers, where requests were served (local, failed local
+then hosted, hosted, and why not local), re-asks, a quality score (the
+share of content checks passed: question count, answer among the options,
+enough subtopics with details), the share of fully correct documents, pool
+batching, and the latency of a cheap request (GET /ready) probed while
+generation runs.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+NUM_QUESTIONS = 5
+
+
+def workload(rounds):
+    tasks = [("topic_quiz", topic) for topic in fixtures.TOPICS]
+    for length, videos in (("T", 6), ("S", 3)):
+        for n in range(videos):
+            entries = fixtures.caption_entries(fixtures.video_id(length, n))
+            tasks.append(("mind_map", " ".join(entry["text"] for entry in entries)))
+    return tasks * rounds
+
+
+def quality(task, document):
+    """The share of content checks ``document`` passes, from 0 to 1."""
+    if task == "topic_quiz":
+        items = next(iter(document.get("questions", {}).values()), [])
+        checks = [len(items) == NUM_QUESTIONS] + [q.get("answer") in q.get("options", []) for q in items]
+    else:
+        subtopics = document.get("subtopics", [])
+        checks = [len(subtopics) >= 3] + [bool(s.get("details")) for s in subtopics]
+    return sum(checks) / len(checks)
+
+
+def probe(app, stop, latencies):
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get("/ready")
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.05)
+
+
+def run_mode(app_module, mode, tasks, factory, hosted, args):
+    from local_llm import LocalModelPool, LocalRouter
+
+    app_module.redis_client.flushall()
+    pool = LocalModelPool(factory, size=args.pool_size, batch_size=args.batch_size)
+    max_wait = float("inf") if mode == "local_only" else args.max_wait
+    router = LocalRouter(app_module.redis_client, pool, routes=args.routes, enabled=(mode != "hosted"),
+                         max_wait=max_wait)
+    if router.enabled:
+        pool.warm()
+    app_module.local_router = router
+
+    def one(task):
+        kind, text = task
+        started = time.perf_counter()
+        try:
+            if kind == "topic_quiz":
+                document = app_module.generate_quiz(text, NUM_QUESTIONS, "medium")
+            else:
+                document = app_module.generate_mind_map(text)
+        except Exception:
+            document = {"error": "generation failed"}
+        return kind, time.perf_counter() - started, None if "error" in document else quality(kind, document)
+
+    hosted_calls = sum(fake.calls for fake in hosted)
+    stop, probes = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(app_module.app, stop, probes), daemon=True)
+    prober.start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(one, tasks))
+    stop.set()
+    prober.join()
+    hosted_calls = sum(fake.calls for fake in hosted) - hosted_calls
+
+    routed = router.stats()["tasks"]
+    structured = app_module.structured_output.stats()
+    results = []
+    for kind in ("topic_quiz", "mind_map"):
+        mine = [(seconds, score) for k, seconds, score in outcomes if k == kind]
+        scores = [score for _, score in mine if score is not None]
+        latencies = [seconds * 1000 for seconds, _ in mine]
+        results.append({
+            "mode": mode,
+            "task": kind,
+            "requests": len(mine),
+            "errors": len(mine) - len(scores),
+            "latency_ms": {p: round(percentile(latencies, int(p[1:])), 1) for p in ("p50", "p95")},
+            "served": {tier: routed.get(kind, {}).get("tiers", {}).get(tier, {}).get("count", 0)
+                       for tier in ("local", "local_failed", "hosted")},
+            "skipped": routed.get(kind, {}).get("skipped", {}),
+            "reasks": structured.get(kind, {}).get("reasks", 0),
+            "quality": round(sum(scores) / len(scores), 3) if scores else None,
+            "fully_correct": round(sum(score == 1 for score in scores) / len(mine), 3),
+        })
+    pool_stats = pool.stats()
+    for result in results:
+        result["pool"] = {k: pool_stats[k] for k in ("batches", "mean_batch", "deduplicated", "rejected")}
+        result["hosted_llm_calls"] = hosted_calls
+        result["probe_ms"] = {"p50": round(percentile(probes, 50), 2), "p95": round(percentile(probes, 95), 2)}
+    print(f"{mode:<10} hosted LLM calls {hosted_calls}  pool {results[0]['pool']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=1, help="times the fixture set is sent")
+    parser.add_argument("--routes", default="topic_quiz:1500,mind_map:1500", help="LOCAL_LLM_ROUTES for the run")
+    parser.add_argument("--pool-size", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--max-wait", type=float, default=10.0, help="LOCAL_LLM_MAX_WAIT for the local mode")
+    parser.add_argument("--model", help="a GPT4All model file (default: the CPU-model fake)")
+    parser.add_argument("--local-tokens-per-second", type=float, default=60.0, help="fake local decode rate")
+    parser.add_argument("--local-prompt-tokens-per-second", type=float, default=400.0,
+                        help="fake local prompt processing rate")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/local-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("local-%Y%m%d-%H%M%S") + ".json"))
+    os.chdir(tempfile.mkdtemp(prefix="quicklearn-local-"))
+    os.environ.setdefault("TTS_MODE", "off")
+    os.environ["UPSTREAM_PROVIDERS"] = "groq,gemini"
+    if args.model:
+        os.environ["GPT4ALL_MODEL"] = os.path.abspath(os.path.expanduser(args.model))
+
+    hosted = {
+        "groq": fakes.FakeLLM(latency=0.3, tokens_per_second=500, seed=1),
+        "gemini": fakes.FakeLLM(latency=0.5, tokens_per_second=300, seed=2),
+    }
+    fakes.install(providers=hosted)
+    import app as app_module
+    import local_llm
+    fakes.patch_app(app_module)
+    import logging
+    logging.getLogger().setLevel(logging.ERROR)
+
+    if args.model:
+        factory = local_llm.load_model
+    else:
+        def factory():
+            return fakes.FakeLLM(latency=0.1, tokens_per_second=args.local_tokens_per_second,
+                                 prompt_tokens_per_second=args.local_prompt_tokens_per_second,
+                                 malformed_rate=0.05, sloppy_rate=0.1, seed=3)
+
+    tasks = workload(args.rounds)
+    results = []
+    for mode in ("hosted", "local_only", "local"):
+        for result in run_mode(app_module, mode, tasks, factory, hosted.values(), args):
+            results.append(result)
+            print(f"{mode:<10} {result['task']:<11} p50 {result['latency_ms']['p50']:>8}  "
+                  f"p95 {result['latency_ms']['p95']:>8} ms  served {result['served']}  "
+                  f"skipped {result['skipped']}  reasks {result['reasks']}  quality {result['quality']}  "
+                  f"fully correct {result['fully_correct']}  probe p95 {result['probe_ms']['p95']} ms", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"model": args.model or "fake", "concurrency": args.concurrency, "rounds": args.rounds,
+                   "routes": args.routes, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Retrieval quality and cost on the fixture Q&A set.
+
+    cd server/flaskserver
+    python -m benchmarks.retrieval
+    python -m benchmarks.retrieval --documents 20 --budget 500,1000,2000 --encoder all-MiniLM-L6-v2
+
+Facts from fixtures.FACTS are planted in filler documents, which are ingested
+into an ephemeral Chroma collection and a scratch keyword index. Every
+question is then answered by three retrieval strategies:
+
+* ``vector_top3``: the previous behaviour, 3 nearest chunks and no budget;
+* ``vector``: vector candidates packed into the token budget;
+* ``hybrid``: BM25 and vector candidates fused, packed into the budget.
+
+Reported per strategy and budget: answer-hit rate (the expected text is in
+the packed context), mean prompt context tokens and retrieval latency.
+
+By default embeddings come from the hashing stand-in in benchmarks/fakes.py,
+which has no notion of meaning, so ``vector`` hits are chance level. Pass
+``--encoder`` to use a real sentence-transformers model (it must already be
+downloaded).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+
+def build_corpus(documents, encoder, workdir):
+    import chromadb
+    from ingest import ingest_document
+    from retrieval import KeywordIndex
+
+    collection = chromadb.EphemeralClient().get_or_create_collection(name="retrieval_bench")
+    keyword_index = KeywordIndex(os.path.join(workdir, "keyword_index.sqlite3"))
+    for seed in range(documents):
+        ingest_document(collection, encoder, f"notes-{seed}", f"notes-{seed}.pdf", fixtures.fact_pages(seed=seed),
+                        keyword_index=keyword_index)
+    return collection, keyword_index
+
+
+def evaluate(strategy, budget, collection, keyword_index, encoder):
+    from retrieval import hybrid_search, pack_context, vector_search
+
+    hits, tokens, latencies = 0, [], []
+    for _, question, expected in fixtures.FACTS:
+        started = time.perf_counter()
+        embedding = encoder.encode(question).tolist()
+        if strategy == "vector_top3":
+            context = "\n".join(c["text"] for c in vector_search(collection, embedding, 3))
+            used = len(context) // 4
+        else:
+            candidates = hybrid_search(question, embedding, collection, keyword_index, mode=strategy)
+            context, _, used = pack_context(candidates, budget)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += expected in context
+        tokens.append(used)
+    return {
+        "strategy": strategy,
+        "budget_tokens": None if strategy == "vector_top3" else budget,
+        "hit_rate": round(hits / len(fixtures.FACTS), 3),
+        "mean_context_tokens": round(sum(tokens) / len(tokens)),
+        "latency_ms": {"p50": round(percentile(latencies, 50), 2), "p95": round(percentile(latencies, 95), 2)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10, help="filler documents, each with every fact")
+    parser.add_argument("--budget", default="500,1000,2000", help="comma-separated context token budgets")
+    parser.add_argument("--encoder", help="sentence-transformers model name (default: hashing stand-in)")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/retrieval-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("retrieval-%Y%m%d-%H%M%S") + ".json"))
+    workdir = tempfile.mkdtemp(prefix="quicklearn-retrieval-")
+    os.chdir(workdir)
+    if args.encoder:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(args.encoder)
+    else:
+        encoder = fakes.FakeSentenceTransformer("hashing")
+        encoder.seconds_per_text = 0
+
+    collection, keyword_index = build_corpus(args.documents, encoder, workdir)
+    results = []
+    for budget in [int(b) for b in args.budget.split(",")]:
+        for strategy in ("vector_top3", "vector", "hybrid"):
+            if strategy == "vector_top3" and results:
+                continue
+            result = evaluate(strategy, budget, collection, keyword_index, encoder)
+            results.append(result)
+            print(f"{strategy:<12} budget {str(result['budget_tokens']):>5}  hit rate {result['hit_rate']:>5}  "
+                  f"context {result['mean_context_tokens']:>5} tokens  p50 {result['latency_ms']['p50']:>7} ms")
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"documents": args.documents, "questions": len(fixtures.FACTS),
+                   "encoder": args.encoder or "hashing", "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""Offline benchmark and load-test suite.
+
+    cd server/flaskserver
+    python -m benchmarks.run                                 # every scenario at concurrency 1, 4, 16
+    python -m benchmarks.run -s query,upload -c 1,8 -n 100 --llm-latency 0.5
+    python -m benchmarks.run --compare results/old.json results/new.json
+
+The app runs in-process against deterministic fakes (benchmarks/fakes.py):
+fakeredis, mongomock, an ephemeral Chroma, fixture transcripts, a hashing
+embedding model and an LLM stub with a fixed latency and decode rate. No
+network access or API keys are needed. Each scenario reports throughput,
+latency percentiles, time to the first content event (TTFC: the first
+server-sent event that is not a progress update, or the first byte of a
+plain response), errors, upstream LLM calls, memory and the mean time per
+instrumented stage. Results are written as JSON to benchmarks/results/.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+
+SCENARIOS = {}
+
+
+def scenario(name, setup=None, warmup=1):
+    """``warmup`` requests (indices -warmup..-1) run first, e.g. so every fixture video's transcript is cleaned."""
+    def register(build):
+        SCENARIOS[name] = (build, setup, warmup)
+        return build
+    return register
+
+
+# -- scenarios: build(i) returns (method, path, kwargs for the test client) ---
+
+@scenario("quiz", warmup=16)
+def quiz(i):
+    return "POST", "/quiz", {"json": {"link": fixtures.video_url("S", i % 16), "qno": 5,
+                                      "difficulty": "medium", "force_refresh": True}}
+
+
+@scenario("quiz_long", warmup=4)
+def quiz_long(i):
+    return "POST", "/quiz", {"json": {"link": fixtures.video_url("L", i % 4), "qno": 10,
+                                      "difficulty": "medium", "force_refresh": True}}
+
+
+# Latency against lecture length: the same quiz on the 10, 60 and 180-minute fixtures.
+def quiz_length_scenario(length):
+    def build(i):
+        return "POST", "/quiz", {"json": {"link": fixtures.video_url(length, i % 4), "qno": 5,
+                                          "difficulty": "medium", "force_refresh": True}}
+    return build
+
+
+for _length in ("S", "M", "L"):
+    SCENARIOS[f"quiz_{fixtures.TRANSCRIPT_MINUTES[_length]}min"] = (quiz_length_scenario(_length), None, 4)
+
+
+@scenario("quiz_cached")
+def quiz_cached(i):
+    return "POST", "/quiz", {"json": {"link": fixtures.video_url("S", 0), "qno": 5, "difficulty": "medium"}}
+
+
+@scenario("llm_quiz")
+def llm_quiz(i):
+    return "POST", "/llm_quiz", {"json": {"topic": f"Topic {i % 32}", "num_questions": 5,
+                                          "difficulty": "medium", "force_refresh": True}}
+
+
+@scenario("mind_map", warmup=8)
+def mind_map(i):
+    return "GET", "/generate_mind_map", {"query_string": {"video_url": fixtures.video_url("M", i % 8),
+                                                          "force_refresh": "1"}}
+
+
+# Streaming (SSE) variants: compare their TTFC with the plain scenarios' latency.
+@scenario("quiz_stream", warmup=16)
+def quiz_stream(i):
+    return "POST", "/quiz", {"json": {"link": fixtures.video_url("S", i % 16), "qno": 5, "difficulty": "medium",
+                                      "force_refresh": True, "stream": True}}
+
+
+@scenario("mind_map_stream", warmup=8)
+def mind_map_stream(i):
+    return "GET", "/generate_mind_map", {"query_string": {"video_url": fixtures.video_url("M", i % 8),
+                                                          "force_refresh": "1", "stream": "1"}}
+
+
+# Bursts: every request asks for the same artifact at the same time, as when a teacher shares a link.
+@scenario("quiz_burst")
+def quiz_burst(i):
+    return "POST", "/quiz", {"json": {"link": fixtures.video_url("S", 0), "qno": 5,
+                                      "difficulty": "medium", "force_refresh": True}}
+
+
+@scenario("mind_map_burst")
+def mind_map_burst(i):
+    return "GET", "/generate_mind_map", {"query_string": {"video_url": fixtures.video_url("M", 0),
+                                                          "force_refresh": "1"}}
+
+
+_uploads = iter(range(10 ** 9))
+_uploads_lock = threading.Lock()
+
+
+@scenario("upload")
+def upload(i):
+    with _uploads_lock:
+        seed = next(_uploads)  # every upload is a new document, so nothing is deduplicated
+    return "POST", "/upload", {"data": {"file": (io.BytesIO(fixtures.pdf(10, seed=seed)), f"bench-{seed}.pdf")},
+                               "content_type": "multipart/form-data"}
+
+
+def seed_documents(client):
+    for seed in range(-5, 0):
+        client.post("/upload", data={"file": (io.BytesIO(fixtures.pdf(10, seed=seed)), f"corpus{seed}.pdf")},
+                    content_type="multipart/form-data")
+
+
+@scenario("query", setup=seed_documents)
+def query(i):
+    return "POST", "/query", {"json": {"query": f"What is the {fixtures.WORDS[i % len(fixtures.WORDS)]}?",
+                                       "audio": "off", "force_refresh": True}}
+
+
+@scenario("query_cached", setup=seed_documents)
+def query_cached(i):
+    # Repeated questions; the hashing encoder only matches identical text, not paraphrases.
+    return "POST", "/query", {"json": {"query": f"What is the {fixtures.WORDS[i % 4]}?", "audio": "off"}}
+
+
+_cold_users = iter(range(10 ** 9))
+
+
+def recommendations_scenario(topics, cold):
+    def build(i):
+        import jwt
+        import app
+        # Cold: a new user with topics nobody has asked for yet. Warm: the same user and topics every time.
+        if cold:
+            with _uploads_lock:
+                i = next(_cold_users)
+        user_id = f"bench-{topics}-{i if cold else 0}"
+        names = [f"Topic {i if cold else 0}-{t}" for t in range(topics)]
+        app.redis_client.hset(f"student:{user_id}", "statistics", json.dumps({n: [] for n in names}))
+        token = jwt.encode({"id": user_id}, app.SECRET_KEY, algorithm="HS256")
+        return "GET", "/getonly", {"headers": {"Authorization": f"Bearer {token}"}}
+    return build
+
+
+for _topics in (1, 10, 50):
+    SCENARIOS[f"getonly_{_topics}_cold"] = (recommendations_scenario(_topics, cold=True), None, 1)
+    SCENARIOS[f"getonly_{_topics}_warm"] = (recommendations_scenario(_topics, cold=False), None, 1)
+
+
+# -- measurement -------------------------------------------------------------
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def stage_totals():
+    import metrics
+    totals = {}
+    for metric in metrics.STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith(("_sum", "_count")):
+                key = f"{sample.labels['endpoint']}.{sample.labels['stage']}"
+                totals.setdefault(key, [0.0, 0.0])[sample.name.endswith("_count")] += sample.value
+    return totals
+
+
+def run_scenario(app, llm, name, concurrency, requests):
+    build, _, warmup = SCENARIOS[name]
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        method, path, kwargs = build(i)
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, buffered=False, **kwargs)
+        first = None
+        for chunk in response.iter_encoded():
+            if first is None and chunk and not chunk.startswith(b"event: progress"):
+                first = time.perf_counter() - started
+        response.close()
+        latency = time.perf_counter() - started
+        return latency, response.status_code, latency if first is None else first
+
+    for i in range(-warmup, 0):  # lazy models, clients and caches
+        one(i)
+    before = stage_totals()
+    llm_calls = llm.calls
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    llm_calls = llm.calls - llm_calls
+    after = stage_totals()
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    first_content = [first * 1000 for _, _, first in results]
+    errors = sum(1 for _, status, _ in results if status >= 400)
+    stages = {}
+    for key, (total, count) in after.items():
+        prev_total, prev_count = before.get(key, (0.0, 0.0))
+        if count > prev_count:
+            stages[key] = round((total - prev_total) / (count - prev_count) * 1000, 2)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "llm_calls": llm_calls,
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2),
+        },
+        "ttfc_ms": {
+            "p50": round(percentile(first_content, 50), 2),
+            "p95": round(percentile(first_content, 95), 2),
+        },
+        "stage_mean_ms": stages,
+        "rss_mb": rss_mb(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def stage_overhead_us(iterations=100000):
+    """Cost of one metrics.stage() block compared with an empty loop."""
+    from metrics import stage
+    started = time.perf_counter()
+    for _ in range(iterations):
+        pass
+    empty = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with stage("overhead"):
+            pass
+    return round((time.perf_counter() - started - empty) / iterations * 1e6, 3)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=HERE).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    print(f"{'scenario':<22}{'conc':>5}{'rps old':>10}{'rps new':>10}{'p95 old':>10}{'p95 new':>10}{'p95 change':>12}")
+    for r in new:
+        o = old.get((r["scenario"], r["concurrency"]))
+        if o is None:
+            continue
+        change = (r["latency_ms"]["p95"] - o["latency_ms"]["p95"]) / o["latency_ms"]["p95"] * 100
+        print(f"{r['scenario']:<22}{r['concurrency']:>5}{o['throughput_rps']:>10}{r['throughput_rps']:>10}"
+              f"{o['latency_ms']['p95']:>10}{r['latency_ms']['p95']:>10}{change:>+11.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenarios", default="all", help="comma-separated scenario names, or 'all'")
+    parser.add_argument("-c", "--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("-n", "--requests", type=int, default=40, help="requests per scenario and level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="LLM decode rate")
+    parser.add_argument("--embed-seconds", type=float, default=0.0005, help="embedding cost per text")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    output = args.output or os.path.join(HERE, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    output = os.path.abspath(output)
+
+    # Uploads, caches and indexes go to a scratch directory.
+    workdir = tempfile.mkdtemp(prefix="quicklearn-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("TTS_MODE", "off")
+    os.environ.pop("HUGGINGFACE_TOKEN", None)
+
+    llm = fakes.install(args.llm_latency, args.tokens_per_second, args.embed_seconds)
+    import app as app_module
+    fakes.patch_app(app_module)
+    import logging
+    import warnings
+    logging.getLogger().setLevel(logging.WARNING)
+    warnings.filterwarnings("ignore", module="jwt")  # the app's short HMAC key
+
+    app = app_module.app
+    results = []
+    for name in names:
+        setup = SCENARIOS[name][1]
+        if setup:
+            setup(app.test_client())
+        for concurrency in levels:
+            result = run_scenario(app, llm, name, concurrency, args.requests)
+            results.append(result)
+            print(f"{name:<22} c={concurrency:<3} {result['throughput_rps']:>8} req/s  "
+                  f"p50 {result['latency_ms']['p50']:>8} ms  p95 {result['latency_ms']['p95']:>8} ms  "
+                  f"ttfc p50 {result['ttfc_ms']['p50']:>8} ms  errors {result['errors']}  llm calls {result['llm_calls']}  rss {result['rss_mb']} MB", flush=True)
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {
+            "requests": args.requests,
+            "concurrency": levels,
+            "llm_latency": args.llm_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "embed_seconds_per_text": args.embed_seconds,
+            "transcript_cleaner": os.getenv("TRANSCRIPT_CLEANER", "llm"),
+            "singleflight": os.getenv("SINGLEFLIGHT_ENABLED", "1"),
+        },
+        "stage_overhead_us": stage_overhead_us(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
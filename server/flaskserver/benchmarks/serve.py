@@ -0,0 +1,22 @@
+"""WSGI entry point: the app against the benchmark fakes, for gunicorn.
+
+    cd <scratch directory>
+    PYTHONPATH=/path/to/server/flaskserver gunicorn -c /path/to/server/flaskserver/gunicorn.conf.py benchmarks.serve:app
+
+Used by benchmarks.serving. Redis and MongoDB are in-process fakes, so
+every worker has its own; uploads, Chroma and the indexes are real and live
+in the current directory, shared by every worker as in production. Each
+fake embedding model keeps ``BENCH_MODEL_MB`` resident and every LLM call
+takes ``BENCH_LLM_LATENCY`` seconds.
+"""
+import os
+
+from benchmarks import fakes, fixtures
+
+fakes.FakeSentenceTransformer.weights_mb = float(os.getenv("BENCH_MODEL_MB", 0))
+fakes.install(llm_latency=float(os.getenv("BENCH_LLM_LATENCY", 0.2)), tokens_per_second=5000.0)
+
+import app as app_module  # noqa: E402
+
+app_module.resolve_transcript = fixtures.resolve_transcript
+app = app_module.app
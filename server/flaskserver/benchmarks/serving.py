@@ -0,0 +1,203 @@
+"""Production serving (gunicorn.conf.py): throughput and per-worker memory, with and without preloading.
+
+    cd server/flaskserver
+    python -m benchmarks.serving
+    python -m benchmarks.serving --workers 4 --threads 16 -c 64 --seconds 60 --model-mb 400
+
+gunicorn runs the app against the fakes (benchmarks/serve.py) with
+``WEB_CONCURRENCY=--workers`` and ``GUNICORN_THREADS=--threads``, twice:
+
+* ``preload``: the bundled config, which loads the PRELOAD_RESOURCES
+  (the embedding models and the vector index) in the master before forking;
+* ``no_preload``: ``PRELOAD_RESOURCES=`` (empty), so every worker loads its
+  own copy of the models on first use.
+
+Each fake embedding model keeps ``--model-mb`` resident, roughly what the
+real weights take. A PDF is uploaded before gunicorn starts (a Chroma
+client opened on an empty collection does not see documents another worker
+adds later). ``-c`` clients then send /query
+requests (distinct questions, audio off, answer cache bypassed) for
+``--seconds``. Reported per mode: requests/sec, latency percentiles, errors,
+and the RSS and PSS of the master and of every worker. PSS splits shared
+pages between the processes sharing them, so its total is what the server
+really costs; RSS counts shared pages in every process. Needs gunicorn.
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+MODES = ("preload", "no_preload")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_mb(pid):
+    """(RSS, PSS) of a process in MB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024
+    return round(values["Rss"], 1), round(values["Pss"], 1)
+
+
+def workers_of(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def seed():
+    """Runs in a child process in the scratch directory: upload the corpus every worker will search."""
+    from benchmarks import serve
+
+    response = serve.app.test_client().post("/upload", content_type="multipart/form-data", data={
+        "file": (io.BytesIO(fixtures.pdf(20)), "corpus.pdf")})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def server_env(mode, args, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads),
+               GUNICORN_BIND=f"127.0.0.1:{port}", PYTHONPATH=os.path.dirname(HERE), TTS_MODE="off",
+               BENCH_MODEL_MB=str(args.model_mb), BENCH_LLM_LATENCY=str(args.llm_latency))
+    env.pop("HUGGINGFACE_TOKEN", None)
+    if mode == "no_preload":
+        env["PRELOAD_RESOURCES"] = ""
+    return env
+
+
+def start_server(mode, args, port, workdir):
+    env = server_env(mode, args, port)
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--seed"], cwd=workdir, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", os.path.join(os.path.dirname(HERE),
+                             "gunicorn.conf.py"), "benchmarks.serve:app"],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_healthy(client, server, workers, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if client.get("/").status_code == 200 and len(workers_of(server.pid)) == workers:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("gunicorn did not come up")
+
+
+def load(client, concurrency, seconds):
+    latencies, errors = [], []
+    stop = time.monotonic() + seconds
+    lock = threading.Lock()
+
+    def one(n):
+        i = n
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            word = fixtures.WORDS[i % len(fixtures.WORDS)]
+            try:
+                ok = client.post("/query", json={"query": f"What is the {word}? ({i})", "audio": "off",
+                                                 "force_refresh": True}).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            with lock:
+                (latencies if ok else errors).append((time.perf_counter() - started) * 1000)
+            i += concurrency
+
+    threads = [threading.Thread(target=one, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f"quicklearn-serving-{mode}-")
+    port = free_port()
+    server = start_server(mode, args, port, workdir)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120,
+                          trust_env=False)
+    try:
+        wait_healthy(client, server, args.workers)
+        load(client, args.concurrency, min(5.0, args.seconds))  # every worker loads what it loads lazily
+        latencies, errors = load(client, args.concurrency, args.seconds)
+        master = memory_mb(server.pid)
+        workers = [memory_mb(pid) for pid in workers_of(server.pid)]
+    finally:
+        client.close()
+        server.terminate()
+        server.wait(timeout=60)
+    return {
+        "mode": mode,
+        "workers": args.workers,
+        "threads": args.threads,
+        "requests_per_second": round(len(latencies) / args.seconds, 1),
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 1) for p in ("p50", "p95")},
+        "errors": len(errors),
+        "master": {"rss_mb": master[0], "pss_mb": master[1]},
+        "worker_rss_mb": [rss for rss, _ in workers],
+        "worker_pss_mb": [pss for _, pss in workers],
+        "total_pss_mb": round(master[1] + sum(pss for _, pss in workers), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="WEB_CONCURRENCY")
+    parser.add_argument("--threads", type=int, default=16, help="GUNICORN_THREADS")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the measured load")
+    parser.add_argument("--model-mb", type=float, default=200.0, help="resident size of each embedding model")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--seed", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/serving-<time>.json)")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed()
+        return
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("serving-%Y%m%d-%H%M%S") + ".json"))
+    results = []
+    for mode in MODES:
+        result = run_mode(mode, args)
+        results.append(result)
+        print(f"{mode:<10} {result['workers']}x{result['threads']}  {result['requests_per_second']:>7} req/s  "
+              f"p50 {result['latency_ms']['p50']:>7} ms  p95 {result['latency_ms']['p95']:>7} ms  "
+              f"errors {result['errors']}  master RSS/PSS {result['master']['rss_mb']}/{result['master']['pss_mb']} MB  "
+              f"worker RSS {result['worker_rss_mb']} MB  worker PSS {result['worker_pss_mb']} MB  "
+              f"total PSS {result['total_pss_mb']} MB", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"concurrency": args.concurrency, "seconds": args.seconds, "model_mb": args.model_mb,
+                   "llm_latency": args.llm_latency, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
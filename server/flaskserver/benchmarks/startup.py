@@ -0,0 +1,140 @@
+"""Startup cost: import time and time to the first healthy and ready responses.
+
+    cd server/flaskserver
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --model-load-seconds 4
+
+Every run starts a fresh interpreter, as a deploy or a worker restart does,
+against the usual fakes (benchmarks/fakes.py). Each embedding model takes
+``--model-load-seconds`` to load, roughly what all-MiniLM-L6-v2 takes from
+the local cache. Two modes:
+
+* ``lazy``: the app as it starts now; models and clients load on first use
+  or in the background (WARMUP=1) while requests are already served;
+* ``eager``: every LazyResource is built before the first request, as the
+  app did when it imported and loaded everything at import time.
+
+Reported per mode, as medians over ``--runs`` processes and measured from
+process start: ``import app`` done, the first 200 from GET / (healthy) and
+the first 200 from GET /ready (every subsystem warm). The total time of
+``import app`` and of its slowest direct imports (from ``python -X
+importtime``) are listed too.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+MODES = ("lazy", "eager")
+
+
+def child(mode, model_load_seconds):
+    """Runs in the measured process; prints event times (epoch seconds) as JSON."""
+    from benchmarks import fakes
+
+    marks = {}
+    fakes.FakeSentenceTransformer.load_seconds = model_load_seconds
+    fakes.install()
+    import app as app_module
+    marks["imported"] = time.time()
+    fakes.patch_app(app_module)
+    import lazy
+
+    client = app_module.app.test_client()
+    if mode == "eager":
+        lazy.warm()
+    else:
+        lazy.warm_in_background()
+    while client.get("/").status_code != 200:
+        time.sleep(0.005)
+    marks["healthy"] = time.time()
+    while client.get("/ready").status_code != 200:
+        time.sleep(0.01)
+    marks["ready"] = time.time()
+    print(json.dumps(marks))
+
+
+def run_once(mode, args, workdir):
+    env = dict(os.environ, TTS_MODE="off", WARMUP="1")
+    env.pop("HUGGINGFACE_TOKEN", None)
+    started = time.time()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode,
+                          "--model-load-seconds", str(args.model_load_seconds)],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+    marks = json.loads(out.strip().splitlines()[-1])
+    return {name: marks[name] - started for name in ("imported", "healthy", "ready")}
+
+
+def slowest_imports(workdir, count=10):
+    """The modules ``import app`` imports directly, by cumulative import time (the fakes' own excluded)."""
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(HERE)!r}); "
+            "from benchmarks import fakes; fakes.install(); import app")
+    env = dict(os.environ, TTS_MODE="off")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir, env=env,
+                            capture_output=True, text=True).stderr
+    # A module's imports are listed before it, indented one level deeper.
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == "app":
+                ranked = sorted(children.items(), key=lambda item: -item[1])[:count]
+                return {"app": round(int(cumulative) / 1e6, 3),
+                        **{module: round(us / 1e6, 3) for module, us in ranked}}
+            children = {}
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="processes per mode")
+    parser.add_argument("--model-load-seconds", type=float, default=2.0, help="load time of each fake model")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/startup-<time>.json)")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.model_load_seconds)
+        return
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("startup-%Y%m%d-%H%M%S") + ".json"))
+    workdir = tempfile.mkdtemp(prefix="quicklearn-startup-")
+
+    results = []
+    for mode in MODES:
+        runs = [run_once(mode, args, workdir) for _ in range(args.runs)]
+        result = {"mode": mode, "runs": args.runs,
+                  **{f"{name}_seconds": round(statistics.median(r[name] for r in runs), 3)
+                     for name in ("imported", "healthy", "ready")}}
+        results.append(result)
+        print(f"{mode:<6} import {result['imported_seconds']:>6} s  healthy {result['healthy_seconds']:>6} s  "
+              f"ready {result['ready_seconds']:>6} s", flush=True)
+
+    imports = slowest_imports(workdir)
+    print("import app and its slowest imports (s):",
+          ", ".join(f"{name} {seconds}" for name, seconds in imports.items()))
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"model_load_seconds": args.model_load_seconds, "results": results,
+                   "slowest_imports_seconds": imports}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Transcript language resolution against a stubbed YouTube transcript backend.
+
+    cd server/flaskserver
+    python -m benchmarks.transcripts
+    python -m benchmarks.transcripts -n 100 --request-ms 250
+
+The backend is fakes.FakeYouTubeTranscriptApi, patched in for
+youtube-transcript-api: listing a video's transcripts and fetching one take
+``--request-ms`` each. Fixture videos offer English auto-captions, Hindi
+manual captions, both, or nothing (fixtures.transcript_languages). For each
+endpoint's language order (QUIZ_TRANSCRIPT_LANGUAGES and
+MIND_MAP_TRANSCRIPT_LANGUAGES) every video is resolved by:
+
+* ``per_language``: one get_transcript attempt per language until one
+  succeeds, as get_transcript_entries did before youtube.py;
+* ``single_listing``: youtube.resolve_transcript, one listing and one fetch;
+* ``store_warm``: app.get_transcript_entries once the video's language and
+  captions are in the transcript store.
+
+Reported per order and strategy: latency percentiles, backend requests per
+video, the share of videos with a transcript, and the share where the
+language chosen matches ``per_language``'s.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks import fakes, fixtures  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+STRATEGIES = ("per_language", "single_listing", "store_warm")
+
+
+def per_language(api, video_id, languages):
+    for language in languages:
+        try:
+            return api.get_transcript(video_id, languages=[language]), language
+        except Exception:
+            continue
+    return None, None
+
+
+def run_strategy(strategy, api, app_module, videos, languages):
+    import youtube
+
+    if strategy == "store_warm":
+        for video_id in videos:
+            app_module.get_transcript_entries(video_id, languages)
+    requests = api.requests
+    latencies, chosen = [], []
+    for video_id in videos:
+        started = time.perf_counter()
+        if strategy == "per_language":
+            _, language = per_language(api, video_id, languages)
+        elif strategy == "single_listing":
+            _, language = youtube.resolve_transcript(video_id, languages)
+        else:
+            _, language = app_module.get_transcript_entries(video_id, languages)
+        latencies.append((time.perf_counter() - started) * 1000)
+        chosen.append(language)
+    return chosen, {
+        "strategy": strategy,
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 2) for p in ("p50", "p95")},
+        "requests_per_video": round((api.requests - requests) / len(videos), 2),
+        "found": round(sum(language is not None for language in chosen) / len(videos), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--videos", type=int, default=40)
+    parser.add_argument("--request-ms", type=float, default=100.0, help="latency of every backend request")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/transcripts-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("transcripts-%Y%m%d-%H%M%S") + ".json"))
+    os.chdir(tempfile.mkdtemp(prefix="quicklearn-transcripts-"))
+    os.environ.setdefault("TTS_MODE", "off")
+
+    fakes.install()
+    import app as app_module
+    import youtube
+    fakes.patch_app(app_module)
+    api = fakes.FakeYouTubeTranscriptApi(args.request_ms / 1000)
+    youtube.YouTubeTranscriptApi = api
+    app_module.resolve_transcript = youtube.resolve_transcript
+    import logging
+    logging.getLogger().setLevel(logging.ERROR)
+
+    videos = [fixtures.video_id("S", n) for n in range(args.videos)]
+    orders = {"quiz": app_module.QUIZ_TRANSCRIPT_LANGUAGES, "mind_map": app_module.MIND_MAP_TRANSCRIPT_LANGUAGES}
+    results = []
+    for endpoint, languages in orders.items():
+        reference = None
+        for strategy in STRATEGIES:
+            chosen, result = run_strategy(strategy, api, app_module, videos, languages)
+            reference = reference or chosen
+            result.update(endpoint=endpoint, languages=languages,
+                          same_language=round(sum(a == b for a, b in zip(chosen, reference)) / len(videos), 3))
+            results.append(result)
+            print(f"{endpoint:<9} {','.join(languages):<6} {strategy:<15} p50 {result['latency_ms']['p50']:>8} ms  "
+                  f"p95 {result['latency_ms']['p95']:>8} ms  requests/video {result['requests_per_video']:<5} "
+                  f"found {result['found']}  same language {result['same_language']}", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"videos": args.videos, "request_ms": args.request_ms, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
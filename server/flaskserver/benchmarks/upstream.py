@@ -0,0 +1,135 @@
+"""The upstream LLM layer against fake providers that inject latency and 429s.
+
+    cd server/flaskserver
+    python -m benchmarks.upstream
+    python -m benchmarks.upstream -s rate_limited -n 400 -c 32
+
+Each scenario configures fake Groq, Gemini and local GPT4All providers
+(benchmarks/fakes.FakeLLM) and sends the same prompt load three ways:
+
+* ``direct``: straight to Groq, as every call did before upstream.py;
+* ``upstream``: through UpstreamLLM with failover and hedging;
+* ``upstream_no_hedge``: the same without hedged requests.
+
+Reported per mode: success rate, latency percentiles, calls and 429s per
+provider, hedges, failovers, and the final Groq concurrency limit and
+circuit state.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+# The local tier only takes part when a model is configured; the fake never reads it.
+os.environ.setdefault("GPT4ALL_MODEL", "fake-local-model.gguf")
+os.environ.setdefault("UPSTREAM_BREAKER_COOLDOWN", "2")
+
+from benchmarks import fakes  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+PROMPT = "Create a quiz on the topic: Calculus. Generate 5 multiple-choice questions of medium difficulty."
+
+SCENARIOS = {
+    # Groq answers fast but only takes 4 calls at a time; 5% of calls hit a 3 s tail.
+    "rate_limited": {
+        "groq": dict(latency=0.2, max_concurrency=4, tail_rate=0.05, tail_latency=3.0),
+        "gemini": dict(latency=0.4, tail_rate=0.02, tail_latency=2.0),
+        "gpt4all": dict(latency=1.5, max_concurrency=1),
+    },
+    # Groq is healthy but has a heavy latency tail.
+    "slow_tail": {
+        "groq": dict(latency=0.2, tail_rate=0.1, tail_latency=5.0),
+        "gemini": dict(latency=0.4),
+        "gpt4all": dict(latency=1.5, max_concurrency=1),
+    },
+    # Groq rejects everything: the breaker should open and send traffic straight to Gemini.
+    "groq_outage": {
+        "groq": dict(latency=0.05, error_rate=1.0),
+        "gemini": dict(latency=0.4),
+        "gpt4all": dict(latency=1.5, max_concurrency=1),
+    },
+}
+
+
+def run_mode(mode, config, requests, concurrency):
+    import upstream
+    from llm_registry import registry
+
+    providers = {name: fakes.FakeLLM(tokens_per_second=5000, seed=i, **kwargs)
+                 for i, (name, kwargs) in enumerate(config.items())}
+    fakes.install(providers=providers)
+    registry.close()
+    upstream.reset()
+    if mode == "direct":
+        call = providers["groq"].invoke
+    else:
+        call = upstream.UpstreamLLM(hedge=(mode == "upstream")).invoke
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            call(PROMPT)
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, ok in results if ok]
+    stats = upstream.stats()
+    groq = stats["providers"].get("groq", {})
+    return {
+        "mode": mode,
+        "success_rate": round(len(latencies) / requests, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {p: round(percentile(latencies, int(p[1:])), 1) if latencies else None
+                       for p in ("p50", "p95", "p99")},
+        "provider_calls": {name: fake.calls for name, fake in providers.items()},
+        "provider_429s": {name: fake.rejected for name, fake in providers.items()},
+        "hedges": stats["hedges"],
+        "hedge_wins": stats["hedge_wins"],
+        "failovers": stats["failovers"],
+        "groq_limit": groq.get("limit"),
+        "groq_breaker": groq.get("breaker"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenarios", default="all", help=f"comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/upstream-<time>.json)")
+    args = parser.parse_args()
+
+    import logging
+    logging.basicConfig(level=logging.ERROR)
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    results = []
+    for name in names:
+        for mode in ("direct", "upstream", "upstream_no_hedge"):
+            result = dict(run_mode(mode, SCENARIOS[name], args.requests, args.concurrency), scenario=name)
+            results.append(result)
+            print(f"{name:<13} {mode:<18} ok {result['success_rate']:>6}  p50 {result['latency_ms']['p50']}  "
+                  f"p95 {result['latency_ms']['p95']}  p99 {result['latency_ms']['p99']} ms  "
+                  f"calls {result['provider_calls']}  hedges {result['hedges']}  failovers {result['failovers']}  "
+                  f"groq limit {result['groq_limit']} ({result['groq_breaker']})", flush=True)
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("upstream-%Y%m%d-%H%M%S") + ".json"))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"requests": args.requests, "concurrency": args.concurrency, "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""The persistent vector index (vector_index.py): recall@k and latency per index type.
+
+    cd server/flaskserver
+    python -m benchmarks.vector_index                       # 1M vectors, hnsw, ivf and flat
+    python -m benchmarks.vector_index -n 100000 -t hnsw,flat -k 10 --queries 500
+
+Synthetic embeddings (unit vectors around ``--clusters`` random centres, so
+that neighbourhoods mean something) are added to a fresh VectorIndex of each
+type in batches, as store_in_faiss does. The index is then searched with
+perturbed copies of stored vectors. Recall@k is measured against an exact
+brute-force search over the same vectors, so the flat index shows the
+ceiling (1.0) and its latency the cost the approximate indexes avoid.
+
+Reported per index type: build time (SQLite inserts plus indexing, and for
+IVF the wait for its background training), recall@k, search latency
+percentiles (FAISS search plus the metadata lookup), the snapshot size on
+disk, and the time to reopen the index from that snapshot.
+
+store_in_faiss and search_faiss, the only users of the index, are not yet
+called by any route, so these numbers size the index ahead of its use.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from benchmarks.run import percentile  # noqa: E402
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def corpus(n, dimension, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = unit(rng.standard_normal((clusters, dimension)).astype(np.float32))
+    assignment = rng.integers(0, clusters, n)
+    return unit(centres[assignment] + 0.5 / np.sqrt(dimension) * rng.standard_normal((n, dimension)).astype(np.float32))
+
+
+def queries(vectors, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), count, replace=False)]
+    return unit(picked + 0.1 / np.sqrt(vectors.shape[1]) * rng.standard_normal(picked.shape).astype(np.float32))
+
+
+def exact_neighbours(vectors, query_vectors, k):
+    import faiss
+
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    _, ids = index.search(query_vectors, k)
+    return ids + 1  # VectorIndex ids are SQLite rowids, counted from 1
+
+
+def run_type(index_type, vectors, query_vectors, truth, args):
+    import vector_index
+    from vector_index import VectorIndex
+
+    path = tempfile.mkdtemp(prefix=f"quicklearn-vectors-{index_type}-")
+    started = time.perf_counter()
+    index = VectorIndex(vectors.shape[1], path=path, index_type=index_type)
+    for start in range(0, len(vectors), args.batch):
+        index.add(vectors[start:start + args.batch], f"doc-{start // args.batch}")
+    while index._retraining:
+        time.sleep(0.1)
+    build_seconds = time.perf_counter() - started
+
+    hits, latencies = 0, []
+    for query, expected in zip(query_vectors, truth):
+        started = time.perf_counter()
+        found = index.search(query, args.k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({meta["id"] for _, meta in found} & set(expected.tolist()))
+
+    index.snapshot()
+    started = time.perf_counter()
+    VectorIndex(vectors.shape[1], path=path, index_type=index_type)
+    reopen_seconds = time.perf_counter() - started
+    snapshot_mb = os.path.getsize(index.index_path) / 2 ** 20
+    shutil.rmtree(path)
+    return {
+        "index_type": index_type,
+        "vectors": len(vectors),
+        "build_seconds": round(build_seconds, 2),
+        f"recall_at_{args.k}": round(hits / (len(query_vectors) * args.k), 4),
+        "search_ms": {p: round(percentile(latencies, int(p[1:])), 3) for p in ("p50", "p95", "p99")},
+        "snapshot_mb": round(snapshot_mb, 1),
+        "reopen_seconds": round(reopen_seconds, 3),
+        "settings": {"hnsw_m": vector_index.VECTOR_INDEX_HNSW_M, "ef_search": vector_index.VECTOR_INDEX_EF_SEARCH,
+                     "nprobe": vector_index.VECTOR_INDEX_NPROBE},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--vectors", type=int, default=1_000_000)
+    parser.add_argument("-d", "--dimension", type=int, default=768, help="768 for the default FAISS_EMBEDDING_MODEL")
+    parser.add_argument("-t", "--types", default="hnsw,ivf,flat", help="comma-separated VECTOR_INDEX_TYPE values")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=10000, help="vectors per VectorIndex.add call")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/vector-index-<time>.json)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output or os.path.join(
+        HERE, "results", time.strftime("vector-index-%Y%m%d-%H%M%S") + ".json"))
+    import logging
+    logging.getLogger().setLevel(logging.ERROR)
+
+    vectors = corpus(args.vectors, args.dimension, args.clusters)
+    query_vectors = queries(vectors, args.queries)
+    truth = exact_neighbours(vectors, query_vectors, args.k)
+
+    results = []
+    for index_type in args.types.split(","):
+        result = run_type(index_type, vectors, query_vectors, truth, args)
+        results.append(result)
+        print(f"{index_type:<5} {result['vectors']} vectors  build {result['build_seconds']:>8} s  "
+              f"recall@{args.k} {result[f'recall_at_{args.k}']:<6}  p50 {result['search_ms']['p50']:>8} ms  "
+              f"p95 {result['search_ms']['p95']:>8} ms  snapshot {result['snapshot_mb']} MB  "
+              f"reopen {result['reopen_seconds']} s", flush=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"dimension": args.dimension, "k": args.k, "queries": args.queries, "clusters": args.clusters,
+                   "results": results}, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Tiered transcript cleaning: a local fast path with the LLM cleaner as fallback.
+
+``TRANSCRIPT_CLEANER`` selects the tier:
+
+* ``llm``   - always use the LLM cleaner (the original behaviour, and the default).
+* ``local`` - always use the deterministic local cleaner and relevance check.
+* ``auto``  - clean locally and ask the embedding-based relevance classifier
+  whether the transcript is educational. Only when its margin is below
+  ``CLEANER_MIN_CONFIDENCE`` (or the cleaned text is suspiciously short)
+  does the LLM cleaner run.
+
+In ``auto`` mode a ``CLEANER_SHADOW_RATE`` fraction of local decisions is
+also sent to the LLM in the background, so the agreement rate between the
+tiers is measured on real traffic. Counts, latency, LLM tokens and agreement
+are kept in the Redis hash ``cleaner:stats``. ``python -m benchmarks.cleaning``
+compares the tiers on labelled fixture transcripts.
+"""
+import html
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import numpy as np
+import redis
+
+from longform import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_CLEANER = os.getenv("TRANSCRIPT_CLEANER", "llm")  # auto | local | llm
+CLEANER_MIN_CONFIDENCE = float(os.getenv("CLEANER_MIN_CONFIDENCE", 0.05))
+CLEANER_MIN_WORDS = int(os.getenv("CLEANER_MIN_WORDS", 50))
+CLEANER_SHADOW_RATE = float(os.getenv("CLEANER_SHADOW_RATE", 0.0))
+# Bump when local_clean or the prototypes change, so cached local results are not reused.
+LOCAL_CLEANER_VERSION = "1"
+STATS_KEY = "cleaner:stats"
+FAKE_TRANSCRIPT = "Fake transcript"
+
+FILLER_WORDS = re.compile(r"\b(?:um+|uh+|erm+|hmm+|uh-huh|you know|i mean)\b[,.]?\s*", re.IGNORECASE)
+CAPTION_TAGS = re.compile(r"\[(?:music|applause|laughter|inaudible|foreign|noise)\]|♪+", re.IGNORECASE)
+WORDS_PER_LINE = 20
+
+EDUCATIONAL_PROTOTYPES = [
+    "In this lecture we will learn the definition of the concept and work through an example.",
+    "Today's lesson explains the theory, the formula and how to solve this type of problem.",
+    "Let us understand how this algorithm works step by step.",
+    "This chapter covers the causes, the key events and their historical significance.",
+    "The experiment shows how the reaction depends on temperature and concentration.",
+    "Remember this for your exam: the main points of this topic are as follows.",
+    "Is video mein hum is topic ko example ke saath samjhenge.",
+]
+NON_EDUCATIONAL_PROTOTYPES = [
+    "Don't forget to like, share and subscribe and hit the bell icon.",
+    "Check out my vlog, today I'm unboxing my new phone and showing my room.",
+    "This song is about love and dancing all night long.",
+    "Let's play this game, oh no I died, that was so funny.",
+    "Prank gone wrong, watch till the end for the reaction.",
+    "Buy now with my discount code, link in the description.",
+]
+
+
+def _verdict(text):
+    return "fake" if text.strip().lower().strip(" .'\"") == FAKE_TRANSCRIPT.lower() else "educational"
+
+
+def local_clean(entries):
+    """Deterministically clean caption entries into sentences, one per line."""
+    words = []
+    previous = []
+    for entry in entries:
+        text = html.unescape(entry.get("text", "") if isinstance(entry, dict) else str(entry))
+        text = CAPTION_TAGS.sub(" ", text)
+        text = FILLER_WORDS.sub("", text)
+        tokens = text.split()
+        if not tokens:
+            continue
+        # Auto-generated captions repeat the tail of the previous line; drop the overlap.
+        overlap = 0
+        for size in range(min(len(tokens), len(previous)), 0, -1):
+            if [t.lower() for t in previous[-size:]] == [t.lower() for t in tokens[:size]]:
+                overlap = size
+                break
+        words.extend(tokens[overlap:])
+        previous = tokens
+
+    # Collapse immediately repeated words ("the the").
+    deduped = [w for i, w in enumerate(words) if i == 0 or w.lower() != words[i - 1].lower()]
+    text = " ".join(deduped)
+
+    if re.search(r"[.!?]", text):
+        lines = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text)]
+    else:
+        # Unpunctuated auto-captions: fall back to fixed-size lines.
+        lines = [" ".join(deduped[i:i + WORDS_PER_LINE]) for i in range(0, len(deduped), WORDS_PER_LINE)]
+    return "\n".join(line[:1].upper() + line[1:] for line in lines if line)
+
+
+class RelevanceClassifier:
+    """Educational-or-not by embedding similarity to hand-written prototype sentences."""
+
+    def __init__(self, encoder, samples=8):
+        self.encoder = encoder
+        self.samples = samples
+        self._prototypes = None
+        self._lock = threading.Lock()
+
+    def _normalize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+    def _load_prototypes(self):
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    self._prototypes = (
+                        self._normalize(self.encoder.encode(EDUCATIONAL_PROTOTYPES)),
+                        self._normalize(self.encoder.encode(NON_EDUCATIONAL_PROTOTYPES)),
+                    )
+        return self._prototypes
+
+    def score(self, text):
+        """Return (is_educational, margin); the margin is how far the evidence leans either way."""
+        educational, other = self._load_prototypes()
+        words = text.split()
+        if not words:
+            return False, 1.0
+        # Embed a few evenly spaced windows rather than the whole transcript.
+        step = max(1, len(words) // self.samples)
+        windows = [" ".join(words[i:i + 100]) for i in range(0, len(words), step)][:self.samples]
+        vectors = self._normalize(self.encoder.encode(windows))
+        edu = float(np.mean(np.max(vectors @ educational.T, axis=1)))
+        non = float(np.mean(np.max(vectors @ other.T, axis=1)))
+        return edu >= non, abs(edu - non)
+
+
+class TranscriptCleaner:
+    def __init__(self, classifier, llm_clean, redis_client, mode=TRANSCRIPT_CLEANER,
+                 min_confidence=CLEANER_MIN_CONFIDENCE, shadow_rate=CLEANER_SHADOW_RATE):
+        if mode not in ("auto", "local", "llm"):
+            raise ValueError(f"Unknown transcript cleaner: {mode}")
+        self.classifier = classifier
+        self.llm_clean = llm_clean  # formatted transcript -> cleaned text or "Fake transcript"
+        self.redis = redis_client
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self.shadow_rate = shadow_rate
+
+    def clean(self, entries, formatted_transcript):
+        """Return (cleaned transcript, tier that produced it)."""
+        if self.mode != "llm":
+            started = time.perf_counter()
+            cleaned = local_clean(entries)
+            educational, confidence = self.classifier.score(cleaned)
+            confident = confidence >= self.min_confidence and len(cleaned.split()) >= CLEANER_MIN_WORDS
+            if self.mode == "local" or confident:
+                result = cleaned if educational else FAKE_TRANSCRIPT
+                self._record("local", time.perf_counter() - started)
+                if self.mode == "auto" and random.random() < self.shadow_rate:
+                    threading.Thread(target=self._shadow, args=(formatted_transcript, _verdict(result)),
+                                     daemon=True, name="cleaner-shadow").start()
+                return result, "local"
+            self._record("local_fallback", time.perf_counter() - started)
+        return self._clean_with_llm(formatted_transcript), "llm"
+
+    def _clean_with_llm(self, formatted_transcript, tier="llm"):
+        started = time.perf_counter()
+        cleaned = self.llm_clean(formatted_transcript)
+        self._record(tier, time.perf_counter() - started,
+                     tokens=estimate_tokens(formatted_transcript) + estimate_tokens(cleaned))
+        return cleaned
+
+    def _shadow(self, formatted_transcript, local_verdict):
+        try:
+            agreed = _verdict(self._clean_with_llm(formatted_transcript, tier="shadow")) == local_verdict
+            self.redis.hincrby(STATS_KEY, "shadow:count", 1)
+            self.redis.hincrby(STATS_KEY, "shadow:agree", int(agreed))
+        except Exception as e:
+            logger.error(f"Shadow transcript cleaning failed: {e}")
+
+    def _record(self, tier, seconds, tokens=0):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(STATS_KEY, f"{tier}:count", 1)
+            pipe.hincrbyfloat(STATS_KEY, f"{tier}:seconds", seconds)
+            if tokens:
+                pipe.hincrby(STATS_KEY, f"{tier}:tokens", tokens)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {}
+        stats = {"mode": self.mode, "tiers": {}}
+        for tier in ("local", "local_fallback", "llm", "shadow"):
+            count = int(raw.get(f"{tier}:count", 0))
+            seconds = float(raw.get(f"{tier}:seconds", 0))
+            stats["tiers"][tier] = {
+                "count": count,
+                "avg_seconds": round(seconds / count, 4) if count else None,
+                "tokens": int(raw.get(f"{tier}:tokens", 0)),
+            }
+        shadowed = int(raw.get("shadow:count", 0))
+        stats["shadow"] = {
+            "count": shadowed,
+            "agreement_rate": round(int(raw.get("shadow:agree", 0)) / shadowed, 4) if shadowed else None,
+        }
+        return stats
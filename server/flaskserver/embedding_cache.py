@@ -0,0 +1,108 @@
+"""Persistent embedding cache keyed by (model name, chunk hash).
+
+Backed by a SQLite file so it survives restarts and is shared by the web
+process and the job workers. Hit/miss counters and the estimated embedding
+time saved are stored alongside the vectors.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, chunk_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, chunk_hash))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    def _connect(self):
+        # A short-lived connection per operation keeps this safe across threads and forks.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, model, hashes):
+        if not hashes:
+            return {}
+        found = {}
+        with self._connect() as conn:
+            # SQLite limits bound parameters, so look hashes up in slices.
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                )
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model, items):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, chunk_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items],
+            )
+
+    def record(self, **counters):
+        """Add to named counters, e.g. record(hits=3, misses=1)."""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(counters.items()),
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            values = dict(conn.execute("SELECT name, value FROM stats"))
+        hits, misses = int(values.get("hits", 0)), int(values.get("misses", 0))
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "embedding_seconds_saved": round(values.get("seconds_saved", 0.0), 3),
+            "duplicate_documents": int(values.get("duplicate_documents", 0)),
+        }
+
+
+class CachedEncoder:
+    """Wraps a SentenceTransformer-style encoder so only uncached chunks are embedded."""
+
+    def __init__(self, encoder, model_name, cache):
+        self.encoder = encoder
+        self.model_name = model_name
+        self.cache = cache
+        self._seconds_per_chunk = None
+
+    def encode(self, texts, batch_size=32):
+        hashes = [chunk_hash(t) for t in texts]
+        cached = self.cache.get_many(self.model_name, sorted(set(hashes)))
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h not in cached:
+                missing.setdefault(h, text)
+
+        if missing:
+            started = time.perf_counter()
+            vectors = self.encoder.encode(list(missing.values()), batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            self._seconds_per_chunk = elapsed / len(missing)
+            fresh = {h: np.asarray(v, dtype=np.float32) for h, v in zip(missing, vectors)}
+            self.cache.put_many(self.model_name, fresh.items())
+            cached.update(fresh)
+
+        hits = len(texts) - len(missing)
+        self.cache.record(hits=hits, misses=len(missing), seconds_saved=hits * (self._seconds_per_chunk or 0.0))
+        return np.stack([cached[h] for h in hashes])
@@ -0,0 +1,145 @@
+"""Process-wide embedding service with cross-request micro-batching.
+
+Each SentenceTransformer model is loaded once, on first use. Small encode
+calls from concurrent requests (e.g. one /query embedding per user) are put
+on a per-model queue and coalesced into one ``model.encode`` call of up to
+``EMBED_MAX_BATCH`` texts, waiting up to ``EMBED_MAX_WAIT_MS`` for each next
+request. Calls that are already a full batch (document ingestion) skip the
+queue. ``python -m benchmarks.embeddings`` sweeps both settings.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", 64))
+# 2 ms: about half a single-query encode. Longer waits only add latency once clients queue on their own.
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", 2))
+
+
+_hf_logged_in = False
+
+
+def _hf_login():
+    """Authenticate with Hugging Face once, just before the first model download."""
+    global _hf_logged_in
+    token = os.getenv("HUGGINGFACE_TOKEN")
+    if token and not _hf_logged_in:
+        from huggingface_hub import login
+        login(token=token)
+    _hf_logged_in = True
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def submit(self, texts):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((texts, future))
+        return future
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a forked worker process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, daemon=True, name="embedding-batcher").start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            try:
+                while size < self.max_batch:
+                    item = self._queue.get(timeout=self.max_wait)
+                    batch.append(item)
+                    size += len(item[0])
+            except queue.Empty:
+                pass
+            self._encode(batch)
+
+    def _encode(self, batch):
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        try:
+            vectors = self.model.encode(texts, batch_size=self.max_batch)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for item_texts, future in batch:
+            future.set_result(vectors[start:start + len(item_texts)])
+            start += len(item_texts)
+
+
+class EmbeddingService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._batchers = {}
+
+    def model(self, name):
+        """The loaded SentenceTransformer for ``name``, loading it on first use."""
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    from sentence_transformers import SentenceTransformer
+                    _hf_login()
+                    model = SentenceTransformer(name)
+                    self._models[name] = model
+                    self._batchers[name] = MicroBatcher(model)
+        return model
+
+    def loaded(self):
+        return list(self._models)
+
+    def dimension(self, name):
+        return self.model(name).get_sentence_embedding_dimension()
+
+    def encode(self, texts, model, batch_size=None):
+        """Embed a string or list of strings with ``model``.
+
+        Mirrors SentenceTransformer.encode: a single string returns one vector,
+        a list returns a 2-D array.
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        encoder = self.model(model)
+        if len(texts) >= EMBED_MAX_BATCH:
+            vectors = encoder.encode(texts, batch_size=batch_size or EMBED_MAX_BATCH)
+        else:
+            vectors = self._batchers[model].submit(texts).result()
+        vectors = np.asarray(vectors)
+        return vectors[0] if single else vectors
+
+    def encoder(self, model):
+        """An object with SentenceTransformer's encode() signature bound to one model."""
+        return BoundEncoder(self, model)
+
+
+class BoundEncoder:
+    def __init__(self, service, model):
+        self.service = service
+        self.model_name = model
+
+    def encode(self, texts, batch_size=None):
+        return self.service.encode(texts, self.model_name, batch_size=batch_size)
+
+    def get_sentence_embedding_dimension(self):
+        return self.service.dimension(self.model_name)
+
+
+embedding_service = EmbeddingService()
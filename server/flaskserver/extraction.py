@@ -0,0 +1,99 @@
+"""Lazy, bounded text extraction for uploaded PDF and PPTX files.
+
+Extractors yield ``(page_number, text)`` one page or slide at a time, so
+chunking and embedding can start before the whole file has been read.
+
+PDFs are untrusted input, so by default they are parsed outside the server
+process, by a pool of ``EXTRACT_WORKERS`` processes (1 by default) whose
+address space may grow at most ``EXTRACT_MAX_MEMORY_MB`` beyond what it
+started with; a pathological file fails that one upload instead of
+exhausting the host. Pages are extracted in ranges of ``EXTRACT_RANGE_SIZE``,
+at most ``2 * EXTRACT_WORKERS`` ranges in flight at once, and PDFs of
+``EXTRACT_PARALLEL_MIN_PAGES`` pages or more spread their ranges over every
+worker. ``EXTRACT_WORKERS=0`` parses in the server process instead, which is
+faster for small files but has no memory ceiling at all.
+"""
+import multiprocessing
+import os
+import resource
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", 1))
+EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", 100))
+EXTRACT_RANGE_SIZE = int(os.getenv("EXTRACT_RANGE_SIZE", 16))
+EXTRACT_MAX_MEMORY_MB = int(os.getenv("EXTRACT_MAX_MEMORY_MB", 1024))
+
+
+def iter_pdf_pages(pdf_path, workers=EXTRACT_WORKERS):
+    """Yield (page number, text) for each page, starting at 1."""
+    if workers > 0:
+        yield from _iter_pdf_pages_bounded(pdf_path, workers)
+        return
+    from PyPDF2 import PdfReader
+    reader = PdfReader(pdf_path)
+    for page_number, page in enumerate(reader.pages, start=1):
+        yield page_number, page.extract_text() or ""
+
+
+def iter_pptx_slides(pptx_path):
+    """Yield (slide number, text) for each slide, starting at 1."""
+    from pptx import Presentation
+    prs = Presentation(pptx_path)
+    for slide_number, slide in enumerate(prs.slides, start=1):
+        yield slide_number, " ".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+
+
+def _address_space():
+    """This process's current virtual memory size in bytes."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * resource.getpagesize()
+
+
+def _limit_memory(max_mb):
+    try:
+        inherited = _address_space()
+    except OSError:
+        return  # no /proc (macOS, which does not enforce RLIMIT_AS anyway)
+    limit = inherited + max_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _pool(workers, max_mb=None):
+    """A process pool whose workers are capped at ``max_mb`` (default EXTRACT_MAX_MEMORY_MB)."""
+    # forkserver, not fork: the server is multithreaded, and a forked child can inherit a lock
+    # another thread held. The fork server imports __main__ once; its children are forked from it.
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["__main__", "extraction", "PyPDF2"])
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_limit_memory,
+                               initargs=(EXTRACT_MAX_MEMORY_MB if max_mb is None else max_mb,))
+
+
+def _count_pages(pdf_path):
+    from PyPDF2 import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+
+def _extract_range(pdf_path, start, stop):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(pdf_path)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _iter_pdf_pages_bounded(pdf_path, workers):
+    with _pool(workers) as pool:
+        num_pages = pool.submit(_count_pages, pdf_path).result()
+        if num_pages < EXTRACT_PARALLEL_MIN_PAGES:
+            workers = 1
+        ranges = deque((start, min(start + EXTRACT_RANGE_SIZE, num_pages))
+                       for start in range(0, num_pages, EXTRACT_RANGE_SIZE))
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                start, stop = ranges.popleft()
+                pending.append(pool.submit(_extract_range, pdf_path, start, stop))
+            # Results are yielded in page order; later ranges keep running meanwhile.
+            yield from pending.popleft().result()
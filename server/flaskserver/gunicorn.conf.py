@@ -0,0 +1,62 @@
+"""Production serving config.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (``preload_app``) and the embedding
+models and vector index listed in ``PRELOAD_RESOURCES`` are loaded there
+before forking, so every worker shares their memory copy-on-write instead of
+loading its own copy. Everything else that holds sockets or file handles
+(Chroma, LLM HTTP pools, Redis and Mongo connections) is reopened lazily in
+each worker after the fork.
+
+Most request time is spent waiting on LLM APIs, so each worker runs
+``GUNICORN_THREADS`` threads; add workers for CPU-bound embedding load.
+With a local model configured (``GPT4ALL_MODEL``), every worker loads
+``LOCAL_LLM_POOL_SIZE`` instances of it after the fork; keep workers x pool
+size x ``LOCAL_LLM_THREADS`` within the cores left over for requests.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+preload_app = True
+# Quiz generation and long-transcript map-reduce can take minutes.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+PRELOAD_RESOURCES = os.getenv("PRELOAD_RESOURCES", "embeddings:chroma,embeddings:faiss,vector_index").split(",")
+
+
+def when_ready(server):
+    import lazy
+    lazy.warm(PRELOAD_RESOURCES)
+    server.log.info(f"Preloaded {', '.join(n for n, s in lazy.status().items() if s['ready'])}")
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    import lazy
+    import app
+    from llm_registry import registry
+
+    # Anything holding connections is rebuilt in the worker; preloaded models stay shared.
+    rebuilt = [name for name in lazy.resources if name not in PRELOAD_RESOURCES]
+    for name in rebuilt:
+        lazy.resources[name].reset()
+    registry.close()
+    app.redis_client.connection_pool.reset()
+    # Some resources (the LLM clients) are never built by a request; warm them so /ready turns green.
+    if os.getenv("WARMUP", "1") == "1":
+        lazy.warm_in_background(rebuilt)
@@ -0,0 +1,83 @@
+"""Chunked, batched ingestion of uploaded documents into Chroma.
+
+Documents arrive as an iterable of ``(page_number, text)`` pairs, are split
+into overlapping chunks and embedded ``INGEST_BATCH_SIZE`` chunks at a time,
+so only one batch of chunks is held in memory at once. Every chunk is stored
+with its document id (the hash of the uploaded bytes), its source file name
+(for display only: different files may share a name), page (or slide)
+number and character offset in that page.
+When a ``keyword_index`` is given, the same chunks are also indexed there for
+hybrid retrieval (see retrieval.py).
+"""
+import logging
+import os
+import time
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 1000))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", 200))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
+
+
+@lru_cache(maxsize=1)
+def get_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=INGEST_CHUNK_SIZE,
+        chunk_overlap=INGEST_CHUNK_OVERLAP,
+        add_start_index=True,
+    )
+
+
+def iter_chunks(pages, doc_id, source, unit="page"):
+    """Yield (chunk_id, text, metadata) for every chunk of every page."""
+    for page_number, text in pages:
+        if not text or not text.strip():
+            continue
+        for doc in get_splitter().create_documents([text]):
+            offset = doc.metadata["start_index"]
+            metadata = {"doc_id": doc_id, "source": source, "unit": unit, "page": page_number, "offset": offset}
+            yield f"{doc_id}:{page_number}:{offset}", doc.page_content, metadata
+
+
+def ingest_document(collection, encoder, doc_id, source, pages, unit="page", batch_size=INGEST_BATCH_SIZE,
+                    keyword_index=None):
+    """Replace document ``doc_id``'s chunks in ``collection``; other documents are left untouched.
+
+    ``source`` is the file name shown with retrieved chunks. Returns the number
+    of chunks stored.
+    """
+    started = time.perf_counter()
+    collection.delete(where={"doc_id": doc_id})
+    if keyword_index is not None:
+        keyword_index.delete_document(doc_id)
+
+    count = 0
+    batch = []
+    for chunk in iter_chunks(pages, doc_id, source, unit):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            count += _store_batch(collection, encoder, batch, batch_size, keyword_index)
+            batch = []
+    if batch:
+        count += _store_batch(collection, encoder, batch, batch_size, keyword_index)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Ingested {count} chunks from {source} in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} chunks/s)")
+    return count
+
+
+def _store_batch(collection, encoder, batch, batch_size, keyword_index=None):
+    ids, texts, metadatas = zip(*batch)
+    embeddings = encoder.encode(list(texts), batch_size=batch_size)
+    collection.upsert(
+        ids=list(ids),
+        documents=list(texts),
+        embeddings=[e.tolist() for e in embeddings],
+        metadatas=list(metadatas),
+    )
+    if keyword_index is not None:
+        keyword_index.add(batch)
+    return len(ids)
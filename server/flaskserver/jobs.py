@@ -0,0 +1,324 @@
+"""Redis-backed job queue for long-running endpoints.
+
+Tasks are plain functions registered with ``JobQueue.task``. They receive the
+request payload and a ``JobContext`` and return ``(body, status_code)``, the
+same shape the Flask views return, so a synchronous endpoint is just
+``job_queue.run(name, payload)``.
+
+Jobs are submitted to a Redis list and consumed by a pool of worker
+processes (see worker.py). Every job has a status hash with progress, result
+and error fields that expires ``JOB_RESULT_TTL`` seconds after it finishes.
+Tasks that raise are retried with exponential backoff; a job that fails
+after its last retry is also recorded on a dead-letter list (``<name>:dead``,
+the newest ``JOB_DEAD_LETTER_MAX`` kept) for inspection. Cancellation is
+cooperative and checked whenever a task reports progress.
+
+A worker moves the job it takes to a processing list and renews a lease on
+it while the task runs. If the worker dies, the lease runs out after
+``JOB_VISIBILITY_TIMEOUT`` seconds and another worker puts the job back on
+the queue (counting it as a failed attempt).
+
+Synchronous endpoints (``run``) follow ``JOB_SYNC_MODE``. The default,
+``inline``, runs the task in the request thread, so it needs no worker
+process but has none of the above: no lease, no retries and no dead-letter
+record; a failure is returned as a 500 at once. ``queue`` submits the job
+and waits for a worker, with every guarantee of an asynchronous job.
+
+Callbacks are only sent to hosts listed in ``JOB_CALLBACK_HOSTS`` (a leading
+dot allows subdomains); with the default empty list, callback URLs are
+rejected.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 3600))
+JOB_MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", 2))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", 2.0))
+JOB_WAIT_TIMEOUT = int(os.getenv("JOB_WAIT_TIMEOUT", 600))
+# "inline" runs synchronous endpoints in the request thread, without leases, retries or
+# dead-lettering; "queue" hands them to the worker pool (worker.py) and waits for the result.
+JOB_SYNC_MODE = os.getenv("JOB_SYNC_MODE", "inline")
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", 60))
+JOB_DEAD_LETTER_MAX = int(os.getenv("JOB_DEAD_LETTER_MAX", 1000))
+JOB_CALLBACK_HOSTS = [h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()]
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def callback_allowed(url, hosts=None):
+    """Whether job results may be POSTed to ``url``: http(s) to a host in JOB_CALLBACK_HOSTS."""
+    hosts = JOB_CALLBACK_HOSTS if hosts is None else hosts
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return False
+    if parts.scheme not in ("http", "https") or not host:
+        return False
+    return any(host == allowed or (allowed.startswith(".") and host.endswith(allowed)) for allowed in hosts)
+
+
+class JobContext:
+    """Handed to a task so it can report progress and notice cancellation."""
+
+    def __init__(self, queue=None, job_id=None):
+        self.queue = queue
+        self.job_id = job_id
+
+    def progress(self, stage, percent=None):
+        if self.queue is None:
+            return
+        if self.queue.redis.hget(self.queue.job_key(self.job_id), "cancel_requested"):
+            raise JobCancelled(self.job_id)
+        fields = {"stage": stage, "updated_at": time.time()}
+        if percent is not None:
+            fields["progress"] = percent
+        self.queue.redis.hset(self.queue.job_key(self.job_id), mapping=fields)
+
+
+class JobQueue:
+    def __init__(self, redis_client, name="jobs"):
+        self.redis = redis_client
+        self.name = name
+        self.tasks = {}
+
+    def task(self, name, max_retries=JOB_MAX_RETRIES):
+        def register(func):
+            self.tasks[name] = (func, max_retries)
+            return func
+        return register
+
+    def job_key(self, job_id):
+        return f"{self.name}:job:{job_id}"
+
+    @property
+    def queue_key(self):
+        return f"{self.name}:queue"
+
+    @property
+    def delayed_key(self):
+        return f"{self.name}:delayed"
+
+    @property
+    def processing_key(self):
+        return f"{self.name}:processing"
+
+    @property
+    def dead_key(self):
+        return f"{self.name}:dead"
+
+    # -- client side --------------------------------------------------------
+
+    def submit(self, name, payload, callback_url=None):
+        if name not in self.tasks:
+            raise ValueError(f"Unknown task: {name}")
+        if callback_url and not callback_allowed(callback_url):
+            raise ValueError("callback_url is not an allowed callback host")
+        job_id = uuid.uuid4().hex
+        fields = {
+            "id": job_id,
+            "task": name,
+            "payload": json.dumps(payload),
+            "status": QUEUED,
+            "attempts": 0,
+            "created_at": time.time(),
+        }
+        if callback_url:
+            fields["callback_url"] = callback_url
+        pipe = self.redis.pipeline()
+        pipe.hset(self.job_key(job_id), mapping=fields)
+        pipe.lpush(self.queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def status(self, job_id):
+        job = self.redis.hgetall(self.job_key(job_id))
+        if not job:
+            return None
+        job.pop("payload", None)
+        if "result" in job:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job. Queued jobs stop immediately; running ones at their next progress report."""
+        key = self.job_key(job_id)
+        status = self.redis.hget(key, "status")
+        if status is None or status in FINISHED:
+            return False
+        self.redis.hset(key, "cancel_requested", 1)
+        if status == QUEUED and (self.redis.lrem(self.queue_key, 0, job_id) or self.redis.zrem(self.delayed_key, job_id)):
+            self._finish(job_id, CANCELLED)
+        return True
+
+    def wait(self, job_id, timeout=JOB_WAIT_TIMEOUT):
+        """Block until the job finishes and return its status record."""
+        if self.redis.blpop(f"{self.job_key(job_id)}:done", timeout=timeout) is None:
+            raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+        return self.status(job_id)
+
+    def run(self, name, payload):
+        """Run a task for a synchronous endpoint and return (body, status_code)."""
+        if JOB_SYNC_MODE != "queue":
+            func, _ = self.tasks[name]
+            try:
+                return func(payload, JobContext())
+            except Exception as e:
+                logger.error(f"Task {name} failed: {e}")
+                return {"error": str(e)}, 500
+        job = self.wait(self.submit(name, payload))
+        if job["status"] == SUCCEEDED:
+            return job["result"]["body"], int(job["result"]["status_code"])
+        return {"error": job.get("error", f"Job {job['status']}")}, 500
+
+    def dead_letters(self, count=100):
+        """The newest jobs that failed for good, most recent first."""
+        return [json.loads(entry) for entry in self.redis.lrange(self.dead_key, 0, count - 1)]
+
+    # -- worker side --------------------------------------------------------
+
+    def work(self, poll_timeout=1):
+        """Worker loop: pull jobs off the queue until the process is stopped."""
+        logger.info(f"Job worker {os.getpid()} started")
+        next_recovery = 0
+        while True:
+            if time.time() >= next_recovery:
+                self._recover_stalled()
+                next_recovery = time.time() + JOB_VISIBILITY_TIMEOUT / 3
+            self.work_once(poll_timeout)
+
+    def work_once(self, poll_timeout=1):
+        """Queue the retries that are due, then take one job and run it. Returns its id, or None."""
+        self._promote_delayed()
+        # The job stays on the processing list until it is finished or rescheduled.
+        job_id = self.redis.brpoplpush(self.queue_key, self.processing_key, timeout=poll_timeout)
+        if job_id is not None:
+            self._execute(job_id)
+        return job_id
+
+    def run_workers(self, num_workers):
+        """Start ``num_workers`` worker processes and wait for them."""
+        workers = [multiprocessing.Process(target=self.work, daemon=True) for _ in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def _promote_delayed(self):
+        for job_id in self.redis.zrangebyscore(self.delayed_key, 0, time.time()):
+            # zrem succeeds for exactly one worker, which then owns the retry.
+            if self.redis.zrem(self.delayed_key, job_id):
+                self.redis.lpush(self.queue_key, job_id)
+
+    def _recover_stalled(self):
+        """Requeue jobs whose worker stopped renewing their lease, i.e. died mid-job."""
+        now = time.time()
+        for job_id in self.redis.lrange(self.processing_key, 0, -1):
+            key = self.job_key(job_id)
+            task, lease, attempts = self.redis.hmget(key, "task", "lease_until", "attempts")
+            if task is None:
+                self.redis.lrem(self.processing_key, 1, job_id)
+            elif lease is None:
+                # Taken a moment ago and not leased yet, or its worker died right away.
+                self.redis.hsetnx(key, "lease_until", now + JOB_VISIBILITY_TIMEOUT)
+            elif float(lease) < now and self.redis.lrem(self.processing_key, 1, job_id):
+                # lrem succeeds for exactly one worker, which then owns the recovery.
+                logger.warning(f"Job {job_id} lost its worker; recovering it")
+                self.redis.hdel(key, "lease_until")
+                _, max_retries = self.tasks.get(task, (None, 0))
+                if int(attempts or 0) > max_retries:
+                    self._dead_letter(job_id, "worker died while running the job")
+                else:
+                    self.redis.hset(key, "status", QUEUED)
+                    self.redis.lpush(self.queue_key, job_id)
+
+    def _heartbeat(self, key, done):
+        while not done.wait(JOB_VISIBILITY_TIMEOUT / 3):
+            self.redis.hset(key, "lease_until", time.time() + JOB_VISIBILITY_TIMEOUT)
+
+    def _execute(self, job_id):
+        key = self.job_key(job_id)
+        self.redis.hset(key, "lease_until", time.time() + JOB_VISIBILITY_TIMEOUT)
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(key, done), daemon=True, name="job-lease").start()
+        try:
+            self._run_job(job_id, key)
+        finally:
+            done.set()
+            pipe = self.redis.pipeline()
+            pipe.hdel(key, "lease_until")
+            pipe.lrem(self.processing_key, 1, job_id)
+            pipe.execute()
+
+    def _run_job(self, job_id, key):
+        job = self.redis.hgetall(key)
+        if "task" not in job or job.get("cancel_requested"):
+            if "task" in job:
+                self._finish(job_id, CANCELLED)
+            return
+
+        func, max_retries = self.tasks[job["task"]]
+        attempts = self.redis.hincrby(key, "attempts", 1)
+        self.redis.hset(key, mapping={"status": RUNNING, "started_at": time.time()})
+        try:
+            body, status_code = func(json.loads(job["payload"]), JobContext(self, job_id))
+        except JobCancelled:
+            self._finish(job_id, CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['task']}) attempt {attempts} failed: {e}")
+            if attempts <= max_retries:
+                delay = JOB_RETRY_BACKOFF ** attempts
+                self.redis.hset(key, mapping={"status": QUEUED, "error": str(e)})
+                self.redis.zadd(self.delayed_key, {job_id: time.time() + delay})
+            else:
+                self._dead_letter(job_id, str(e))
+        else:
+            self._finish(job_id, SUCCEEDED, result={"body": body, "status_code": status_code})
+
+    def _dead_letter(self, job_id, error):
+        """Fail a job that has used up its retries, keeping a copy of it on the dead-letter list."""
+        self._finish(job_id, FAILED, error=error)
+        job = self.redis.hgetall(self.job_key(job_id))
+        entry = {name: job.get(name) for name in ("id", "task", "payload", "attempts", "error", "finished_at")}
+        pipe = self.redis.pipeline()
+        pipe.lpush(self.dead_key, json.dumps(entry))
+        pipe.ltrim(self.dead_key, 0, JOB_DEAD_LETTER_MAX - 1)
+        pipe.execute()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        key = self.job_key(job_id)
+        fields = {"status": status, "finished_at": time.time()}
+        if result is not None:
+            fields["result"] = json.dumps(result)
+        if error is not None:
+            fields["error"] = error
+        pipe = self.redis.pipeline()
+        if status == SUCCEEDED:
+            pipe.hdel(key, "error")
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, JOB_RESULT_TTL)
+        pipe.rpush(f"{key}:done", status)
+        pipe.expire(f"{key}:done", JOB_RESULT_TTL)
+        pipe.execute()
+
+        callback_url = self.redis.hget(key, "callback_url")
+        if callback_url and callback_allowed(callback_url):
+            try:
+                httpx.post(callback_url, json=self.status(job_id), timeout=10)
+            except httpx.HTTPError as e:
+                logger.warning(f"Job {job_id} callback to {callback_url} failed: {e}")
@@ -0,0 +1,80 @@
+"""Lazily initialised process-wide resources with readiness tracking.
+
+Heavy clients and models are wrapped in ``LazyResource`` so importing the
+app stays cheap. Each one is built on first use, or ahead of time by
+``warm_in_background`` once the server is up. ``status()`` backs the
+/ready endpoint.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+resources = {}
+
+
+class LazyResource:
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._ready = False
+        self._error = None
+        self._seconds = None
+        self._lock = threading.Lock()
+        resources[name] = self
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                started = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self._error = str(e)
+                    raise
+                self._seconds = round(time.perf_counter() - started, 3)
+                self._error = None
+                self._ready = True
+                logger.info(f"Loaded {self.name} in {self._seconds}s")
+        return self._value
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def reset(self):
+        """Forget the built value so the next get() builds a fresh one."""
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+    def status(self):
+        return {"ready": self._ready, "load_seconds": self._seconds, "error": self._error}
+
+
+def status():
+    return {name: resource.status() for name, resource in resources.items()}
+
+
+def warm(names=None):
+    """Build the named resources (all of them by default), logging failures."""
+    for name, resource in list(resources.items()):
+        if names is not None and name not in names:
+            continue
+        try:
+            resource.get()
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+
+
+def warm_in_background(names=None, delay=0):
+    def run():
+        time.sleep(delay)
+        warm(names)
+    thread = threading.Thread(target=run, daemon=True, name="warmup")
+    thread.start()
+    return thread
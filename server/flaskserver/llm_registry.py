@@ -0,0 +1,124 @@
+"""Process-wide registry of long-lived LLM clients.
+
+Providers are Groq, Gemini and a local GPT4All model (``GPT4ALL_MODEL``, a
+path to a model file, served by the pool in local_llm.py). Clients are keyed
+by (provider, model, temperature) and built once. Every Groq client shares
+one keep-alive ``httpx`` connection pool, so requests reuse open TLS
+connections instead of handshaking on each call. Clients are wrapped in
+``metrics.InstrumentedLLM`` to record latency, status codes and tokens.
+"""
+import os
+import threading
+
+import httpx
+
+from metrics import InstrumentedLLM
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-specdec")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GPT4ALL_MODEL = os.getenv("GPT4ALL_MODEL", "")
+
+# Default keep-alive pool size per provider, overridable with <PROVIDER>_POOL_SIZE.
+POOL_DEFAULTS = {
+    "groq": 20,
+    # CPU inference: one call at a time per process.
+    "gpt4all": 1,
+}
+
+
+def pool_size(provider):
+    return int(os.getenv(f"{provider.upper()}_POOL_SIZE", POOL_DEFAULTS.get(provider, 10)))
+
+
+def max_concurrency(provider):
+    """Most calls in flight to a provider, <PROVIDER>_MAX_CONCURRENCY; by default twice its pool size.
+
+    The upstream AIMD limit starts at the pool size and may probe up to this.
+    """
+    return int(os.getenv(f"{provider.upper()}_MAX_CONCURRENCY", 2 * pool_size(provider)))
+
+
+class LLMRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._http_clients = {}
+        self._gemini_configured = False
+
+    def get(self, provider="groq", model=None, temperature=0):
+        """Return the shared client for (provider, model, temperature)."""
+        model = model or {"gemini": GEMINI_MODEL, "gpt4all": GPT4ALL_MODEL}.get(provider, GROQ_MODEL)
+        key = (provider, model, temperature)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = InstrumentedLLM(self._build(provider, model, temperature), provider, model)
+                self._clients[key] = client
+            return client
+
+    def http_client(self, provider):
+        """Return the shared keep-alive connection pool for a provider."""
+        with self._lock:
+            return self._http_client(provider)
+
+    def _http_client(self, provider):
+        client = self._http_clients.get(provider)
+        if client is None:
+            size = pool_size(provider)
+            client = httpx.Client(
+                limits=httpx.Limits(
+                    # Connections beyond the keep-alive pool are opened while the AIMD limit probes above it.
+                    max_connections=max(size, max_concurrency(provider)),
+                    max_keepalive_connections=size,
+                    keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+                ),
+                timeout=httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", 120)), connect=10.0),
+            )
+            self._http_clients[provider] = client
+        return client
+
+    def _build(self, provider, model, temperature):
+        if provider == "groq":
+            from langchain_groq import ChatGroq
+            return ChatGroq(
+                model=model,
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                http_client=self._http_client("groq"),
+                **({} if temperature is None else {"temperature": temperature}),
+            )
+        if provider == "gemini":
+            # google-generativeai keeps one multiplexed gRPC channel per process;
+            # configure it once and hand out cached model handles on top of it.
+            import google.generativeai as genai
+            if not self._gemini_configured:
+                genai.configure(api_key=os.getenv("GENAI_API_KEY"))
+                self._gemini_configured = True
+            if temperature is None:
+                return genai.GenerativeModel(model)
+            return genai.GenerativeModel(model, generation_config={"temperature": temperature})
+        if provider == "gpt4all":
+            if not model:
+                raise ValueError("GPT4ALL_MODEL is not set")
+            # Served by the warm instances of the local tier, never a second copy of the model.
+            from local_llm import local_pool
+            return local_pool.client(temperature)
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    def close(self):
+        """Drop all clients and close their connection pools."""
+        with self._lock:
+            for client in self._http_clients.values():
+                client.close()
+            self._http_clients.clear()
+            self._clients.clear()
+            self._gemini_configured = False
+
+
+registry = LLMRegistry()
+
+
+def get_llm(provider="groq", model=None, temperature=0):
+    return registry.get(provider, model, temperature)
@@ -0,0 +1,338 @@
+"""Local CPU model tier for low-stakes generation.
+
+Topic-only quizzes and mind maps of short transcripts do not need a hosted
+70B model and its network round trip. ``LocalRouter`` sends them to a local
+GPT4All model (``GPT4ALL_MODEL``, a path to a model file) when a rule in
+``LOCAL_LLM_ROUTES`` allows it, e.g. ``topic_quiz:1500,mind_map:1500``: a
+task type and the largest prompt, in estimated tokens, the local model
+takes for it. Anything else, or a local answer that fails validation or
+times out, goes to the hosted chain.
+
+Local calls go through ``LocalModelPool``: a bounded queue of
+``LOCAL_LLM_QUEUE_SIZE`` requests served by ``LOCAL_LLM_POOL_SIZE`` worker
+threads, each owning one warm model instance. A worker takes up to
+``LOCAL_LLM_BATCH_SIZE`` queued requests at once (waiting at most
+``LOCAL_LLM_BATCH_WAIT`` seconds for the batch to fill), answers identical
+prompts once and runs the rest through a single ``generate`` call. The
+model runs outside the GIL on at most ``LOCAL_LLM_THREADS`` cores per
+instance, so request threads keep being served while it works, and a full
+queue is never waited on: when the expected wait exceeds
+``LOCAL_LLM_MAX_WAIT`` the router picks the hosted chain instead.
+
+Per task, local, failed-local and hosted counts and latency, and why
+requests were not routed locally, are kept in the Redis hash ``local:stats``.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import redis
+
+from llm_registry import GPT4ALL_MODEL
+from longform import estimate_tokens
+from metrics import InstrumentedLLM
+from upstream import Completion
+
+logger = logging.getLogger(__name__)
+
+LOCAL_LLM_ROUTES = os.getenv("LOCAL_LLM_ROUTES", "topic_quiz:1500,mind_map:1500")
+LOCAL_LLM_POOL_SIZE = int(os.getenv("LOCAL_LLM_POOL_SIZE", 1))
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+LOCAL_LLM_QUEUE_SIZE = int(os.getenv("LOCAL_LLM_QUEUE_SIZE", 16))
+LOCAL_LLM_BATCH_SIZE = int(os.getenv("LOCAL_LLM_BATCH_SIZE", 4))
+LOCAL_LLM_BATCH_WAIT = float(os.getenv("LOCAL_LLM_BATCH_WAIT", 0.05))
+LOCAL_LLM_MAX_WAIT = float(os.getenv("LOCAL_LLM_MAX_WAIT", 10))
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", 60))
+
+STATS_KEY = "local:stats"
+LATENCY_WINDOW = 50
+TIERS = ("local", "local_failed", "hosted")
+SKIP_REASONS = ("no_route", "too_long", "busy")
+
+
+class LocalModelBusy(Exception):
+    """The local queue is full, or no answer came within LOCAL_LLM_TIMEOUT."""
+
+
+def parse_routes(spec):
+    """``"topic_quiz:1500,mind_map:1500"`` -> {"topic_quiz": 1500, "mind_map": 1500}."""
+    routes = {}
+    for rule in spec.split(","):
+        if rule.strip():
+            task, _, limit = rule.partition(":")
+            routes[task.strip()] = int(limit) if limit.strip() else None
+    return routes
+
+
+def load_model():
+    from langchain_community.llms import GPT4All
+    if not GPT4ALL_MODEL:
+        raise ValueError("GPT4ALL_MODEL is not set")
+    return GPT4All(model=GPT4ALL_MODEL, n_threads=LOCAL_LLM_THREADS)
+
+
+class Request:
+    def __init__(self, prompt, kwargs):
+        self.prompt = prompt
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class LocalModelPool:
+    def __init__(self, factory=load_model, size=LOCAL_LLM_POOL_SIZE, queue_size=LOCAL_LLM_QUEUE_SIZE,
+                 batch_size=LOCAL_LLM_BATCH_SIZE, batch_wait=LOCAL_LLM_BATCH_WAIT):
+        self.factory = factory
+        self.size = size
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._loaded = None
+        self._load_error = None
+        self._busy = 0
+        self._seconds = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {"requests": 0, "batches": 0, "deduplicated": 0, "rejected": 0, "errors": 0}
+
+    def _start(self):
+        """Start the workers in this process; a forked child has the queue but none of the threads."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._loaded = threading.Semaphore(0)
+            self._busy = 0
+            for i in range(self.size):
+                threading.Thread(target=self._work, daemon=True, name=f"local-llm-{i}").start()
+
+    def warm(self, timeout=None):
+        """Start the workers and wait until every one has loaded its model instance (or failed to)."""
+        self._start()
+        for _ in range(self.size):
+            if not self._loaded.acquire(timeout=timeout):
+                raise TimeoutError("local model did not load in time")
+        if self._load_error is not None:
+            raise self._load_error
+        return self
+
+    def submit(self, prompt, **kwargs):
+        """Queue a prompt; returns a Future of its text. Raises LocalModelBusy when the queue is full."""
+        self._start()
+        request = Request(prompt, kwargs)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self._count("rejected")
+            raise LocalModelBusy(f"local model queue is full ({self.queue_size} requests)")
+        self._count("requests")
+        return request.future
+
+    def _load(self):
+        while True:
+            try:
+                model = self.factory()
+            except Exception as e:
+                logger.error(f"Loading the local model failed: {e}")
+                self._load_error = e
+                self._loaded.release()
+                # Fail what is queued rather than leave it waiting, then try again.
+                self._fail(self._next_batch(), e)
+                continue
+            self._load_error = None
+            self._loaded.release()
+            return model
+
+    def _work(self):
+        model = self._load()
+        while True:
+            batch = self._next_batch()
+            with self._lock:
+                self._busy += len(batch)
+            try:
+                self._run(model, batch)
+            finally:
+                with self._lock:
+                    self._busy -= len(batch)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Requests whose caller gave up before they started are dropped here.
+        return [r for r in batch if r.future.set_running_or_notify_cancel()]
+
+    def _run(self, model, batch):
+        groups = {}
+        for request in batch:
+            groups.setdefault(tuple(sorted(request.kwargs.items())), []).append(request)
+        for key, requests in groups.items():
+            prompts = list(dict.fromkeys(r.prompt for r in requests))
+            self._count("batches")
+            self._count("deduplicated", len(requests) - len(prompts))
+            started = time.perf_counter()
+            try:
+                result = model.generate(prompts, **dict(key))
+            except Exception as e:
+                self._count("errors")
+                self._fail(requests, e)
+                continue
+            seconds = time.perf_counter() - started
+            texts = {prompt: generations[0].text for prompt, generations in zip(prompts, result.generations)}
+            with self._lock:
+                self._seconds.append(seconds / len(prompts))
+            for request in requests:
+                request.future.set_result(texts[request.prompt])
+
+    def _fail(self, requests, error):
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def expected_wait(self):
+        """Seconds a request queued now would wait for its answer, from recent service times."""
+        with self._lock:
+            if self._queue is None:
+                return 0.0
+            waiting = self._queue.qsize() + self._busy
+            if not self._seconds:
+                # No timings yet: take one batch per instance, nothing more.
+                return 0.0 if waiting < self.size * self.batch_size else float("inf")
+            mean = sum(self._seconds) / len(self._seconds)
+            return (waiting + 1) * mean / self.size
+
+    def client(self, temperature=0, timeout=LOCAL_LLM_TIMEOUT):
+        return LocalLLM(self, temperature, timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["mean_seconds"] = round(sum(self._seconds) / len(self._seconds), 4) if self._seconds else None
+            stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+            stats["busy"] = self._busy
+        stats["mean_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else None
+        stats["size"] = self.size
+        return stats
+
+
+class LocalLLM:
+    """LLM client (``invoke``, ``stream``) over a LocalModelPool."""
+
+    def __init__(self, pool, temperature=0, timeout=LOCAL_LLM_TIMEOUT):
+        self.pool = pool
+        self.kwargs = {} if temperature is None else {"temp": temperature}
+        self.timeout = timeout
+
+    def invoke(self, prompt, **kwargs):
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        future = self.pool.submit(prompt, **self.kwargs, **kwargs)
+        try:
+            text = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise LocalModelBusy(f"no answer from the local model within {self.timeout}s")
+        return Completion(text, "gpt4all", (estimate_tokens(prompt), estimate_tokens(text)))
+
+    def stream(self, prompt, **kwargs):
+        # Batched generation has no token stream: the whole answer is one chunk.
+        yield self.invoke(prompt, **kwargs)
+
+
+class LocalRouter:
+    def __init__(self, redis_client, pool, routes=LOCAL_LLM_ROUTES, enabled=bool(GPT4ALL_MODEL),
+                 max_wait=LOCAL_LLM_MAX_WAIT):
+        self.redis = redis_client
+        self.pool = pool
+        self.routes = parse_routes(routes) if isinstance(routes, str) else dict(routes)
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self.llm = InstrumentedLLM(pool.client(), "gpt4all", GPT4ALL_MODEL or "local")
+
+    def accepts(self, task, prompt):
+        """Whether ``task`` with this prompt goes to the local model; records why not."""
+        if not self.enabled:
+            return False
+        reason = None
+        if task not in self.routes:
+            reason = "no_route"
+        elif self.routes[task] is not None and estimate_tokens(prompt) > self.routes[task]:
+            reason = "too_long"
+        elif self.pool.expected_wait() > self.max_wait:
+            reason = "busy"
+        if reason is not None:
+            self._count(f"{task}:skipped:{reason}")
+        return reason is None
+
+    def generate_local(self, structured, prompt, task):
+        """``structured.generate`` for ``task`` on the local model, or None if it failed."""
+        started = time.perf_counter()
+        try:
+            result = structured.generate(self.llm, prompt, task)
+        except Exception as e:
+            logger.warning(f"Local {task} failed, falling back to the hosted model: {e}")
+            self.record(task, "local_failed", time.perf_counter() - started)
+            return None
+        self.record(task, "local", time.perf_counter() - started)
+        return result
+
+    def generate(self, structured, prompt, task, hosted):
+        """``structured.generate`` for ``task`` on the local model when a rule allows it, else on ``hosted``."""
+        if self.accepts(task, prompt):
+            result = self.generate_local(structured, prompt, task)
+            if result is not None:
+                return result
+        started = time.perf_counter()
+        result = structured.generate(hosted, prompt, task)
+        self.record(task, "hosted", time.perf_counter() - started)
+        return result
+
+    def _count(self, field):
+        try:
+            self.redis.hincrby(STATS_KEY, field, 1)
+        except redis.RedisError:
+            pass
+
+    def record(self, task, tier, seconds):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(STATS_KEY, f"{task}:{tier}:count", 1)
+            pipe.hincrbyfloat(STATS_KEY, f"{task}:{tier}:seconds", seconds)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {}
+        tasks = {}
+        for task in sorted({field.split(":", 1)[0] for field in raw} | set(self.routes)):
+            tiers = {}
+            for tier in TIERS:
+                count = int(raw.get(f"{task}:{tier}:count", 0))
+                seconds = float(raw.get(f"{task}:{tier}:seconds", 0))
+                tiers[tier] = {"count": count, "avg_seconds": round(seconds / count, 4) if count else None}
+            tasks[task] = {
+                "max_input_tokens": self.routes.get(task),
+                "tiers": tiers,
+                "skipped": {reason: int(raw.get(f"{task}:skipped:{reason}", 0)) for reason in SKIP_REASONS},
+            }
+        return {"enabled": self.enabled, "tasks": tasks, "pool": self.pool.stats()}
+
+
+local_pool = LocalModelPool()
@@ -0,0 +1,178 @@
+"""Map-reduce processing for transcripts too long for one prompt.
+
+Transcripts over ``LONGFORM_THRESHOLD_TOKENS`` are split on line and
+sentence boundaries into segments of at most ``LONGFORM_SEGMENT_TOKENS``.
+The map step (cleaning, or summarizing and writing questions) runs on the
+segments concurrently, at most ``LONGFORM_MAX_CONCURRENCY`` LLM calls at a
+time. For the quiz, a reduce call merges the segment summaries into the
+final topic summaries, and the questions are deduplicated and picked
+round-robin across segments so every part of the lecture is covered.
+
+Token counts are estimated from characters; no tokenizer is loaded.
+"""
+import json
+import logging
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import structured
+
+logger = logging.getLogger(__name__)
+
+LONGFORM_THRESHOLD_TOKENS = int(os.getenv("LONGFORM_THRESHOLD_TOKENS", 6000))
+LONGFORM_SEGMENT_TOKENS = int(os.getenv("LONGFORM_SEGMENT_TOKENS", 3000))
+LONGFORM_MAX_CONCURRENCY = int(os.getenv("LONGFORM_MAX_CONCURRENCY", 4))
+CHARS_PER_TOKEN = 4
+
+SEGMENT_QUIZ_PROMPT = """
+        The following is part {part} of {parts} of a lecture transcript.
+        Identify the key topics covered in this part and summarize each in 3-4 sentences in English, even if the transcript is in a different language.
+        Strictly ensure that possessives (e.g., John's book) and contractions (e.g., don't) use apostrophes (') instead of quotation marks (" or "  ").
+        Then create {num_questions} multiple-choice questions in English of {difficulty} difficulty about this part only.
+        Just give the JSON as output, nothing before it:
+
+        {{
+            "summary": {{
+                "topic1": "value1"
+            }},
+            "questions": [
+                {{
+                    "question": "What is the capital of France?",
+                    "options": ["Paris", "London", "Berlin", "Madrid"],
+                    "answer": "Paris"
+                }}
+            ]
+        }}
+
+        Transcript: {transcript}
+        """
+
+REDUCE_SUMMARY_PROMPT = """
+        The following are topic summaries of consecutive parts of one lecture.
+        Merge them into the key topics of the whole lecture, combining topics that appear in several parts,
+        and provide a detailed summary of each topic in 6-7 sentences in English.
+        Strictly ensure that possessives (e.g., John's book) and contractions (e.g., don't) use apostrophes (') instead of quotation marks (" or "  ").
+        Just give the JSON as output, nothing before it:
+
+        {{
+            "summary": {{
+                "topic1": "value1",
+                "topic2": "value2"
+            }}
+        }}
+
+        Part summaries: {summaries}
+        """
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def is_long(text):
+    return estimate_tokens(text) > LONGFORM_THRESHOLD_TOKENS
+
+
+def split_segments(text, max_tokens=LONGFORM_SEGMENT_TOKENS):
+    """Split ``text`` into segments of at most ``max_tokens``, breaking between lines or sentences."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for line in text.splitlines():
+        if len(line) <= max_chars:
+            pieces.append(line)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", line):
+            # A single run-on "sentence" (unpunctuated captions) is cut at the budget.
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    segments, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) + 1 > max_chars:
+            segments.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        segments.append("\n".join(current))
+    return [s for s in segments if s.strip()]
+
+
+def _content(response):
+    return getattr(response, 'content', str(response))
+
+
+def _map(fn, items, max_workers=LONGFORM_MAX_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        return list(pool.map(fn, items))
+
+
+def clean_long_transcript(llm, formatted_transcript, prompt_template):
+    """Clean each segment with ``prompt_template`` concurrently and join them in order."""
+    segments = split_segments(formatted_transcript)
+    logger.info(f"Cleaning long transcript in {len(segments)} segments")
+    cleaned = _map(lambda s: _content(llm.invoke(prompt_template.format(formatted_transcript=s))).strip(), segments)
+    # Unrelated chatter in one segment should not discard the lecture around it.
+    cleaned = [c for c in cleaned if c.lower().strip(" .'\"") != "fake transcript"]
+    return "\n".join(cleaned) if cleaned else "Fake transcript"
+
+
+def _question_key(question):
+    return " ".join(re.findall(r"\w+", str(question.get("question", "")).lower()))
+
+
+def _similar(a, b, threshold=0.8):
+    a, b = set(a.split()), set(b.split())
+    return bool(a and b) and len(a & b) / len(a | b) >= threshold
+
+
+def balance_questions(per_segment, num_questions):
+    """Pick ``num_questions`` distinct, well-formed questions round-robin across segments."""
+    picked, keys = [], []
+    queues = [list(questions) for questions in per_segment]
+    while len(picked) < num_questions and any(queues):
+        for questions in queues:
+            while questions:
+                question = questions.pop(0)
+                if structured.validate(structured.QUESTION, question):
+                    continue
+                key = _question_key(question)
+                if key and not any(_similar(key, k) for k in keys):
+                    picked.append(question)
+                    keys.append(key)
+                    break
+            if len(picked) >= num_questions:
+                break
+    return picked
+
+
+def summarize_and_quiz(llm, transcript, num_questions, difficulty):
+    """Map-reduce version of the summary/quiz prompt; returns the same JSON shape."""
+    num_questions = int(num_questions)
+    segments = split_segments(transcript)
+    # Over-generate a little per segment so deduplication still leaves enough.
+    per_segment = math.ceil(num_questions / len(segments)) + 1
+    logger.info(f"Summarizing long transcript in {len(segments)} segments")
+
+    def map_segment(item):
+        part, segment = item
+        prompt = SEGMENT_QUIZ_PROMPT.format(part=part, parts=len(segments), num_questions=per_segment,
+                                            difficulty=difficulty, transcript=segment)
+        document = structured.parse_json(_content(llm.invoke(prompt)))
+        return document if isinstance(document, dict) else {}
+
+    results = _map(map_segment, list(enumerate(segments, start=1)))
+    partial_summaries = [r.get("summary") for r in results if isinstance(r.get("summary"), dict)]
+    if not partial_summaries:
+        return None
+
+    merged = structured.parse_json(_content(llm.invoke(REDUCE_SUMMARY_PROMPT.format(summaries=json.dumps(partial_summaries)))))
+    summary = None if structured.validate(structured.SCHEMAS["summary"], merged) else merged["summary"]
+    if not summary:
+        # Fall back to the segment summaries rather than failing the whole quiz.
+        summary = {topic: text for part in partial_summaries for topic, text in part.items()}
+
+    questions = balance_questions([r.get("questions") if isinstance(r.get("questions"), list) else []
+                                   for r in results], num_questions)
+    return {"summary": summary, "questions": {difficulty: questions}}
@@ -0,0 +1,190 @@
+"""Request tracing and Prometheus metrics.
+
+* Every request gets a trace id (the incoming ``X-Request-ID`` or a new one),
+  returned as ``X-Trace-Id`` and added to every log line.
+* ``stage("name")`` times one step of the current endpoint into the
+  ``quicklearn_stage_seconds`` histogram.
+* ``InstrumentedLLM`` wraps the LLM clients from llm_registry and records
+  call latency, upstream status and token usage.
+* ``/metrics`` serves everything in Prometheus text format. Under gunicorn,
+  set ``PROMETHEUS_MULTIPROC_DIR`` so the metrics of all workers are merged.
+
+Recording a sample is a dictionary lookup and a bisect, a few microseconds,
+against stages that take milliseconds to seconds.
+"""
+import contextvars
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+endpoint_var = contextvars.ContextVar("endpoint", default="background")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_SECONDS = Histogram(
+    "quicklearn_request_seconds", "HTTP request latency until the response is returned.",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram(
+    "quicklearn_stage_seconds", "Latency of one stage of an endpoint.",
+    ["endpoint", "stage"], buckets=LATENCY_BUCKETS)
+STAGE_ERRORS = Counter(
+    "quicklearn_stage_errors_total", "Stages that raised.", ["endpoint", "stage"])
+LLM_SECONDS = Histogram(
+    "quicklearn_llm_seconds", "LLM call latency.", ["provider", "model", "method"], buckets=LATENCY_BUCKETS)
+LLM_REQUESTS = Counter(
+    "quicklearn_llm_requests_total", "LLM calls by upstream status.", ["provider", "model", "status"])
+LLM_TOKENS = Counter(
+    "quicklearn_llm_tokens_total", "LLM tokens used.", ["provider", "model", "direction"])
+CONTEXT_TOKENS = Histogram(
+    "quicklearn_query_context_tokens", "Estimated tokens of retrieved context packed into a /query prompt.",
+    ["mode"], buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+
+
+def current_trace_id():
+    return trace_id_var.get()
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current endpoint."""
+    endpoint = endpoint_var.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(endpoint, name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(endpoint, name).observe(time.perf_counter() - started)
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def configure_logging(level=logging.INFO):
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s")
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TraceIdFilter())
+
+
+def init_app(app):
+    """Install the trace-id/latency hooks and the /metrics route on a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_trace():
+        g.trace_token = trace_id_var.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+        g.endpoint_token = endpoint_var.set(request.endpoint or "unknown")
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_trace(response):
+        started = g.get("request_started")
+        if started is not None:
+            REQUEST_SECONDS.labels(endpoint_var.get(), request.method, response.status_code).observe(
+                time.perf_counter() - started)
+        response.headers["X-Trace-Id"] = trace_id_var.get()
+        return response
+
+    @app.teardown_request
+    def end_trace(exc=None):
+        for name, var in (("trace_token", trace_id_var), ("endpoint_token", endpoint_var)):
+            token = g.pop(name, None)
+            if token is not None:
+                try:
+                    var.reset(token)
+                except ValueError:
+                    pass  # set in a different context (streamed responses)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        registry = None
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry) if registry else generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def error_status(error):
+    """The HTTP or gRPC status code carried by an LLM client exception, or "error"."""
+    for attr in ("status_code", "code"):
+        code = getattr(error, attr, None)
+        if isinstance(code, int):
+            return str(code)
+        if callable(code):
+            try:
+                return str(int(code()))
+            except Exception:
+                pass
+    return "error"
+
+
+def token_usage(response):
+    """(input tokens, output tokens) from a LangChain message or a Gemini response, if reported."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+class InstrumentedLLM:
+    """Transparent proxy over an LLM client that records latency, status and tokens."""
+
+    def __init__(self, client, provider, model):
+        self._client = client
+        self._labels = (provider, model)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _record(self, method, started, status, usage=(0, 0)):
+        LLM_SECONDS.labels(*self._labels, method).observe(time.perf_counter() - started)
+        LLM_REQUESTS.labels(*self._labels, status).inc()
+        if usage[0]:
+            LLM_TOKENS.labels(*self._labels, "input").inc(usage[0])
+        if usage[1]:
+            LLM_TOKENS.labels(*self._labels, "output").inc(usage[1])
+
+    def _call(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = getattr(self._client, method)(*args, **kwargs)
+        except Exception as e:
+            self._record(method, started, error_status(e))
+            raise
+        self._record(method, started, "200", token_usage(response))
+        return response
+
+    def invoke(self, *args, **kwargs):
+        return self._call("invoke", *args, **kwargs)
+
+    def generate_content(self, *args, **kwargs):
+        return self._call("generate_content", *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        started = time.perf_counter()
+        usage = [0, 0]
+        status = "200"
+        try:
+            for chunk in self._client.stream(*args, **kwargs):
+                tokens = token_usage(chunk)
+                usage[0] += tokens[0]
+                usage[1] += tokens[1]
+                yield chunk
+        except Exception as e:
+            status = error_status(e)
+            raise
+        finally:
+            # Also reached when the consumer stops early (GeneratorExit).
+            self._record("stream", started, status, usage)
@@ -0,0 +1,107 @@
+"""Per-topic recommendation cache for /getonly.
+
+Recommendations depend only on the topic, and most students share topics,
+so each topic is generated once and cached in Redis for
+``RECOMMENDATION_TTL`` seconds under its normalized name and the prompt
+version. A request only generates the topics missing from the cache, at most
+``RECOMMENDATION_CONCURRENCY`` at a time.
+
+The Node server pushes topics a student has just started on to the Redis list
+``recommendation:prewarm`` (trimmed to the newest RECOMMENDATION_PREWARM_MAX,
+by default 1000); ``run_prewarmer`` (started by worker.py) generates
+them in the background so they are already cached on the next page load.
+"""
+import hashlib
+import json
+import logging
+import re
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_TTL = int(os.getenv("RECOMMENDATION_TTL", 7 * 24 * 3600))
+RECOMMENDATION_CONCURRENCY = int(os.getenv("RECOMMENDATION_CONCURRENCY", 8))
+PREWARM_KEY = "recommendation:prewarm"
+
+
+def normalize_topic(topic):
+    return re.sub(r"\s+", " ", str(topic)).strip().lower()
+
+
+class RecommendationCache:
+    def __init__(self, redis_client, generate, version, ttl=RECOMMENDATION_TTL,
+                 max_workers=RECOMMENDATION_CONCURRENCY):
+        self.redis = redis_client
+        self.generate = generate  # topic -> recommendation dict
+        self.version = version
+        self.ttl = ttl
+        self.max_workers = max_workers
+
+    def key(self, topic):
+        digest = hashlib.sha256(normalize_topic(topic).encode("utf-8")).hexdigest()
+        return f"recommendation:{self.version}:{digest}"
+
+    def get_many(self, topics):
+        """Return {topic: recommendation} for the cached topics."""
+        if not topics:
+            return {}
+        try:
+            values = self.redis.mget([self.key(t) for t in topics])
+        except redis.RedisError:
+            return {}
+        return {topic: json.loads(value) for topic, value in zip(topics, values) if value is not None}
+
+    def recommendations(self, topics):
+        """Return ({topic: recommendation}, {topic: error}) for ``topics``, generating the missing ones."""
+        topics = list(dict.fromkeys(topics))
+        found = self.get_many(topics)
+        missing = [t for t in topics if t not in found]
+        generated, errors = self._generate_many(missing)
+        found.update(generated)
+        logger.info(f"Recommendations: {len(topics) - len(missing)} cached, {len(generated)} generated, {len(errors)} failed")
+        return {t: found[t] for t in topics if t in found}, errors
+
+    def _generate_many(self, topics):
+        generated, errors = {}, {}
+        if not topics:
+            return generated, errors
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(topics)))) as pool:
+            for topic, future in [(t, pool.submit(self.generate, t)) for t in topics]:
+                try:
+                    generated[topic] = future.result()
+                except Exception as e:
+                    errors[topic] = str(e)
+                    continue
+                try:
+                    self.redis.set(self.key(topic), json.dumps(generated[topic]), ex=self.ttl)
+                except redis.RedisError:
+                    pass
+        return generated, errors
+
+    def prewarm(self, topics):
+        """Generate and cache any of ``topics`` that are not cached yet."""
+        cached = self.get_many(topics)
+        return self._generate_many([t for t in dict.fromkeys(topics) if t not in cached])
+
+    def run_prewarmer(self, batch_size=RECOMMENDATION_CONCURRENCY):
+        """Consume topics pushed to ``recommendation:prewarm`` forever."""
+        while True:
+            try:
+                item = self.redis.brpop(PREWARM_KEY, timeout=5)
+                if item is None:
+                    continue
+                topics = [item[1]]
+                # Drain whatever else is waiting so it is generated in one parallel batch.
+                while len(topics) < batch_size:
+                    next_item = self.redis.rpop(PREWARM_KEY)
+                    if next_item is None:
+                        break
+                    topics.append(next_item)
+                _, errors = self.prewarm(topics)
+                for topic, error in errors.items():
+                    logger.error(f"Pre-warming recommendations for {topic!r} failed: {error}")
+            except redis.RedisError as e:
+                logger.error(f"Recommendation pre-warmer: {e}")
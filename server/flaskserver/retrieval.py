@@ -0,0 +1,170 @@
+"""Hybrid keyword + vector retrieval and token-budgeted context packing for /query.
+
+Uploaded chunks are indexed twice: by embedding in Chroma and by term in a
+SQLite FTS5 table (``KeywordIndex``) ranked with BM25, which finds the exact
+terms (formula names, acronyms, identifiers) that embedding similarity
+misses. ``hybrid_search`` merges the two rankings with reciprocal-rank
+fusion, and ``pack_context`` fills ``QUERY_CONTEXT_TOKENS`` with the best
+chunks, skipping chunks that mostly repeat text already packed (neighbouring
+chunks share ``INGEST_CHUNK_OVERLAP`` characters).
+"""
+import hashlib
+import os
+import re
+import sqlite3
+
+import longform
+from metrics import stage
+
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "./keyword_index.sqlite3")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # hybrid | vector
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", 60))
+RETRIEVAL_MAX_OVERLAP = float(os.getenv("RETRIEVAL_MAX_OVERLAP", 0.5))
+QUERY_CONTEXT_TOKENS = int(os.getenv("QUERY_CONTEXT_TOKENS", 2000))
+
+BACKFILL_BATCH = 500
+
+
+def _chunk(chunk_id, text, metadata):
+    return {
+        "id": chunk_id,
+        "text": text,
+        "source": metadata.get("source"),
+        "unit": metadata.get("unit", "page"),
+        "page": metadata.get("page"),
+        "offset": metadata.get("offset", 0),
+    }
+
+
+class KeywordIndex:
+    """BM25 full-text index over uploaded chunks, shared by the web process and the job workers."""
+
+    def __init__(self, path=KEYWORD_INDEX_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                " text, id UNINDEXED, source UNINDEXED, unit UNINDEXED, page UNINDEXED, offset UNINDEXED,"
+                " tokenize = 'porter unicode61')"
+            )
+            # FTS5 columns cannot be indexed: chunk and document ids are looked up here, by the FTS rowid.
+            conn.execute("CREATE TABLE IF NOT EXISTS chunk_keys (fts_rowid INTEGER PRIMARY KEY,"
+                         " id TEXT UNIQUE NOT NULL, doc_id TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunk_keys_doc_id ON chunk_keys (doc_id)")
+            if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM chunk_keys)").fetchone()[0]:
+                # An index built before chunk_keys existed, when documents were keyed by file name.
+                conn.execute("INSERT OR IGNORE INTO chunk_keys (fts_rowid, id, doc_id)"
+                             " SELECT rowid, id, source FROM chunks")
+
+    def _connect(self):
+        # A short-lived connection per operation keeps this safe across threads and forks.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, chunks):
+        """Index (chunk_id, text, metadata) triples, replacing chunks with the same id."""
+        rows = [dict(_chunk(chunk_id, text, metadata), doc_id=metadata.get("doc_id", metadata.get("source")))
+                for chunk_id, text, metadata in chunks]
+        with self._connect() as conn:
+            for r in rows:
+                replaced = conn.execute("SELECT fts_rowid FROM chunk_keys WHERE id = ?", (r["id"],)).fetchone()
+                if replaced:
+                    conn.execute("DELETE FROM chunks WHERE rowid = ?", replaced)
+                    conn.execute("DELETE FROM chunk_keys WHERE fts_rowid = ?", replaced)
+                rowid = conn.execute(
+                    "INSERT INTO chunks (text, id, source, unit, page, offset) VALUES (?, ?, ?, ?, ?, ?)",
+                    (r["text"], r["id"], r["source"], r["unit"], r["page"], r["offset"]),
+                ).lastrowid
+                conn.execute("INSERT INTO chunk_keys (fts_rowid, id, doc_id) VALUES (?, ?, ?)",
+                             (rowid, r["id"], r["doc_id"]))
+
+    def delete_document(self, doc_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE rowid IN (SELECT fts_rowid FROM chunk_keys WHERE doc_id = ?)",
+                         (doc_id,))
+            conn.execute("DELETE FROM chunk_keys WHERE doc_id = ?", (doc_id,))
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def search(self, query, k=RETRIEVAL_CANDIDATES):
+        """The k chunks ranked best by BM25 for any of the query's terms."""
+        terms = set(re.findall(r"\w+", query.lower()))
+        if not terms:
+            return []
+        # Quoted terms: user text must never be parsed as FTS5 query syntax.
+        match = " OR ".join(f'"{term}"' for term in sorted(terms))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, text, source, unit, page, offset FROM chunks WHERE chunks MATCH ?"
+                " ORDER BY bm25(chunks) LIMIT ?",
+                (match, k),
+            ).fetchall()
+        return [dict(zip(("id", "text", "source", "unit", "page", "offset"), row)) for row in rows]
+
+    def backfill(self, collection):
+        """Index every chunk already in ``collection`` (documents uploaded before this index existed)."""
+        if self.count():
+            return 0
+        added = 0
+        while True:
+            batch = collection.get(include=["documents", "metadatas"], limit=BACKFILL_BATCH, offset=added)
+            if not batch["ids"]:
+                return added
+            self.add(zip(batch["ids"], batch["documents"], batch["metadatas"]))
+            added += len(batch["ids"])
+
+
+def vector_search(collection, query_embedding, k=RETRIEVAL_CANDIDATES):
+    results = collection.query(query_embeddings=[query_embedding], n_results=k, include=["documents", "metadatas"])
+    return [_chunk(*hit) for hit in zip(results["ids"][0], results["documents"][0], results["metadatas"][0])]
+
+
+def reciprocal_rank_fusion(rankings, k=RETRIEVAL_RRF_K):
+    """Merge ranked chunk lists: each chunk scores the sum of 1 / (k + rank) over the lists it appears in."""
+    scores, chunks = {}, {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            scores[chunk["id"]] = scores.get(chunk["id"], 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(chunk["id"], chunk)
+    return [dict(chunks[i], score=scores[i]) for i in sorted(scores, key=scores.get, reverse=True)]
+
+
+def hybrid_search(query, query_embedding, collection, keyword_index, k=RETRIEVAL_CANDIDATES, mode=RETRIEVAL_MODE):
+    """Candidate chunks for ``query``, best first."""
+    with stage('chroma_query'):
+        rankings = [vector_search(collection, query_embedding, k)]
+    if mode == "hybrid":
+        with stage('keyword_search'):
+            rankings.append(keyword_index.search(query, k))
+    return reciprocal_rank_fusion(rankings)
+
+
+def _overlap(a, b):
+    # Chunk ids are "<document>:<page>:<offset>"; file names are not unique across documents.
+    if a["id"].rsplit(":", 1)[0] != b["id"].rsplit(":", 1)[0]:
+        return 0
+    return max(0, min(a["offset"] + len(a["text"]), b["offset"] + len(b["text"])) - max(a["offset"], b["offset"]))
+
+
+def pack_context(chunks, budget_tokens=QUERY_CONTEXT_TOKENS, max_overlap=RETRIEVAL_MAX_OVERLAP):
+    """Fill ``budget_tokens`` with chunks in rank order. Returns (context text, packed chunks, tokens used)."""
+    packed, seen, used = [], set(), 0
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk["text"].encode("utf-8")).digest()
+        if digest in seen or any(_overlap(chunk, p) > max_overlap * len(chunk["text"]) for p in packed):
+            continue
+        header = f"[{chunk['source']}, {chunk['unit']} {chunk['page']}]\n"
+        tokens = longform.estimate_tokens(header + chunk["text"])
+        if used + tokens > budget_tokens:
+            if packed:
+                continue  # a shorter chunk further down may still fit
+            # Even the best chunk is over budget: keep its beginning.
+            chunk = dict(chunk, text=chunk["text"][:max(0, budget_tokens * longform.CHARS_PER_TOKEN - len(header))])
+            tokens = longform.estimate_tokens(header + chunk["text"])
+        seen.add(digest)
+        packed.append(dict(chunk, header=header))
+        used += tokens
+    context = "\n\n".join(p["header"] + p["text"] for p in packed)
+    return context, packed, used
@@ -0,0 +1,207 @@
+"""Single-flight coalescing of identical in-flight work across worker processes.
+
+When many identical requests (same kind and normalized parameters, e.g. the
+quiz for one video) arrive together, only the first becomes the leader and
+does the work; the rest follow and get the leader's result. The leader holds
+a Redis lock (``SET NX`` with a short TTL that a heartbeat keeps renewing
+while it works) and publishes its result, or its error, on a Redis channel
+and in a short-lived result key. Followers wait for that result for at most
+``SINGLEFLIGHT_WAIT_TIMEOUT`` seconds. If the leader dies (or abandons the
+flight, e.g. its streaming client disconnected), its lock goes away
+and one follower takes over; if the wait times out, the follower does the
+work itself.
+
+Results must be JSON-serializable. Leaders, followers, takeovers and
+timeouts are counted in the Redis hash ``singleflight:stats``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import redis
+
+from artifact_cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+SINGLEFLIGHT_LOCK_TTL = int(os.getenv("SINGLEFLIGHT_LOCK_TTL", 30))
+SINGLEFLIGHT_WAIT_TIMEOUT = int(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", 600))
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", 60))
+
+KEY_PREFIX = "flight:"
+STATS_KEY = "singleflight:stats"
+# How often a waiting follower checks that the leader's lock is still held.
+POLL_INTERVAL = 1.0
+
+
+class LeaderFailed(Exception):
+    """The leader of a flight raised; followers raise this with its message."""
+
+
+class Flight:
+    """A led flight: the lock is renewed until ``finish`` or ``fail`` is called."""
+
+    def __init__(self, group, key):
+        self.group = group
+        self.key = key
+        self.token = uuid.uuid4().hex
+        self._done = threading.Event()
+
+    def _heartbeat(self):
+        while not self._done.wait(self.group.lock_ttl / 3):
+            if not self.group._if_owner(self.key + ":lock", self.token,
+                                        lambda pipe: pipe.expire(self.key + ":lock", self.group.lock_ttl)):
+                return
+
+    def finish(self, result):
+        self._publish({"result": result})
+
+    def fail(self, error):
+        self._publish({"error": str(error)})
+
+    def abandon(self):
+        """Give up leading without an outcome (e.g. the client went away): a follower takes over."""
+        if self._done.is_set():
+            return
+        self._done.set()
+        self.group._if_owner(self.key + ":lock", self.token, lambda pipe: pipe.delete(self.key + ":lock"))
+
+    def _publish(self, outcome):
+        if self._done.is_set():
+            return
+        self._done.set()
+        payload = json.dumps(outcome)
+        try:
+            pipe = self.group.redis.pipeline()
+            pipe.set(self.key + ":result", payload, ex=self.group.result_ttl)
+            pipe.publish(self.key + ":done", payload)
+            pipe.execute()
+            self.group._if_owner(self.key + ":lock", self.token, lambda pipe: pipe.delete(self.key + ":lock"))
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight publish failed: {e}")
+
+
+class SingleFlight:
+    def __init__(self, redis_client, enabled=SINGLEFLIGHT_ENABLED, lock_ttl=SINGLEFLIGHT_LOCK_TTL,
+                 wait_timeout=SINGLEFLIGHT_WAIT_TIMEOUT, result_ttl=SINGLEFLIGHT_RESULT_TTL):
+        self.redis = redis_client
+        self.enabled = enabled
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+
+    def key(self, kind, params):
+        return f"{KEY_PREFIX}{kind}:{fingerprint(params)}"
+
+    def lead(self, kind, params):
+        """Try to become the leader for (kind, params). Returns a Flight, or None if another request leads."""
+        key = self.key(kind, params)
+        flight = Flight(self, key)
+        try:
+            if not self.redis.set(key + ":lock", flight.token, nx=True, ex=self.lock_ttl):
+                return None
+            # A result left over from the previous flight must not be taken for this one's.
+            self.redis.delete(key + ":result")
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight lock failed, running uncoalesced: {e}")
+            return flight
+        threading.Thread(target=flight._heartbeat, daemon=True, name="singleflight-heartbeat").start()
+        self._count("leaders")
+        return flight
+
+    def wait(self, kind, params, timeout=None):
+        """Wait for the current leader of (kind, params).
+
+        Returns {"result": ...} or {"error": ...}, or None when there is no
+        leader any more (it died, or finished before we subscribed and its
+        result expired) or ``timeout`` passed.
+        """
+        key = self.key(kind, params)
+        deadline = time.monotonic() + (self.wait_timeout if timeout is None else timeout)
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(key + ":done")
+            while True:
+                # Checked after subscribing, so a result published in between is not missed.
+                payload = self.redis.get(key + ":result")
+                if payload is not None:
+                    return json.loads(payload)
+                if not self.redis.exists(key + ":lock"):
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    return None
+                message = pubsub.get_message(timeout=min(POLL_INTERVAL, remaining))
+                if message is not None:
+                    return json.loads(message["data"])
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight wait failed: {e}")
+            return None
+        finally:
+            pubsub.close()
+
+    def do(self, kind, params, compute):
+        """Return compute()'s result, running it once for all concurrent identical (kind, params) calls."""
+        if not self.enabled:
+            return compute()
+        deadline = time.monotonic() + self.wait_timeout
+        followed = False
+        while True:
+            flight = self.lead(kind, params)
+            if flight is not None:
+                if followed:
+                    self._count("takeovers")
+                try:
+                    result = compute()
+                except Exception as e:
+                    flight.fail(e)
+                    raise
+                flight.finish(result)
+                return result
+            if not followed:
+                followed = True
+                self._count("followers")
+            remaining = deadline - time.monotonic()
+            outcome = self.wait(kind, params, timeout=remaining) if remaining > 0 else None
+            if outcome is not None:
+                if "error" in outcome:
+                    raise LeaderFailed(outcome["error"])
+                return outcome["result"]
+            if time.monotonic() >= deadline:
+                return compute()
+
+    def _if_owner(self, lock_key, token, action):
+        """Apply ``action(pipeline)`` atomically if ``lock_key`` still holds ``token``."""
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) != token:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                action(pipe)
+                pipe.execute()
+                return True
+        except (redis.WatchError, redis.RedisError):
+            return False
+
+    def _count(self, counter):
+        try:
+            self.redis.hincrby(STATS_KEY, counter, 1)
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {}
+        stats = {name: int(raw.get(name, 0)) for name in ("leaders", "followers", "takeovers", "timeouts")}
+        requests = stats["leaders"] + stats["followers"]
+        stats["coalesced_rate"] = round(stats["followers"] / requests, 4) if requests else None
+        return stats
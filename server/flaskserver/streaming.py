@@ -0,0 +1,123 @@
+"""Helpers for streaming LLM JSON output to clients as server-sent events."""
+import json
+
+import structured
+
+
+class IncrementalJSONParser:
+    """Parse a JSON document that arrives in arbitrary chunks.
+
+    ``feed`` returns ``(path, value)`` for every value that completed within
+    the new text, innermost first. ``path`` is a tuple of object keys and array
+    indexes; the root document completes last with ``path == ()``. Anything
+    before the first ``{``/``[`` (e.g. a ```json fence) is skipped, and the
+    parser stops at the end of the root value.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []  # frames: {"type", "start", "key", "index", "expect_key"}
+        self.started = False
+        self.done = False
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.value_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        while self.pos < len(self.text) and not self.done:
+            self._step(self.text[self.pos], events)
+            self.pos += 1
+        return events
+
+    def _path(self):
+        return tuple(f["key"] if f["type"] == "object" else f["index"] for f in self.stack)
+
+    def _complete(self, start, end, path, events):
+        try:
+            events.append((path, json.loads(self.text[start:end])))
+        except ValueError:
+            pass
+
+    def _step(self, ch, events):
+        if not self.started:
+            if ch in "{[":
+                self.started = True
+                self._open(ch)
+            return
+
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif ch == "\\":
+                self.escape = True
+            elif ch == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    frame = self.stack[-1]
+                    frame["key"] = json.loads(self.text[self.value_start:self.pos + 1])
+                    frame["expect_key"] = False
+                else:
+                    self._complete(self.value_start, self.pos + 1, self._path(), events)
+                self.value_start = None
+            return
+
+        if self.value_start is not None and ch in ",}] \t\r\n":
+            # end of a number / true / false / null
+            self._complete(self.value_start, self.pos, self._path(), events)
+            self.value_start = None
+
+        if ch == '"':
+            top = self.stack[-1]
+            self.in_string = True
+            self.value_start = self.pos
+            self.string_is_key = top["type"] == "object" and top["expect_key"]
+        elif ch in "{[":
+            self._open(ch)
+        elif ch in "}]":
+            frame = self.stack.pop()
+            self._complete(frame["start"], self.pos + 1, self._path(), events)
+            if not self.stack:
+                self.done = True
+        elif ch == ",":
+            top = self.stack[-1]
+            if top["type"] == "object":
+                top["expect_key"] = True
+            else:
+                top["index"] += 1
+        elif ch not in ": \t\r\n" and self.value_start is None:
+            self.value_start = self.pos
+
+    def _open(self, ch):
+        self.stack.append({
+            "type": "object" if ch == "{" else "array",
+            "start": self.pos,
+            "key": None,
+            "index": 0,
+            "expect_key": True,
+        })
+
+
+def stream_json(llm, prompt):
+    """Stream a completion and yield (path, value) as each JSON value completes.
+
+    The final item is always ``((), document)``. If the stream never produced
+    a well-formed document, the whole text is repaired as a last resort and
+    ``document`` is None only when that fails too.
+    """
+    parser = IncrementalJSONParser()
+    for chunk in llm.stream(prompt):
+        text = chunk.content if hasattr(chunk, "content") else str(chunk)
+        for path, value in parser.feed(text):
+            yield path, value
+            if path == ():
+                return
+    yield (), structured.parse_json(parser.text)
+
+
+def sse(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
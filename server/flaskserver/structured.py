@@ -0,0 +1,298 @@
+"""Structured (JSON) output from LLM completions: parse, repair, validate, re-ask.
+
+Every artifact the app asks an LLM for has a schema in ``SCHEMAS`` written in
+a small subset of JSON Schema (type, properties, required, items,
+additionalProperties, minItems, minLength) plus ``answerInOptions`` for
+multiple-choice questions.
+
+``parse_json`` accepts the usual defects of model output: code fences and
+chatter around the document, smart quotes, trailing commas, Python literals
+and a document truncated mid-way. When the parsed document still fails
+validation, ``StructuredOutput.generate`` re-asks with only the previous
+answer and the list of validation errors, instead of the whole original
+prompt, at most ``STRUCTURED_MAX_REASKS`` times.
+
+Per artifact kind, requests, repairs, re-asks, failures and tokens are
+counted in the Redis hash ``structured:stats``.
+"""
+import json
+import logging
+import os
+import re
+
+import redis
+
+import longform
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_MAX_REASKS = int(os.getenv("STRUCTURED_MAX_REASKS", 1))
+STATS_KEY = "structured:stats"
+
+QUESTION = {
+    "type": "object",
+    "required": ["question", "options", "answer"],
+    "properties": {
+        "question": {"type": "string", "minLength": 1},
+        "options": {"type": "array", "minItems": 2, "items": {"type": "string"}},
+        "answer": {"type": "string", "minLength": 1},
+    },
+    "answerInOptions": True,
+}
+QUESTIONS_BY_DIFFICULTY = {"type": "object", "additionalProperties": {"type": "array", "items": QUESTION}}
+
+SCHEMAS = {
+    "quiz": {
+        "type": "object",
+        "required": ["summary", "questions"],
+        "properties": {
+            "summary": {"type": "object", "additionalProperties": {"type": "string"}},
+            "questions": QUESTIONS_BY_DIFFICULTY,
+        },
+    },
+    "topic_quiz": {
+        "type": "object",
+        "required": ["questions"],
+        "properties": {"questions": QUESTIONS_BY_DIFFICULTY},
+    },
+    "summary": {
+        "type": "object",
+        "required": ["summary"],
+        "properties": {"summary": {"type": "object", "additionalProperties": {"type": "string"}}},
+    },
+    "mind_map": {
+        "type": "object",
+        "required": ["topic", "subtopics"],
+        "properties": {
+            "topic": {"type": "string", "minLength": 1},
+            "subtopics": {"type": "array", "items": {
+                "type": "object",
+                "required": ["name", "details"],
+                "properties": {"name": {"type": "string"}, "details": {"type": "array", "items": {"type": "string"}}},
+            }},
+        },
+    },
+    "recommendations": {
+        "type": "object",
+        "required": ["topics"],
+        "properties": {"topics": {"type": "object", "additionalProperties": {
+            "type": "object",
+            "required": ["overview", "recommendations", "youtube_links"],
+            "properties": {
+                "overview": {"type": "string"},
+                "recommendations": {"type": "string"},
+                "youtube_links": {"type": "array", "items": {"type": "string"}},
+            },
+        }}},
+    },
+}
+
+REASK_PROMPT = """
+        Your previous answer did not match the required JSON format. Fix only these problems
+        and return the complete corrected JSON, nothing before or after it:
+        {errors}
+
+        Previous answer:
+        {previous}
+        """
+
+TYPES = {"object": dict, "array": list, "string": str, "number": (int, float), "integer": int, "boolean": bool}
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+class StructuredOutputError(Exception):
+    def __init__(self, kind, errors, raw=None):
+        super().__init__(f"Invalid {kind} output: {'; '.join(errors)}")
+        self.kind = kind
+        self.errors = errors
+        self.raw = raw
+
+
+def validate(schema, value, path="$"):
+    """Return a list of human-readable errors (empty when ``value`` matches ``schema``)."""
+    expected = schema.get("type")
+    if expected and not (isinstance(value, TYPES[expected]) and not (expected != "boolean" and isinstance(value, bool))):
+        return [f"{path} must be {expected}, got {type(value).__name__}"]
+    errors = []
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path} is missing required key '{key}'")
+        properties = schema.get("properties", {})
+        extra = schema.get("additionalProperties")
+        for key, item in value.items():
+            if key in properties:
+                errors += validate(properties[key], item, f"{path}.{key}")
+            elif isinstance(extra, dict):
+                errors += validate(extra, item, f"{path}.{key}")
+        if schema.get("answerInOptions") and isinstance(value.get("options"), list) and value.get("answer") not in value["options"]:
+            errors.append(f"{path}.answer must be exactly one of {path}.options")
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path} must have at least {schema['minItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors += validate(schema["items"], item, f"{path}[{i}]")
+    elif isinstance(value, str) and len(value.strip()) < schema.get("minLength", 0):
+        errors.append(f"{path} must not be empty")
+    return errors
+
+
+def _extract(text):
+    """The text from the first '{' or '[' on, with fences stripped."""
+    text = re.sub(r"```(?:json)?", "", text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return text[min(starts):] if starts else text
+
+
+def _scan(text):
+    """Walk ``text`` as JSON: return (end of the root value or None, open brackets, inside a string)."""
+    stack, in_string, escape = [], False, False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return i + 1, [], False
+    return None, stack, in_string
+
+
+def _outside_strings(text, fn):
+    """Apply ``fn`` to the parts of ``text`` that are not inside JSON strings."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    return "".join(part if i % 2 else fn(part) for i, part in enumerate(parts))
+
+
+def repair_json(text):
+    """Best-effort fix of common LLM JSON defects. Returns the repaired text."""
+    text = _extract(text)
+    if not re.search(r'"\s*:', text):
+        # Smart quotes used as delimiters; inside properly quoted strings they are left alone.
+        text = text.translate(SMART_QUOTES)
+    end, stack, in_string = _scan(text)
+    if end is not None:
+        text = text[:end]
+    else:
+        # Truncated output: close the open string and brackets.
+        text = text.rstrip()
+        if in_string:
+            text += '"'
+        text = re.sub(r",\s*$", "", text)
+        text += "".join(reversed(stack))
+    text = _outside_strings(text, lambda s: re.sub(r",(\s*[}\]])", r"\1", s))
+    text = _outside_strings(text, lambda s: re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", s))))
+    return text
+
+
+def parse_json(text):
+    """Parse a JSON document from LLM output, repairing it if needed. Returns None if hopeless."""
+    document, _ = _parse(text)
+    return document
+
+
+def _parse(text):
+    """Return (document or None, whether a repair was needed)."""
+    try:
+        return json.loads(text), False
+    except (TypeError, ValueError):
+        pass
+    try:
+        return json.loads(repair_json(text)), True
+    except ValueError:
+        pass
+    # Smart quotes may be the delimiters even when some keys are properly quoted.
+    try:
+        return json.loads(repair_json(text.translate(SMART_QUOTES))), True
+    except ValueError:
+        return None, True
+
+
+def _content(response):
+    return getattr(response, 'content', None) or getattr(response, 'text', None) or str(response)
+
+
+def _tokens(response, prompt, content):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage and usage.get('total_tokens'):
+        return usage['total_tokens']
+    return longform.estimate_tokens(prompt) + longform.estimate_tokens(content)
+
+
+class StructuredOutput:
+    def __init__(self, redis_client, max_reasks=STRUCTURED_MAX_REASKS):
+        self.redis = redis_client
+        self.max_reasks = max_reasks
+
+    def generate(self, llm, prompt, kind):
+        """Invoke ``llm`` and return a document valid for ``SCHEMAS[kind]``, or raise StructuredOutputError."""
+        response = llm.invoke(prompt)
+        raw = _content(response)
+        self._count(kind, "requests")
+        self._count(kind, "tokens", _tokens(response, prompt, raw))
+        return self._settle(llm, kind, raw)
+
+    def complete(self, llm, prompt, kind, document):
+        """Validate an already generated (e.g. streamed) document, re-asking if it is invalid or missing."""
+        if document is None:
+            return self.generate(llm, prompt, kind)
+        self._count(kind, "requests")
+        self._count(kind, "tokens", longform.estimate_tokens(prompt) + longform.estimate_tokens(json.dumps(document)))
+        return self._settle(llm, kind, json.dumps(document))
+
+    def _settle(self, llm, kind, raw):
+        schema = SCHEMAS[kind]
+        for attempt in range(self.max_reasks + 1):
+            with stage('json_parse'):
+                document, repaired = _parse(raw)
+                errors = ["the answer is not valid JSON"] if document is None else validate(schema, document)
+            if repaired and document is not None:
+                self._count(kind, "repairs")
+            if not errors:
+                self._count(kind, "success")
+                return document
+            if attempt == self.max_reasks:
+                break
+            logger.warning(f"Re-asking for {kind}: {'; '.join(errors[:5])}")
+            self._count(kind, "reasks")
+            prompt = REASK_PROMPT.format(errors="\n".join(f"- {e}" for e in errors[:20]), previous=raw)
+            response = llm.invoke(prompt)
+            raw = _content(response)
+            self._count(kind, "tokens", _tokens(response, prompt, raw))
+        self._count(kind, "failures")
+        raise StructuredOutputError(kind, errors, raw)
+
+    def _count(self, kind, counter, amount=1):
+        try:
+            self.redis.hincrby(STATS_KEY, f"{kind}:{counter}", amount)
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        try:
+            raw = self.redis.hgetall(STATS_KEY)
+        except redis.RedisError:
+            return {}
+        counters = {}
+        for field, count in raw.items():
+            kind, counter = field.rsplit(":", 1)
+            counters.setdefault(kind, {})[counter] = int(count)
+        stats = {}
+        for kind, c in counters.items():
+            requests, success = c.get("requests", 0), c.get("success", 0)
+            stats[kind] = {
+                **c,
+                "reask_rate": round(c.get("reasks", 0) / requests, 4) if requests else None,
+                "tokens_per_success": round(c.get("tokens", 0) / success) if success else None,
+            }
+        return stats
@@ -0,0 +1,29 @@
+"""Run the app in-process against the benchmark fakes (benchmarks/fakes.py).
+
+    cd server/flaskserver
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def fake_llm():
+    return fakes.install(llm_latency=0.2, tokens_per_second=5000.0, embed_seconds_per_text=0.0)
+
+
+@pytest.fixture(scope="session")
+def app_module(fake_llm):
+    # Uploads, caches and indexes go to a scratch directory.
+    os.chdir(tempfile.mkdtemp(prefix="quicklearn-tests-"))
+    os.environ.setdefault("TTS_MODE", "off")
+    import app
+    fakes.patch_app(app)
+    return app
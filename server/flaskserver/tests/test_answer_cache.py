@@ -0,0 +1,38 @@
+import fakeredis
+import numpy as np
+
+from answer_cache import AnswerCache
+
+
+def embedding(seed, dimension=16):
+    return np.random.default_rng(seed).normal(size=dimension).tolist()
+
+
+def test_log_and_matrix_stay_bounded_under_eviction():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    writer = AnswerCache(client, "v1", max_entries=5)
+    reader = AnswerCache(client, "v1", max_entries=5)  # another worker
+
+    corpus = writer.corpus_version()
+    for n in range(50):
+        writer.set(f"question {n}", embedding(n), f"answer {n}", 1.0, corpus)
+        assert reader.get(embedding(n), corpus)[0] == f"answer {n}"
+
+    prefix = writer._prefix(corpus)
+    assert client.llen(prefix + "log") <= 10
+    assert len(reader._ids) <= 10 and reader._vectors.shape[0] == len(reader._ids)
+    assert writer.stats()["compactions"] > 0
+    assert reader.get(embedding(49), corpus)[0] == "answer 49"
+    assert reader.get(embedding(0), corpus)[0] is None
+
+
+def test_answer_built_before_an_upload_is_not_served_after_it():
+    cache = AnswerCache(fakeredis.FakeRedis(decode_responses=True), "v1")
+    corpus = cache.corpus_version()  # read before retrieval
+    assert cache.get(embedding(1), corpus)[0] is None
+
+    cache.invalidate()  # an upload finishes while the answer is being generated
+    cache.set("question", embedding(1), "stale answer", 1.0, corpus)
+
+    assert cache.get(embedding(1), cache.corpus_version())[0] is None
+    assert cache.get(embedding(1), corpus)[0] == "stale answer"  # filed under the version it was built from
@@ -0,0 +1,43 @@
+import fakeredis
+
+from artifact_cache import ArtifactCache, fingerprint, template_version
+from benchmarks import fixtures
+
+
+def test_equivalent_requests_share_a_fingerprint():
+    params = {"video_id": "dQw4w9WgXcQ", "qno": 5, "difficulty": "Medium"}
+    assert fingerprint(params) == fingerprint({"difficulty": " medium ", "qno": "5", "video_id": "dQw4w9WgXcQ"})
+    assert fingerprint(params) == fingerprint({**params, "topic": None})
+    assert fingerprint(params) != fingerprint({**params, "video_id": "dqw4w9wgxcq"})  # ids are case-sensitive
+    assert fingerprint({"topic": "Linear  Algebra"}) == fingerprint({"topic": "linear algebra"})
+
+
+def test_entries_are_scoped_to_their_template_version_and_invalidated_in_every_worker():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    cache, other_worker = ArtifactCache(client), ArtifactCache(client)
+    v1, v2 = template_version("Make a quiz about {topic}"), template_version("Make a harder quiz about {topic}")
+    quiz = {"questions": [{"question": "2 + 2?", "answer": "4"}]}
+
+    cache.set("quiz", v1, {"topic": "Arithmetic"}, quiz)
+    cache.set("quiz", v1, {"topic": "Algebra"}, quiz)
+    cache.set("mind_map", v1, {"topic": "Algebra"}, quiz)
+    assert other_worker.get("quiz", v1, {"topic": "arithmetic"}) == quiz
+    assert other_worker.get("quiz", v2, {"topic": "Arithmetic"}) is None  # the prompt changed
+
+    assert cache.invalidate("quiz", version=v1, params={"topic": "Arithmetic"}) == 1
+    assert other_worker.get("quiz", v1, {"topic": "Arithmetic"}) is None
+    assert cache.invalidate("quiz") == 1
+    assert other_worker.get("quiz", v1, {"topic": "Algebra"}) is None
+    assert other_worker.get("mind_map", v1, {"topic": "Algebra"}) == quiz
+    assert cache.stats()["quiz"] == {"hits": 1, "misses": 3}
+
+
+def test_repeated_quiz_is_served_without_calling_the_llm(app_module, fake_llm):
+    payload = {"link": fixtures.video_url("A", 10), "qno": 3, "difficulty": "easy"}
+    first, status = app_module.job_queue.run('quiz', payload)
+    assert status == 200
+
+    calls = fake_llm.calls
+    again, status = app_module.job_queue.run('quiz', {**payload, "difficulty": "Easy", "qno": "3"})
+    assert status == 200 and again == first
+    assert fake_llm.calls == calls
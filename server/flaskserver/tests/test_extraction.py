@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import extraction
+from benchmarks import fixtures
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(fixtures.pdf(40))
+    return str(path)
+
+
+def test_bounded_workers_yield_every_page_in_order(pdf_path, monkeypatch):
+    monkeypatch.setattr(extraction, "EXTRACT_RANGE_SIZE", 4)
+    serial = list(extraction.iter_pdf_pages(pdf_path, workers=0))
+    assert [number for number, _ in serial] == list(range(1, 41))
+    assert list(extraction.iter_pdf_pages(pdf_path, workers=1)) == serial
+
+    monkeypatch.setattr(extraction, "EXTRACT_PARALLEL_MIN_PAGES", 10)
+    assert list(extraction.iter_pdf_pages(pdf_path, workers=2)) == serial
+
+
+def test_pool_workers_run_apart_from_the_server_under_a_memory_ceiling():
+    with extraction._pool(1, max_mb=64) as pool:
+        assert pool.submit(os.getpid).result() != os.getpid()
+        assert len(pool.submit(bytearray, 16 * 1024 * 1024).result()) == 16 * 1024 * 1024
+        with pytest.raises(MemoryError):
+            pool.submit(bytearray, 256 * 1024 * 1024).result()
@@ -0,0 +1,81 @@
+import time
+
+import fakeredis
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BACKOFF", 0)  # retries are due at once
+    queue = JobQueue(fakeredis.FakeRedis(decode_responses=True), name="test")
+    calls = []
+
+    @queue.task("echo")
+    def echo(payload, job):
+        calls.append(payload)
+        job.progress("echoing", 50)
+        return {"echo": payload["text"]}, 200
+
+    @queue.task("broken", max_retries=1)
+    def broken(payload, job):
+        calls.append(payload)
+        raise RuntimeError("upstream exploded")
+
+    queue.calls = calls
+    return queue
+
+
+def test_submitted_job_is_claimed_run_and_acknowledged(job_queue):
+    job_id = job_queue.submit("echo", {"text": "hi"})
+    assert job_queue.status(job_id)["status"] == jobs.QUEUED
+
+    assert job_queue.work_once() == job_id
+    job = job_queue.wait(job_id, timeout=1)
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["result"] == {"body": {"echo": "hi"}, "status_code": 200}
+    assert job["progress"] == "50"
+    assert job_queue.redis.llen(job_queue.queue_key) == 0
+    assert job_queue.redis.llen(job_queue.processing_key) == 0  # acknowledged
+
+
+def test_job_of_a_dead_worker_is_reclaimed_after_its_lease_expires(job_queue):
+    job_id = job_queue.submit("echo", {"text": "again"})
+    # A worker claims the job, starts it and dies without renewing the lease.
+    job_queue.redis.brpoplpush(job_queue.queue_key, job_queue.processing_key, timeout=1)
+    key = job_queue.job_key(job_id)
+    job_queue.redis.hincrby(key, "attempts", 1)
+    job_queue.redis.hset(key, mapping={"status": jobs.RUNNING, "lease_until": time.time() + 60})
+
+    job_queue._recover_stalled()
+    assert job_queue.redis.llen(job_queue.queue_key) == 0  # the lease is still valid
+
+    job_queue.redis.hset(key, "lease_until", time.time() - 1)
+    job_queue._recover_stalled()
+    assert job_queue.status(job_id)["status"] == jobs.QUEUED
+    assert job_queue.redis.llen(job_queue.processing_key) == 0
+
+    assert job_queue.work_once() == job_id
+    job = job_queue.status(job_id)
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["attempts"] == "2"
+
+
+def test_job_that_keeps_failing_is_retried_then_dead_lettered(job_queue):
+    job_id = job_queue.submit("broken", {"text": "boom"})
+
+    job_queue.work_once()
+    assert job_queue.status(job_id)["status"] == jobs.QUEUED  # waiting for its retry
+    assert job_queue.dead_letters() == []
+
+    job_queue.work_once()
+    job = job_queue.status(job_id)
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == "upstream exploded"
+    assert len(job_queue.calls) == 2
+
+    [dead] = job_queue.dead_letters()
+    assert dead["id"] == job_id and dead["task"] == "broken"
+    assert dead["attempts"] == "2" and dead["error"] == "upstream exploded"
@@ -0,0 +1,103 @@
+import threading
+
+import fakeredis
+import pytest
+
+import upstream
+from benchmarks import fakes
+from local_llm import LocalModelBusy, LocalModelPool, LocalRouter
+from structured import StructuredOutput
+
+MIND_MAP_PROMPT = "Create a mind map of this lecture."
+TOPIC_QUIZ_PROMPT = "Create a quiz on the topic Algebra. Generate 3 multiple-choice questions of easy difficulty."
+
+
+class Gate(fakes.FakeLLM):
+    """A local model that holds every generate call until ``release`` is set."""
+
+    def __init__(self):
+        super().__init__(latency=0, tokens_per_second=100000)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.batches = []
+
+    def generate(self, prompts, **kwargs):
+        self.batches.append(list(prompts))
+        self.started.set()
+        self.release.wait(5)
+        return super().generate(prompts, **kwargs)
+
+
+@pytest.fixture
+def model():
+    model = Gate()
+    yield model
+    model.release.set()
+
+
+def test_identical_queued_prompts_are_generated_once_and_a_full_queue_is_refused(model):
+    pool = LocalModelPool(lambda: model, size=1, queue_size=3, batch_size=4, batch_wait=0.05).warm()
+    first = pool.submit("warm-up")
+    assert model.started.wait(5)  # the only instance is busy from here on
+
+    queued = [pool.submit(MIND_MAP_PROMPT) for _ in range(2)] + [pool.submit("Quiz me on Algebra.")]
+    with pytest.raises(LocalModelBusy):
+        pool.submit("one too many")
+
+    model.release.set()
+    assert first.result(5) and queued[0].result(5) == queued[1].result(5)
+    assert model.batches[1] == [MIND_MAP_PROMPT, "Quiz me on Algebra."]
+    stats = pool.stats()
+    assert (stats["requests"], stats["rejected"], stats["deduplicated"]) == (4, 1, 1)
+
+
+def test_router_keeps_long_or_unrouted_tasks_on_the_hosted_model():
+    pool = LocalModelPool(lambda: fakes.FakeLLM(latency=0, tokens_per_second=100000), size=1)
+    router = LocalRouter(fakeredis.FakeRedis(decode_responses=True), pool, routes="mind_map:50", enabled=True)
+    structured = StructuredOutput(fakeredis.FakeRedis(decode_responses=True))
+    hosted = fakes.FakeLLM(latency=0, tokens_per_second=100000)
+
+    assert router.generate(structured, MIND_MAP_PROMPT, "mind_map", hosted)["topic"]
+    assert hosted.calls == 0
+    router.generate(structured, MIND_MAP_PROMPT + " Transcript: " + "word " * 200, "mind_map", hosted)
+    router.generate(structured, TOPIC_QUIZ_PROMPT, "topic_quiz", hosted)
+    assert hosted.calls == 2
+
+    stats = router.stats()["tasks"]
+    assert stats["mind_map"]["tiers"]["local"]["count"] == 1
+    assert stats["mind_map"]["skipped"]["too_long"] == 1
+    assert stats["topic_quiz"]["skipped"]["no_route"] == 1
+
+
+def test_failed_local_answer_falls_back_to_the_hosted_model():
+    def broken():
+        return fakes.FakeLLM(latency=0, tokens_per_second=100000, error_rate=1.0)
+
+    router = LocalRouter(fakeredis.FakeRedis(decode_responses=True), LocalModelPool(broken, size=1),
+                         routes="mind_map:1500", enabled=True)
+    hosted = fakes.FakeLLM(latency=0, tokens_per_second=100000)
+    document = router.generate(StructuredOutput(fakeredis.FakeRedis(decode_responses=True)), MIND_MAP_PROMPT,
+                               "mind_map", hosted)
+    assert document["topic"] and hosted.calls == 1
+    tiers = router.stats()["tasks"]["mind_map"]["tiers"]
+    assert tiers["local_failed"]["count"] == tiers["hosted"]["count"] == 1
+
+
+def test_upstream_falls_back_to_the_local_tier_when_the_hosted_breakers_are_open(monkeypatch):
+    monkeypatch.setattr(upstream, "GPT4ALL_MODEL", "model.gguf")
+    monkeypatch.setattr(upstream, "UPSTREAM_BACKOFF_INTERVAL", 0)
+    upstream.reset()
+    hosted = {name: fakes.FakeLLM(latency=0, tokens_per_second=100000, error_rate=1.0) for name in ("groq", "gemini")}
+    local = LocalModelPool(lambda: fakes.FakeLLM(latency=0, tokens_per_second=100000), size=1).client()
+    llm = upstream.UpstreamLLM(["groq", "gemini", "gpt4all"], hedge=False)
+    llm._client = lambda name: local if name == "gpt4all" else hosted[name]
+    try:
+        for _ in range(upstream.UPSTREAM_BREAKER_FAILURES):
+            assert llm.invoke(MIND_MAP_PROMPT).provider == "gpt4all"
+        assert all(upstream.provider(name).breaker.state == upstream.OPEN for name in hosted)
+
+        calls = {name: fake.calls for name, fake in hosted.items()}
+        assert llm.invoke(MIND_MAP_PROMPT).provider == "gpt4all"
+        assert {name: fake.calls for name, fake in hosted.items()} == calls  # not even tried
+    finally:
+        upstream.reset()
@@ -0,0 +1,10 @@
+from benchmarks import fixtures
+
+
+def test_long_quiz_without_qno_uses_the_default(app_module):
+    # The 180-minute fixture goes through longform.summarize_and_quiz.
+    payload = {"link": fixtures.video_url("L", 903), "difficulty": "medium", "force_refresh": True}
+    body, status = app_module.job_queue.run('quiz', payload)
+
+    assert status == 200
+    assert body["questions"]["medium"]
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from recommendations import PREWARM_KEY, RecommendationCache
+
+PREWARM_MAX = 5  # RECOMMENDATION_PREWARM_MAX on the Node side
+
+
+class Drained(Exception):
+    pass
+
+
+class PrewarmRedis(fakeredis.FakeRedis):
+    """Redis whose blocking pop ends the pre-warmer once the list is empty."""
+
+    def brpop(self, keys, timeout=0):
+        item = self.rpop(keys)
+        if item is None:
+            raise Drained
+        return keys, item
+
+
+class Generator:
+    def __init__(self, fail=(), seconds=0.0):
+        self.fail = set(fail)
+        self.seconds = seconds
+        self.topics = []
+        self.running = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, topic):
+        with self._lock:
+            self.topics.append(topic)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        if topic in self.fail:
+            raise RuntimeError(f"no recommendations for {topic}")
+        return {"overview": f"About {topic}", "recommendations": "Practice", "youtube_links": []}
+
+
+def queue_prewarm(client, topic):
+    """What the Node server's queuePrewarm does."""
+    client.pipeline().lpush(PREWARM_KEY, topic).ltrim(PREWARM_KEY, 0, PREWARM_MAX - 1).execute()
+
+
+def test_only_missing_topics_are_generated_in_parallel_and_failures_are_not_cached():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    generate = Generator(fail={"Topology"}, seconds=0.1)
+    cache = RecommendationCache(client, generate, "v1", max_workers=4)
+
+    found, errors = cache.recommendations(["Algebra", "Calculus", "Topology", "Algebra"])
+    assert list(found) == ["Algebra", "Calculus"]
+    assert errors == {"Topology": "no recommendations for Topology"}
+    assert generate.peak == 3
+
+    another_worker = RecommendationCache(client, generate, "v1", max_workers=4)
+    found, _ = another_worker.recommendations(["  algebra ", "Calculus", "Topology"])
+    assert found["  algebra "]["overview"] == "About Algebra"  # same topic, normalized
+    assert generate.topics.count("Algebra") == 1 and generate.topics.count("Calculus") == 1
+    assert generate.topics.count("Topology") == 2
+
+    assert RecommendationCache(client, generate, "v2").get_many(["Algebra"]) == {}  # the prompt changed
+
+
+def test_prewarm_list_keeps_only_the_newest_topics():
+    client = PrewarmRedis(decode_responses=True)
+    generate = Generator()
+    cache = RecommendationCache(client, generate, "v1")
+    cache.recommendations(["Topic 8"])
+    topics = [f"Topic {n}" for n in range(10)]
+    for topic in topics:
+        queue_prewarm(client, topic)
+    assert client.llen(PREWARM_KEY) == PREWARM_MAX
+
+    with pytest.raises(Drained):
+        cache.run_prewarmer(batch_size=3)
+    assert sorted(generate.topics[1:]) == ["Topic 5", "Topic 6", "Topic 7", "Topic 9"]  # Topic 8 was cached
+    assert set(cache.get_many(topics)) == set(topics[5:])
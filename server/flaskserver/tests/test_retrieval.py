@@ -0,0 +1,89 @@
+import longform
+from retrieval import KeywordIndex, hybrid_search, pack_context, reciprocal_rank_fusion
+
+
+def chunk(chunk_id, text="text", offset=0, source="notes.pdf", page=1):
+    return {"id": chunk_id, "text": text, "source": source, "unit": "page", "page": page, "offset": offset}
+
+
+def ids(chunks):
+    return [c["id"] for c in chunks]
+
+
+class Collection:
+    """The part of a Chroma collection vector_search uses; always returns ``hits`` in order."""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def query(self, query_embeddings, n_results, include):
+        hits = self.hits[:n_results]
+        return {"ids": [[h["id"] for h in hits]], "documents": [[h["text"] for h in hits]],
+                "metadatas": [[{k: h[k] for k in ("source", "unit", "page", "offset")} for h in hits]]}
+
+
+def test_rrf_ranks_chunks_found_by_both_retrievers_first():
+    vector = [chunk("a"), chunk("b"), chunk("c")]
+    keyword = [chunk("d"), chunk("c"), chunk("a")]
+    fused = reciprocal_rank_fusion([vector, keyword], k=60)
+
+    assert ids(fused) == ["a", "c", "d", "b"]
+    assert fused[0]["score"] == 1 / 61 + 1 / 63
+    assert fused[1]["score"] == 1 / 63 + 1 / 62
+    assert (fused[2]["score"], fused[3]["score"]) == (1 / 61, 1 / 62)  # single-source hits after both
+
+
+def test_rrf_ties_keep_the_order_the_chunks_were_first_seen():
+    fused = reciprocal_rank_fusion([[chunk("a"), chunk("b")], [chunk("b"), chunk("a")]])
+    assert ids(fused) == ["a", "b"] and fused[0]["score"] == fused[1]["score"]
+    fused = reciprocal_rank_fusion([[chunk("x")], [chunk("y")]])
+    assert ids(fused) == ["x", "y"]
+
+
+def test_a_hit_from_a_single_source_is_kept():
+    assert ids(reciprocal_rank_fusion([[], [chunk("only")]])) == ["only"]
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_keyword_search_finds_exact_terms_and_ignores_query_syntax(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    index.add([
+        ("doc1:1:0", "The Navier-Stokes equations describe viscous flow.", {"source": "fluids.pdf", "doc_id": "doc1"}),
+        ("doc1:2:0", "Bernoulli's principle relates pressure and speed.", {"source": "fluids.pdf", "doc_id": "doc1"}),
+        ("doc2:1:0", "TCP retransmits lost segments.", {"source": "networks.pdf", "doc_id": "doc2"}),
+    ])
+    assert ids(index.search("What do the Navier Stokes equations describe?")) == ["doc1:1:0"]
+    assert ids(index.search('TCP" OR * NOT (')) == ["doc2:1:0"]
+    assert index.search("?!") == []
+
+    index.add([("doc2:1:0", "UDP does not retransmit.", {"source": "networks.pdf", "doc_id": "doc2"})])
+    assert index.search("TCP") == [] and index.count() == 3
+    index.delete_document("doc1")
+    assert index.search("pressure") == [] and index.count() == 1
+
+
+def test_hybrid_search_adds_keyword_hits_the_vectors_missed(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    index.add([("doc:3:0", "The Laplace transform of a step.", {"source": "notes.pdf", "page": 3})])
+    collection = Collection([chunk("doc:1:0", "Signals."), chunk("doc:2:0", "Systems.")])
+
+    assert ids(hybrid_search("Laplace", [0.0], collection, index, mode="vector")) == ["doc:1:0", "doc:2:0"]
+    assert ids(hybrid_search("Laplace", [0.0], collection, index, mode="hybrid")) == ["doc:1:0", "doc:3:0", "doc:2:0"]
+
+
+def test_packing_skips_duplicates_and_overlapping_neighbours_within_the_budget():
+    text = "x" * 400
+    chunks = [chunk("doc:1:0", text), chunk("doc:1:0-copy", text, source="copy.pdf"),
+              chunk("doc:1:300", "y" * 400, offset=300),  # overlaps the first chunk by 100 characters
+              chunk("doc:1:100", "z" * 400, offset=100),  # by 300
+              chunk("doc:2:0", "w" * 4000, page=2), chunk("doc:3:0", "v" * 40, page=3)]
+    context, packed, used = pack_context(chunks, budget_tokens=250, max_overlap=0.5)
+
+    assert ids(packed) == ["doc:1:0", "doc:1:300", "doc:3:0"]  # the 4000-character chunk did not fit
+    assert used <= 250 and context.startswith("[notes.pdf, page 1]\n" + text)
+
+
+def test_an_over_budget_best_chunk_is_truncated():
+    _, packed, used = pack_context([chunk("doc:1:0", "x" * 10000)], budget_tokens=100)
+    assert len(packed) == 1 and used <= 100
+    assert len(packed[0]["text"]) < 100 * longform.CHARS_PER_TOKEN
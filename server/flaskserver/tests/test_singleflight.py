@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import fixtures
+
+
+def quiz_payload(n):
+    return {"link": fixtures.video_url("S", n), "qno": 5, "difficulty": "medium", "force_refresh": True}
+
+
+def test_burst_of_identical_quizzes_calls_the_llm_once(app_module, fake_llm):
+    before = fake_llm.calls
+    assert app_module.job_queue.run('quiz', quiz_payload(900))[1] == 200
+    one_request = fake_llm.calls - before
+
+    before = fake_llm.calls
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: app_module.job_queue.run('quiz', quiz_payload(901)), range(16)))
+
+    assert [status for _, status in results] == [200] * 16
+    assert fake_llm.calls - before == one_request
+
+
+def test_abandoned_stream_leader_hands_over_to_a_follower(app_module):
+    payload = quiz_payload(902)
+    cache_params = {'video_id': fixtures.video_id("S", 902), 'qno': 5, 'difficulty': 'medium'}
+    stream = app_module.stream_quiz_events(payload["link"], 5, 'medium', cache_params, True)
+    next(stream)  # the stream now leads the flight
+    takeovers = app_module.single_flight.stats()["takeovers"]
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        follower = pool.submit(app_module.job_queue.run, 'quiz', payload)
+        time.sleep(0.5)
+        stream.close()  # the streaming client disconnects
+        body, status = follower.result(timeout=30)
+
+    assert status == 200
+    assert body["questions"]["medium"]
+    assert app_module.single_flight.stats()["takeovers"] == takeovers + 1
@@ -0,0 +1,90 @@
+import json
+import time
+
+from benchmarks import fakes
+from streaming import IncrementalJSONParser, stream_json
+
+DOCUMENT = {
+    "summary": {"Limits": "A limit is the value a function approaches."},
+    "questions": {"medium": [{"question": "Which operation undoes differentiation?",
+                              "options": ["Integration", "Addition"], "answer": "Integration"}]},
+    "count": 12,
+    "scores": [1.5, -2e3, True, False, None],
+}
+
+
+def feed_all(chunks):
+    parser = IncrementalJSONParser()
+    return [event for chunk in chunks for event in parser.feed(chunk)]
+
+
+def test_events_do_not_depend_on_how_the_text_is_split():
+    text = json.dumps(DOCUMENT)
+    whole = feed_all([text])
+    assert feed_all(text) == whole  # one character at a time
+    assert feed_all([text[i:i + 7] for i in range(0, len(text), 7)]) == whole
+    assert whole[-1] == ((), DOCUMENT)
+    assert (("summary", "Limits"), DOCUMENT["summary"]["Limits"]) in whole
+    assert (("questions", "medium", 0), DOCUMENT["questions"]["medium"][0]) in whole
+    assert [value for path, value in whole if path[:1] == ("scores",) and len(path) == 2] == DOCUMENT["scores"]
+
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    document = {'say "hi"': 'a \\"quoted\\" } ] , { [ value', "path": "C:\\temp\\", "name": "caf\u00e9 \u2713"}
+    text = json.dumps(document)
+    events = feed_all(text)
+    assert events[-1] == ((), document)
+    assert (('say "hi"',), document['say "hi"']) in events
+    assert (("path",), "C:\\temp\\") in events
+
+
+def test_skips_a_code_fence_and_stops_at_the_end_of_the_root():
+    parser = IncrementalJSONParser()
+    events = parser.feed("Here it is:\n```json\n" + json.dumps(DOCUMENT) + "\n```\n{\"ignored\": 1}")
+    assert events[-1] == ((), DOCUMENT)
+    assert parser.done
+    assert parser.feed('{"more": 2}') == []
+
+
+def test_truncated_root_never_completes_but_inner_values_do():
+    text = json.dumps(DOCUMENT)
+    cut = text.index('"count"')
+    events = feed_all(text[:cut])
+    assert all(path != () for path, _ in events)
+    assert (("summary",), DOCUMENT["summary"]) in events
+
+
+def test_stream_json_repairs_a_truncated_stream():
+    class Truncated:
+        def stream(self, prompt):
+            yield from ['{"topic": "Calculus", "subtopics": [{"name": "Limits"', ', "details": ["approach"']
+
+    events = list(stream_json(Truncated(), "prompt"))
+    assert events[0] == (("topic",), "Calculus")
+    path, document = events[-1]
+    assert path == () and document["topic"] == "Calculus"
+
+
+def test_first_value_arrives_long_before_the_document_completes():
+    llm = fakes.FakeLLM(latency=0.05, tokens_per_second=1000.0)
+    started = time.perf_counter()
+    first = None
+    for path, value in stream_json(llm, "Create a mind map of this lecture."):
+        if first is None:
+            first = time.perf_counter() - started
+    total = time.perf_counter() - started
+
+    assert path == () and len(value["subtopics"]) == 5
+    assert first < total / 3
+
+
+def test_streams_reject_invalid_youtube_urls(app_module):
+    client = app_module.app.test_client()
+    response = client.post("/quiz", json={"link": "https://example.com/not-a-video", "qno": 5,
+                                          "difficulty": "medium", "stream": True})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid YouTube URL"}
+
+    response = client.get("/generate_mind_map", query_string={"video_url": "not a url", "stream": "1"})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid YouTube URL"}
@@ -0,0 +1,80 @@
+import json
+
+import fakeredis
+import pytest
+
+from structured import SCHEMAS, StructuredOutput, StructuredOutputError, parse_json, validate
+
+MIND_MAP = {"topic": "Calculus", "subtopics": [{"name": "Limits", "details": ["approach", "continuity"]}]}
+QUIZ = {"summary": {"Limits": "Values a function approaches."},
+        "questions": {"easy": [{"question": "2 + 2?", "options": ["3", "4"], "answer": "4"}]}}
+
+
+class ScriptedLLM:
+    """Returns the given completions in order and records every prompt."""
+
+    def __init__(self, *completions):
+        self.completions = list(completions)
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return self.completions.pop(0)
+
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + json.dumps(MIND_MAP) + "\n```",
+    "Sure! Here is the mind map:\n" + json.dumps(MIND_MAP, indent=2) + "\nLet me know if you need more.",
+    '{"topic": "Calculus", "subtopics": [{"name": "Limits", "details": ["approach", "continuity",],},],}',
+    "{“topic”: “Calculus”, “subtopics”: [{“name”: “Limits”, “details”: [“approach”, “continuity”]}]}",
+])
+def test_repairs_fenced_chatty_and_sloppy_json(text):
+    assert parse_json(text) == MIND_MAP
+
+
+def test_closes_a_truncated_document():
+    text = json.dumps(MIND_MAP)
+    assert parse_json(text[:text.index("continuity") + 5]) == {
+        "topic": "Calculus", "subtopics": [{"name": "Limits", "details": ["approach", "conti"]}]}
+    assert parse_json('{"topic": "Calculus", "subtopics": [') == {"topic": "Calculus", "subtopics": []}
+    assert parse_json("no json here") is None
+
+
+def test_python_literals_and_brackets_inside_strings():
+    assert parse_json('{"ok": True, "missing": None, "text": "True, [None]}",}') == {
+        "ok": True, "missing": None, "text": "True, [None]}"}
+
+
+def test_validation_reports_every_problem():
+    document = {"summary": {"Limits": 3}, "questions": {"easy": [{"question": "", "options": ["4"], "answer": "5"}]}}
+    assert validate(SCHEMAS["quiz"], document) == [
+        "$.summary.Limits must be string, got int",
+        "$.questions.easy[0].question must not be empty",
+        "$.questions.easy[0].options must have at least 2 items",
+        "$.questions.easy[0].answer must be exactly one of $.questions.easy[0].options",
+    ]
+    assert validate(SCHEMAS["quiz"], QUIZ) == []
+
+
+def test_invalid_answer_is_re_asked_with_only_the_errors_and_the_previous_answer():
+    structured = StructuredOutput(fakeredis.FakeRedis(decode_responses=True))
+    wrong = {"summary": QUIZ["summary"], "questions": {"easy": [{**QUIZ["questions"]["easy"][0], "answer": "5"}]}}
+    llm = ScriptedLLM(json.dumps(wrong), "```json\n" + json.dumps(QUIZ) + "\n```")
+
+    assert structured.generate(llm, "Make a quiz from this very long transcript ...", "quiz") == QUIZ
+    reask = llm.prompts[1]
+    assert "very long transcript" not in reask
+    assert "$.questions.easy[0].answer must be exactly one of" in reask and json.dumps(wrong) in reask
+    stats = structured.stats()["quiz"]
+    assert (stats["requests"], stats["reasks"], stats["repairs"], stats["success"]) == (1, 1, 1, 1)
+
+
+def test_gives_up_after_the_last_re_ask():
+    structured = StructuredOutput(fakeredis.FakeRedis(decode_responses=True), max_reasks=1)
+    llm = ScriptedLLM("I cannot do that.", '{"topic": "Calculus"}')
+
+    with pytest.raises(StructuredOutputError) as error:
+        structured.generate(llm, "Make a mind map", "mind_map")
+    assert error.value.errors == ["$ is missing required key 'subtopics'"]
+    assert "the answer is not valid JSON" in llm.prompts[1]
+    assert structured.stats()["mind_map"]["failures"] == 1
@@ -0,0 +1,52 @@
+import itertools
+import types
+
+import fakeredis
+
+import transcript_store
+from transcript_store import TranscriptStore
+
+ENTRIES = [{"text": "limits", "start": 0.0, "duration": 2.0}, {"text": "derivatives", "start": 2.0, "duration": 3.0}]
+
+
+def test_workers_share_transcripts_and_cleaned_text_is_keyed_by_prompt_version():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    writer, reader = TranscriptStore(client), TranscriptStore(client)  # two workers
+
+    writer.set_raw("abc123def45", "en", ENTRIES)
+    writer.set_language("abc123def45", ["en", "hi"], "en")
+    writer.set_cleaned("abc123def45", "en", "v1", "Limits. Derivatives.")
+
+    assert reader.get_raw("abc123def45", "en") == ENTRIES
+    assert reader.get_raw("abc123def45", "hi") is None
+    assert reader.get_language("abc123def45", ["en", "hi"]) == "en"
+    assert reader.get_language("abc123def45", ["hi", "en"]) is None  # another preference order
+    assert reader.get_cleaned("abc123def45", "en", "v1") == "Limits. Derivatives."
+    assert reader.get_cleaned("abc123def45", "en", "v2") is None  # the cleaner prompt changed
+
+
+def test_least_recently_used_transcripts_are_evicted_everywhere(monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(transcript_store, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    client = fakeredis.FakeRedis(decode_responses=True)
+    store = TranscriptStore(client, max_entries=3)
+    for n in range(3):
+        store.set_raw(f"video{n}", "en", ENTRIES)
+    TranscriptStore(client).get_raw("video0", "en")  # another worker reads the oldest one
+
+    store.set_raw("video3", "en", ENTRIES)
+    assert client.zcard("transcript:index") == 3
+    assert store.get_raw("video1", "en") is None  # gone from Redis and from this worker's LRU
+    assert store.get_raw("video0", "en") == ENTRIES
+
+
+def test_redis_outage_falls_back_to_the_local_cache():
+    server = fakeredis.FakeServer()
+    store = TranscriptStore(fakeredis.FakeRedis(server=server, decode_responses=True))
+    store.set_raw("video0", "en", ENTRIES)
+    server.connected = False  # every Redis call raises ConnectionError from here on
+
+    assert store.get_raw("video0", "en") == ENTRIES
+    assert store.get_raw("video1", "en") is None
+    store.set_raw("video1", "en", ENTRIES)
+    assert store.get_raw("video1", "en") == ENTRIES
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from tts import SpeechWorker, audio_key
+
+
+def test_wait_for_an_unknown_key_returns_at_once(tmp_path):
+    worker = SpeechWorker(cache_dir=str(tmp_path))
+    started = time.monotonic()
+    assert worker.wait(audio_key("never rendered"), timeout=5) is None
+    assert time.monotonic() - started < 0.5
+
+
+def test_wait_follows_a_render_pending_in_another_process(tmp_path):
+    worker = SpeechWorker(cache_dir=str(tmp_path))
+    key = audio_key("rendered elsewhere")
+    worker._mark_pending(key)  # as the rendering process does
+
+    def finish():
+        time.sleep(0.3)
+        (tmp_path / f"{key}.wav").write_bytes(b"RIFF")
+        worker._clear_pending(key)
+
+    threading.Thread(target=finish).start()
+    assert worker.wait(key, timeout=5) == str(tmp_path / f"{key}.wav")
+
+
+class FakeEngine:
+    """Stands in for pyttsx3; writes the file once ``release`` is set."""
+
+    def __init__(self, release):
+        self.release = release
+        self.pending = None
+
+    def save_to_file(self, text, path):
+        self.pending = path
+
+    def runAndWait(self):
+        self.release.wait(5)
+        if self.pending:
+            with open(self.pending, "wb") as f:
+                f.write(b"RIFF")
+            self.pending = None
+
+
+def test_first_render_in_a_fresh_worker_resolves_its_future(tmp_path):
+    release = threading.Event()
+    worker = SpeechWorker(cache_dir=str(tmp_path))
+    worker._new_engine = lambda: FakeEngine(release)
+
+    key = worker.render("first words")
+    future = worker._pending.get(key)
+    assert future is not None  # not discarded when the worker thread started
+    release.set()
+    assert future.result(timeout=5) == worker._cache_path(key)
+    assert worker.wait(key, timeout=5) == worker._cache_path(key)
+
+
+def test_clients_can_turn_speech_off_but_not_on(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "TTS_MODE", "off")
+    assert app_module.tts_mode({"audio": "render"}) == "off"
+    assert app_module.tts_mode({"audio": "speak"}) == "off"
+
+    monkeypatch.setattr(app_module, "TTS_MODE", "render")
+    assert app_module.tts_mode({"audio": "off"}) == "off"
+    assert app_module.tts_mode({"audio": "speak"}) == "render"
+    assert app_module.tts_mode({}) == "render"
@@ -0,0 +1,23 @@
+import io
+
+from benchmarks import fixtures
+
+
+def upload(client, data, name):
+    return client.post("/upload", content_type="multipart/form-data", data={"file": (io.BytesIO(data), name)})
+
+
+def test_identical_bytes_under_another_name_are_not_indexed_again(app_module):
+    client = app_module.app.test_client()
+    data = fixtures.pdf(3)
+
+    first = upload(client, data, "lecture.pdf")
+    assert first.status_code == 200 and first.get_json()["chunks"] > 0
+    second = upload(client, data, "lecture (copy).pdf")
+    assert second.status_code == 200
+    assert second.get_json() == {"message": "File already indexed.", "duplicate_of": "lecture.pdf", "chunks": 0}
+
+    stored = app_module.get_collection().get(where={"source": "lecture.pdf"}, include=["metadatas"])
+    [doc_id] = {metadata["doc_id"] for metadata in stored["metadatas"]}
+    assert all(chunk_id.startswith(doc_id + ":") for chunk_id in stored["ids"])
+    assert all("doc_hash" not in metadata for metadata in stored["metadatas"])
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import upstream
+from benchmarks import fakes
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """Fake Groq and Gemini behind a fresh upstream layer; Groq starts at a limit of 2, with a ceiling of 4."""
+    monkeypatch.setenv("GROQ_POOL_SIZE", "2")
+    monkeypatch.setenv("GROQ_MAX_CONCURRENCY", "4")
+    monkeypatch.setattr(upstream, "UPSTREAM_BACKOFF_INTERVAL", 0)
+    upstream.reset()
+    yield {"groq": fakes.FakeLLM(latency=0.01, tokens_per_second=5000, seed=0),
+           "gemini": fakes.FakeLLM(latency=0.01, tokens_per_second=5000, seed=1)}
+    upstream.reset()
+
+
+def client(providers, hedge=False):
+    llm = upstream.UpstreamLLM(["groq", "gemini"], hedge=hedge)
+    llm._client = providers.get
+    return llm
+
+
+def test_a_429_halves_the_limit_and_successes_raise_it_past_the_start(providers):
+    groq = upstream.provider("groq")
+    llm = upstream.UpstreamLLM(["groq"], hedge=False)
+    llm._client = providers.get
+
+    providers["groq"].error_rate = 1.0
+    with pytest.raises(upstream.UpstreamError):
+        llm.invoke("Hello")
+    assert groq.limiter.limit == 1
+
+    providers["groq"].error_rate = 0.0
+    for _ in range(20):
+        llm.invoke("Hello")
+    assert groq.limiter.limit == 4  # probed above the starting 2, up to GROQ_MAX_CONCURRENCY
+
+
+def test_breaker_opens_lets_one_probe_through_and_closes():
+    breaker = upstream.CircuitBreaker(failures=2, cooldown=0.2)
+    breaker.record(False)
+    assert breaker.state == upstream.CLOSED
+    breaker.record(False)
+    assert breaker.state == upstream.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.25)
+    assert breaker.allow()
+    assert breaker.state == upstream.HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record(True)
+    assert breaker.state == upstream.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = upstream.CircuitBreaker(failures=1, cooldown=0.1)
+    breaker.record(False)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == upstream.OPEN
+    assert not breaker.allow()
+
+
+def test_open_breaker_fails_over_to_the_next_provider(providers):
+    llm = client(providers)
+    providers["groq"].error_rate = 1.0
+    for _ in range(upstream.provider("groq").breaker.threshold):
+        assert llm.invoke("Hello").provider == "gemini"
+    assert upstream.provider("groq").breaker.state == upstream.OPEN
+
+    groq_calls = providers["groq"].calls
+    assert llm.invoke("Hello").provider == "gemini"
+    assert providers["groq"].calls == groq_calls  # not even tried
+    assert upstream.provider("groq").counters["breaker_rejected"] == 1
+    assert upstream.stats()["failovers"] == upstream.provider("groq").breaker.threshold + 1
+
+
+def test_hedge_fires_only_after_the_delay_and_cancels_the_loser(providers, monkeypatch):
+    monkeypatch.setattr(upstream, "HEDGE_MIN_DELAY", 0.2)
+    attempts = []
+
+    class RecordedAttempt(upstream.Attempt):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            attempts.append(self)
+
+    monkeypatch.setattr(upstream, "Attempt", RecordedAttempt)
+    llm = client(providers, hedge=True)
+    for _ in range(upstream.HEDGE_MIN_SAMPLES):
+        llm.invoke("Hello")
+    assert providers["gemini"].calls == 0  # answered well within the hedge delay
+
+    providers["groq"].latency = 1.0
+    attempts.clear()
+    started = time.monotonic()
+    result = llm.invoke("Hello")
+    elapsed = time.monotonic() - started
+
+    assert result.provider == "gemini"
+    assert 0.2 <= elapsed < 0.9
+    primary, hedge = attempts
+    assert hedge.hedge and primary.provider.name == "groq"
+    assert primary.cancelled.is_set()
+    assert upstream.stats()["hedges"] == upstream.stats()["hedge_wins"] == 1
+
+    time.sleep(1.0)  # the loser finishes in the background and frees its slot
+    assert upstream.provider("groq").limiter.inflight == 0
@@ -0,0 +1,82 @@
+import pytest
+
+import youtube
+from benchmarks import fakes
+from youtube import parse_video_id, resolve_transcript
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    VIDEO_ID,
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?feature=share&v={VIDEO_ID}&t=42",
+    f"music.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"youtu.be/{VIDEO_ID}?si=abc&t=10",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}?start=30",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"https://www.youtube.com/v/{VIDEO_ID}",
+    f"  https://www.youtube.com/watch?v={VIDEO_ID}  ",
+])
+def test_parses_every_common_url_form(url):
+    assert parse_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    None,
+    "",
+    "not a url",
+    f"https://example.com/watch?v={VIDEO_ID}",
+    f"https://notyoutube.com/watch?v={VIDEO_ID}",
+    "https://www.youtube.com/watch?v=tooshort",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}extra",
+    "https://www.youtube.com/",
+    "https://youtu.be/",
+    "https://www.youtube.com/embed/",
+    "https://www.youtube.com/channel/UCabcdefghijk",
+])
+def test_rejects_other_urls(url):
+    assert parse_video_id(url) is None
+
+
+class TranscriptApi(fakes.FakeYouTubeTranscriptApi):
+    LANGUAGES = {"english_auto": [("en", True)], "both": [("en", True), ("hi", False)],
+                 "manual_and_auto": [("en", True), ("en", False)], "none": []}
+
+    def list_transcripts(self, video_id):
+        from youtube_transcript_api._errors import TranscriptsDisabled
+
+        self._request()
+        if not self.LANGUAGES[video_id]:
+            raise TranscriptsDisabled(video_id)
+        return [fakes.FakeTranscript(self, video_id, code, generated) for code, generated in self.LANGUAGES[video_id]]
+
+
+@pytest.fixture
+def transcript_api(monkeypatch):
+    api = TranscriptApi(request_seconds=0)
+    monkeypatch.setattr(youtube, "YouTubeTranscriptApi", api)
+    return api
+
+
+def test_resolves_the_preferred_language_with_one_listing_and_one_fetch(transcript_api):
+    entries, language = resolve_transcript("both", ["hi", "en"])
+    assert language == "hi" and entries
+    assert transcript_api.requests == 2
+
+    assert resolve_transcript("english_auto", ["hi", "en"])[1] == "en"
+    assert resolve_transcript("both", ["en", "hi"])[1] == "en"
+
+
+def test_manual_transcripts_win_over_generated_ones_in_the_same_language(transcript_api):
+    transcripts = transcript_api.list_transcripts("manual_and_auto")
+    assert youtube.pick_transcript(transcripts, ["en"]).is_generated is False
+    assert youtube.pick_transcript(transcript_api.list_transcripts("both"), ["en", "hi"]).is_generated is True
+
+
+def test_missing_transcripts_resolve_to_none(transcript_api):
+    assert resolve_transcript("english_auto", ["hi"]) == (None, None)
+    assert resolve_transcript("none", ["en"]) == (None, None)
@@ -0,0 +1,98 @@
+"""Content-addressed store for raw and LLM-cleaned YouTube transcripts.
+
+Entries live in Redis (shared by every worker) with an in-process LRU in
+front. Keys are a hash of (kind, video_id, language, cleaner version), so
+changing the cleaner prompt version never serves transcripts cleaned by an
+older prompt.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import redis
+
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_TTL = int(os.getenv("TRANSCRIPT_CACHE_TTL", 7 * 24 * 3600))
+TRANSCRIPT_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", 5000))
+LOCAL_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_LOCAL_MAX_ENTRIES", 256))
+LOCAL_MAX_BYTES = int(os.getenv("TRANSCRIPT_LOCAL_MAX_BYTES", 64 * 1024 * 1024))
+
+KEY_PREFIX = "transcript:"
+INDEX_KEY = "transcript:index"
+
+
+def transcript_key(kind, video_id, language, version=""):
+    digest = hashlib.sha256(f"{kind}\0{video_id}\0{language}\0{version}".encode()).hexdigest()
+    return KEY_PREFIX + digest
+
+
+class TranscriptStore:
+    def __init__(self, redis_client, ttl=TRANSCRIPT_TTL, max_entries=TRANSCRIPT_MAX_ENTRIES):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = LRUCache(max_entries=LOCAL_MAX_ENTRIES, max_bytes=LOCAL_MAX_BYTES, ttl=ttl)
+
+    def get_raw(self, video_id, language):
+        """Return the cached transcript entries (list of caption dicts) or None."""
+        payload = self._get(transcript_key("raw", video_id, language))
+        return json.loads(payload) if payload is not None else None
+
+    def set_raw(self, video_id, language, entries):
+        self._set(transcript_key("raw", video_id, language), json.dumps(entries))
+
+    def get_cleaned(self, video_id, language, version):
+        return self._get(transcript_key("cleaned", video_id, language, version))
+
+    def set_cleaned(self, video_id, language, version, text):
+        self._set(transcript_key("cleaned", video_id, language, version), text)
+
+    def get_language(self, video_id, languages):
+        """Language previously resolved for a video under this preference order."""
+        return self._get(transcript_key("language", video_id, ",".join(languages)))
+
+    def set_language(self, video_id, languages, language):
+        self._set(transcript_key("language", video_id, ",".join(languages)), language)
+
+    def _get(self, key):
+        payload = self.local.get(key)
+        if payload is not None:
+            return payload
+        try:
+            payload = self.redis.get(key)
+            if payload is not None:
+                self.redis.zadd(INDEX_KEY, {key: time.time()})
+        except redis.RedisError as e:
+            logger.warning(f"Transcript store read failed: {e}")
+            return None
+        if payload is not None:
+            self.local.set(key, payload)
+        return payload
+
+    def _set(self, key, payload):
+        self.local.set(key, payload)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(key, payload, ex=self.ttl)
+            pipe.zadd(INDEX_KEY, {key: time.time()})
+            pipe.execute()
+            self._evict()
+        except redis.RedisError as e:
+            logger.warning(f"Transcript store write failed: {e}")
+
+    def _evict(self):
+        # The index is ordered by last access, so entries that expired through
+        # their TTL sort first and are trimmed before live ones.
+        excess = self.redis.zcard(INDEX_KEY) - self.max_entries
+        if excess <= 0:
+            return
+        stale = [key for key, _ in self.redis.zpopmin(INDEX_KEY, excess)]
+        if stale:
+            self.redis.delete(*stale)
+            for key in stale:
+                self.local.delete(key)
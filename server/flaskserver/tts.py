@@ -0,0 +1,236 @@
+"""Text-to-speech on one long-lived worker thread.
+
+A single pyttsx3 engine is created once and fed from a bounded queue, so
+request threads never wait on audio. When the queue is full the
+``TTS_QUEUE_POLICY`` decides what happens:
+
+* ``drop_new``    - the new utterance is discarded.
+* ``drop_oldest`` - the oldest queued utterance is discarded to make room.
+* ``replace``     - everything queued is discarded; only the newest is spoken.
+
+Besides speaking on the server (``speak``), the worker can render speech to a
+WAV file (``render``) that is returned to the client. Rendered files are
+cached on disk under ``TTS_CACHE_DIR`` keyed by (text hash, voice, rate), so a
+repeated answer is never synthesized twice. While a render is queued or in
+progress a ``<key>.pending`` marker sits next to where its file will be, so
+other worker processes sharing the directory know to wait for it.
+"""
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+TTS_QUEUE_SIZE = int(os.getenv("TTS_QUEUE_SIZE", 8))
+TTS_QUEUE_POLICY = os.getenv("TTS_QUEUE_POLICY", "drop_oldest")  # drop_new | drop_oldest | replace
+TTS_RATE = int(os.getenv("TTS_RATE", 150))
+TTS_VOLUME = float(os.getenv("TTS_VOLUME", 1.0))
+TTS_VOICE = os.getenv("TTS_VOICE")  # pyttsx3 voice id; engine default if unset
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_MAX_FILES = int(os.getenv("TTS_CACHE_MAX_FILES", 500))
+
+
+def audio_key(text, voice=TTS_VOICE, rate=TTS_RATE):
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{text_hash}|{voice or ''}|{rate}".encode("utf-8")).hexdigest()
+
+
+class SpeechWorker:
+    def __init__(self, queue_size=TTS_QUEUE_SIZE, policy=TTS_QUEUE_POLICY, voice=TTS_VOICE,
+                 rate=TTS_RATE, volume=TTS_VOLUME, cache_dir=TTS_CACHE_DIR):
+        if policy not in ("drop_new", "drop_oldest", "replace"):
+            raise ValueError(f"Unknown TTS queue policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._pending = {}  # audio key -> Future for renders queued or in progress
+        self._pid = None
+        self.stats = {"spoken": 0, "rendered": 0, "cache_hits": 0, "dropped": 0, "errors": 0}
+
+    # -- public API ---------------------------------------------------------
+
+    def speak(self, text):
+        """Queue ``text`` to be spoken on the server. Returns False if it was dropped."""
+        return self._enqueue(("speak", text, None))
+
+    def render(self, text):
+        """Queue ``text`` to be rendered to a WAV file and return its audio key.
+
+        Returns immediately; use ``path(key)`` or ``wait(key)`` to get the file.
+        Returns None if the render was dropped because the queue was full.
+        """
+        key = audio_key(text, self.voice, self.rate)
+        path = self._cache_path(key)
+        if os.path.exists(path):
+            os.utime(path)  # eviction is least-recently-used by mtime
+            self.stats["cache_hits"] += 1
+            return key
+        self._ensure_worker()  # first use in this process resets _pending; register after it
+        with self._lock:
+            if key in self._pending:
+                return key
+            future = Future()
+            self._pending[key] = future
+        self._mark_pending(key)
+        if not self._enqueue(("render", text, key)):
+            with self._lock:
+                self._pending.pop(key, None)
+            self._clear_pending(key)
+            return None
+        return key
+
+    def path(self, key):
+        """The cached file for ``key``, or None if it has not been rendered (yet)."""
+        path = self._cache_path(key)
+        return path if os.path.exists(path) else None
+
+    def wait(self, key, timeout=None):
+        """Block until ``key`` is rendered; returns its path, or None if unknown or timed out."""
+        path = self.path(key)
+        if path:
+            return path
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None:
+            # Another worker process may be rendering it; only then watch the shared cache directory.
+            deadline = time.monotonic() + (timeout or 0)
+            while not path and os.path.exists(self._marker_path(key)) and time.monotonic() < deadline:
+                time.sleep(0.2)
+                path = self.path(key)
+            return path
+        try:
+            return future.result(timeout)
+        except Exception:
+            return None
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    # -- worker -------------------------------------------------------------
+
+    def _enqueue(self, job):
+        self._ensure_worker()
+        while True:
+            try:
+                self._queue.put_nowait(job)
+                return True
+            except queue.Full:
+                if self.policy == "drop_new":
+                    self._dropped(job)
+                    return False
+                # drop_oldest frees one slot, replace empties the queue.
+                try:
+                    while True:
+                        self._dropped(self._queue.get_nowait())
+                        if self.policy == "drop_oldest":
+                            break
+                except queue.Empty:
+                    pass
+
+    def _dropped(self, job):
+        kind, _, key = job
+        self.stats["dropped"] += 1
+        logger.warning(f"TTS queue full ({self.policy}); dropped a {kind} request")
+        if key:
+            with self._lock:
+                future = self._pending.pop(key, None)
+            self._clear_pending(key)
+            if future:
+                future.set_exception(RuntimeError("TTS request dropped"))
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a forked worker process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._pending = {}
+                threading.Thread(target=self._run, daemon=True, name="tts-worker").start()
+                self._pid = os.getpid()
+
+    def _new_engine(self):
+        import pyttsx3
+        engine = pyttsx3.init()
+        engine.setProperty('rate', self.rate)
+        engine.setProperty('volume', self.volume)
+        if self.voice:
+            engine.setProperty('voice', self.voice)
+        return engine
+
+    def _run(self):
+        engine = None
+        while True:
+            kind, text, key = self._queue.get()
+            try:
+                if engine is None:
+                    engine = self._new_engine()
+                if kind == "speak":
+                    engine.say(text)
+                    engine.runAndWait()
+                    self.stats["spoken"] += 1
+                else:
+                    self._render(engine, text, key)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Text-to-speech error: {e}")
+                if key:
+                    with self._lock:
+                        future = self._pending.pop(key, None)
+                    self._clear_pending(key)
+                    if future:
+                        future.set_exception(e)
+                # A failed engine may be wedged; start over with a fresh one.
+                engine = None
+
+    def _render(self, engine, text, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(key)
+        tmp_path = f"{path}.tmp.wav"
+        engine.save_to_file(text, tmp_path)
+        engine.runAndWait()
+        os.replace(tmp_path, path)
+        self.stats["rendered"] += 1
+        with self._lock:
+            future = self._pending.pop(key, None)
+        self._clear_pending(key)
+        if future:
+            future.set_result(path)
+        self._evict()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _marker_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pending")
+
+    def _mark_pending(self, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._marker_path(key), "w"):
+            pass
+
+    def _clear_pending(self, key):
+        try:
+            os.remove(self._marker_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".wav")
+                 and ".tmp" not in name]
+        if len(files) <= TTS_CACHE_MAX_FILES:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - TTS_CACHE_MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,507 @@
+"""Resilient upstream layer for LLM calls: limits, deadlines, hedging and failover.
+
+``UpstreamLLM`` is a drop-in LLM client (``invoke``, ``generate_content``,
+``stream``) that sends each call to the first healthy provider of an ordered
+list, by default ``UPSTREAM_PROVIDERS`` = Groq, then Gemini, then a local
+GPT4All model (only when ``GPT4ALL_MODEL`` points at a model file). Replies
+are normalized to objects with ``content``, ``text`` and ``usage_metadata``,
+whatever the provider.
+
+Each provider has, per process:
+
+* an AIMD concurrency limit, starting at the provider's connection pool
+  size: +1/limit per success up to ``<PROVIDER>_MAX_CONCURRENCY`` (twice
+  the pool size by default), halved (at most once per
+  ``UPSTREAM_BACKOFF_INTERVAL``) on 429s, 5xx and timeouts. A call waits at
+  most ``UPSTREAM_QUEUE_TIMEOUT`` for a slot, then moves on to the next
+  provider instead of piling more load on this one;
+* an optional token bucket, ``<PROVIDER>_RPM`` requests per minute;
+* a circuit breaker that opens after ``UPSTREAM_BREAKER_FAILURES``
+  consecutive failures and lets a single probe through after
+  ``UPSTREAM_BREAKER_COOLDOWN`` seconds.
+
+Every call has a deadline (``UPSTREAM_DEADLINE``) shared by all its
+attempts. A non-streaming call still running after the provider's recent
+p95 latency is hedged once: a second attempt goes to the next available
+provider and the first answer wins. The loser is cancelled: dropped if it
+has not started yet, otherwise left to finish in the background, where its
+outcome still updates the provider's limit and breaker.
+A stream can only fail over until its
+first chunk has arrived.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_registry import GPT4ALL_MODEL, max_concurrency, pool_size, registry
+from metrics import error_status, token_usage
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_PROVIDERS = os.getenv("UPSTREAM_PROVIDERS", "groq,gemini,gpt4all").split(",")
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", 180))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", 5))
+UPSTREAM_BACKOFF_INTERVAL = float(os.getenv("UPSTREAM_BACKOFF_INTERVAL", 1))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", 5))
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", 30))
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "1") == "1"
+UPSTREAM_HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", 0.95))
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", 64))
+
+# Hedging needs enough samples for the quantile to mean something, and never fires sooner than this.
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+LATENCY_WINDOW = 200
+BACKOFF_FACTOR = 0.5
+
+# Gemini's client has generate_content instead of invoke/stream.
+METHODS = {"gemini": "generate_content"}
+
+SUCCESS, OVERLOAD, ERROR = "success", "overload", "error"
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamError(Exception):
+    """No provider produced an answer within the deadline."""
+
+
+class Completion:
+    """A provider's reply (or stream chunk) in one shape for every provider."""
+
+    def __init__(self, text, provider, usage=(0, 0)):
+        self.content = text
+        self.text = text
+        self.provider = provider
+        self.usage_metadata = {"input_tokens": usage[0], "output_tokens": usage[1],
+                               "total_tokens": usage[0] + usage[1]}
+
+    def __str__(self):
+        return self.content
+
+
+def _text(response):
+    if isinstance(response, str):
+        return response
+    content = getattr(response, "content", None)
+    return content if content is not None else getattr(response, "text", None) or ""
+
+
+def _outcome(error):
+    status = error_status(error)
+    if status == "429" or status.startswith("5") or "timeout" in type(error).__name__.lower():
+        return OVERLOAD
+    return ERROR
+
+
+class AIMDLimiter:
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = max(maximum, initial)
+        self.inflight = 0
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.inflight += 1
+            return True
+
+    def release(self, outcome=None):
+        with self._cond:
+            self.inflight -= 1
+            if outcome == SUCCESS:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == OVERLOAD:
+                self._backoff()
+            self._cond.notify_all()
+
+    def backoff(self):
+        with self._cond:
+            self._backoff()
+
+    def _backoff(self):
+        # One halving per interval: a burst of 429s from one overload episode counts once.
+        now = time.monotonic()
+        if now - self._last_backoff >= UPSTREAM_BACKOFF_INTERVAL:
+            self.limit = max(self.minimum, self.limit * BACKOFF_FACTOR)
+            self._last_backoff = now
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60
+        self.capacity = burst or max(1.0, per_minute / 60)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                delay = (1 - self.tokens) / self.rate
+            if now + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    def __init__(self, failures=UPSTREAM_BREAKER_FAILURES, cooldown=UPSTREAM_BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened < self.cooldown:
+                    return False
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def cancel(self):
+        """The allowed call was not made after all."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.state = CLOSED
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = OPEN
+                self._opened = time.monotonic()
+
+
+class Provider:
+    """Limits, breaker and latency history of one upstream provider in this process."""
+
+    def __init__(self, name):
+        self.name = name
+        self.limiter = AIMDLimiter(pool_size(name), max_concurrency(name))
+        rpm = float(os.getenv(f"{name.upper()}_RPM", 0))
+        self.bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = dict.fromkeys(
+            ("calls", "success", "overload", "errors", "timeouts", "breaker_rejected", "throttled", "shed"), 0)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def admit(self, deadline):
+        """Reserve a slot for one call, waiting at most UPSTREAM_QUEUE_TIMEOUT (and never past ``deadline``)."""
+        if not self.breaker.allow():
+            self.count("breaker_rejected")
+            return False
+        timeout = max(0.0, min(UPSTREAM_QUEUE_TIMEOUT, deadline - time.monotonic()))
+        if self.bucket is not None and not self.bucket.acquire(timeout):
+            self.breaker.cancel()
+            self.count("throttled")
+            return False
+        if not self.limiter.acquire(timeout):
+            self.breaker.cancel()
+            self.count("shed")
+            return False
+        self.count("calls")
+        return True
+
+    def finish(self, outcome, seconds=None, abandoned=False):
+        """Release the slot of a finished call. Calls the caller already gave up on don't count twice."""
+        self.limiter.release(None if abandoned else outcome)
+        if abandoned:
+            return
+        self.breaker.record(outcome == SUCCESS)
+        self.count({SUCCESS: "success", OVERLOAD: "overload", ERROR: "errors"}[outcome])
+        if outcome == SUCCESS and seconds is not None:
+            with self._lock:
+                self.latencies.append(seconds)
+
+    def timed_out(self):
+        """The caller's deadline passed while a call was still running."""
+        self.limiter.backoff()
+        self.breaker.record(False)
+        self.count("timeouts")
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(len(ordered) * UPSTREAM_HEDGE_QUANTILE))])
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            ordered = sorted(self.latencies)
+        return {
+            **counters,
+            "limit": round(self.limiter.limit, 2),
+            "inflight": self.limiter.inflight,
+            "breaker": self.breaker.state,
+            "p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "p95_seconds": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None,
+        }
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_stats = {"hedges": 0, "hedge_wins": 0, "failovers": 0, "exhausted": 0, "deadline_exceeded": 0}
+
+
+def provider(name):
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = Provider(name)
+        return _providers[name]
+
+
+def executor():
+    """The pool running upstream calls; rebuilt in a forked child, whose copy has no threads."""
+    global _executor, _executor_pid
+    with _providers_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix="upstream")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _count(name):
+    with _providers_lock:
+        _stats[name] += 1
+
+
+def configured_providers(names=None):
+    names = names or UPSTREAM_PROVIDERS
+    if isinstance(names, str):
+        names = names.split(",")
+    # The local tier is only available when a model file is configured.
+    return [n.strip() for n in names if n.strip() and (n.strip() != "gpt4all" or GPT4ALL_MODEL)]
+
+
+class Attempt:
+    def __init__(self, provider, hedge=False):
+        self.provider = provider
+        self.hedge = hedge
+        self.abandoned = False
+        self.cancelled = threading.Event()
+
+
+class UpstreamLLM:
+    def __init__(self, providers=None, temperature=0, deadline=UPSTREAM_DEADLINE, hedge=UPSTREAM_HEDGE):
+        self.providers = configured_providers(providers)
+        self.temperature = temperature
+        self.deadline = deadline
+        self.hedge = hedge
+
+    def _client(self, name):
+        return registry.get(name, temperature=self.temperature)
+
+    def _run(self, attempt, prompt, kwargs):
+        name = attempt.provider.name
+        started = time.monotonic()
+        try:
+            response = getattr(self._client(name), METHODS.get(name, "invoke"))(prompt, **kwargs)
+        except Exception as e:
+            attempt.provider.finish(_outcome(e), abandoned=attempt.abandoned)
+            raise
+        attempt.provider.finish(SUCCESS, time.monotonic() - started, abandoned=attempt.abandoned)
+        return Completion(_text(response), name, token_usage(response))
+
+    def _launch(self, remaining, deadline, pending, prompt, kwargs, errors, hedge=False):
+        """Start an attempt on the next provider that admits one. Returns False when none is left."""
+        while remaining:
+            candidate = provider(remaining.pop(0))
+            if candidate.admit(deadline):
+                attempt = Attempt(candidate, hedge)
+                pending[executor().submit(self._run, attempt, prompt, kwargs)] = attempt
+                return True
+            errors.append(f"{candidate.name}: unavailable ({candidate.breaker.state} circuit or saturated)")
+        return False
+
+    def _cancel(self, future, attempt):
+        attempt.cancelled.set()
+        if future.cancel():
+            # Never started: give back the slot (and any half-open probe) admit() reserved.
+            attempt.provider.limiter.release()
+            attempt.provider.breaker.cancel()
+
+    def invoke(self, prompt, **kwargs):
+        started = time.monotonic()
+        deadline = started + self.deadline
+        remaining, pending, errors = list(self.providers), {}, []
+        if not self._launch(remaining, deadline, pending, prompt, kwargs, errors):
+            raise UpstreamError(f"No LLM provider available: {'; '.join(errors)}")
+        hedge_at = None
+        if self.hedge and remaining:
+            delay = next(iter(pending.values())).provider.hedge_delay()
+            hedge_at = started + delay if delay is not None else None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = max(0.0, min(timeout, hedge_at - now))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if self._launch(remaining, deadline, pending, prompt, kwargs, errors, hedge=True):
+                        _count("hedges")
+                continue
+            for future in done:
+                attempt = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{attempt.provider.name}: {e}")
+                    logger.warning(f"LLM call to {attempt.provider.name} failed: {e}")
+                    continue
+                for loser, other in pending.items():
+                    self._cancel(loser, other)
+                if attempt.hedge:
+                    _count("hedge_wins")
+                elif attempt.provider.name != self.providers[0]:
+                    _count("failovers")
+                return result
+            if not pending:
+                hedge_at = None
+                self._launch(remaining, deadline, pending, prompt, kwargs, errors)
+
+        for attempt in pending.values():
+            attempt.abandoned = True
+            attempt.provider.timed_out()
+            errors.append(f"{attempt.provider.name}: no answer within the deadline")
+        _count("deadline_exceeded" if pending else "exhausted")
+        raise UpstreamError(f"LLM call failed on every provider: {'; '.join(errors)}")
+
+    def generate_content(self, prompt, **kwargs):
+        if kwargs.pop("stream", False):
+            return self.stream(prompt, **kwargs)
+        return self.invoke(prompt, **kwargs)
+
+    def _pump(self, attempt, prompt, kwargs, chunks):
+        name = attempt.provider.name
+        started = time.monotonic()
+        outcome = SUCCESS
+        try:
+            client = self._client(name)
+            if name == "gemini":
+                stream = client.generate_content(prompt, stream=True, **kwargs)
+            else:
+                stream = client.stream(prompt, **kwargs)
+            for chunk in stream:
+                if attempt.cancelled.is_set():
+                    break
+                chunks.put(Completion(_text(chunk), name, token_usage(chunk)))
+            chunks.put(None)
+        except Exception as e:
+            outcome = _outcome(e)
+            chunks.put(e)
+        finally:
+            attempt.provider.finish(outcome, time.monotonic() - started, abandoned=attempt.abandoned)
+
+    def stream(self, prompt, **kwargs):
+        deadline = time.monotonic() + self.deadline
+        errors = []
+        for index, name in enumerate(self.providers):
+            candidate = provider(name)
+            if not candidate.admit(deadline):
+                errors.append(f"{name}: unavailable ({candidate.breaker.state} circuit or saturated)")
+                continue
+            attempt = Attempt(candidate)
+            chunks = queue.Queue()
+            executor().submit(self._pump, attempt, prompt, kwargs, chunks)
+            first = True
+            try:
+                while True:
+                    try:
+                        chunk = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        attempt.abandoned = True
+                        attempt.cancelled.set()
+                        candidate.timed_out()
+                        if first:
+                            errors.append(f"{name}: no first chunk within the deadline")
+                            break
+                        raise UpstreamError(f"{name}: stream stalled past the deadline")
+                    if isinstance(chunk, Exception):
+                        if first:
+                            errors.append(f"{name}: {chunk}")
+                            logger.warning(f"LLM stream from {name} failed: {chunk}")
+                            break
+                        raise chunk
+                    if chunk is None:
+                        return
+                    if first and index:
+                        _count("failovers")  # answered by a provider other than the first choice
+                    first = False
+                    yield chunk
+            finally:
+                # Also reached when the consumer stops early: stop pulling from the provider.
+                attempt.cancelled.set()
+        _count("exhausted")
+        raise UpstreamError(f"LLM stream failed on every provider: {'; '.join(errors)}")
+
+
+_clients = {}
+
+
+def upstream_llm(providers=None, temperature=0):
+    """The shared failover client for ``providers`` (default UPSTREAM_PROVIDERS)."""
+    key = (tuple(configured_providers(providers)), temperature)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients.setdefault(key, UpstreamLLM(list(key[0]), temperature))
+    return client
+
+
+def stats():
+    with _providers_lock:
+        providers, calls = dict(_providers), dict(_stats)
+    return {"providers": {name: p.stats() for name, p in providers.items()}, **calls}
+
+
+def reset():
+    """Forget all provider state in this process (limits, breakers, latencies, counters)."""
+    with _providers_lock:
+        _providers.clear()
+        for name in _stats:
+            _stats[name] = 0
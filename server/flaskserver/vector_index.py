@@ -0,0 +1,276 @@
+"""Persistent approximate-nearest-neighbour index behind store_in_faiss.
+
+Vectors and their metadata live in a SQLite table, which is the source of
+truth shared by every worker. The FAISS index (HNSW, IVF-Flat or exact flat,
+chosen with ``VECTOR_INDEX_TYPE``) is an id-mapped view over it. It is
+snapshotted to disk periodically and memory-mapped at startup, then caught
+up with any rows added since the snapshot. Workers pick up each other's
+inserts the same way before every search.
+
+IVF indexes start out as an exact flat index until there are enough vectors
+to train on, and are retrained in the background whenever the corpus has
+grown by ``VECTOR_INDEX_RETRAIN_GROWTH`` since the last training.
+
+The index only serves app.store_in_faiss and app.search_faiss, which no
+route calls yet; /query retrieves from Chroma and the keyword index.
+``python -m benchmarks.vector_index`` measures recall@k and search latency
+per index type.
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")  # hnsw | ivf | flat
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vector_index")
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", 32))
+VECTOR_INDEX_EF_SEARCH = int(os.getenv("VECTOR_INDEX_EF_SEARCH", 64))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 16))
+VECTOR_INDEX_SNAPSHOT_INTERVAL = int(os.getenv("VECTOR_INDEX_SNAPSHOT_INTERVAL", 300))
+VECTOR_INDEX_RETRAIN_GROWTH = float(os.getenv("VECTOR_INDEX_RETRAIN_GROWTH", 2.0))
+
+# FAISS wants roughly 39 training points per IVF list.
+IVF_POINTS_PER_LIST = 39
+IVF_MIN_LISTS = 16
+IVF_MAX_TRAIN_POINTS_PER_LIST = 256
+BATCH_ROWS = 10000
+
+
+def ivf_lists(n):
+    """About 4 * sqrt(n) lists, but never more than the data can train."""
+    return max(1, min(65536, int(4 * math.sqrt(n)), n // IVF_POINTS_PER_LIST))
+
+
+class VectorIndex:
+    def __init__(self, dimension, path=VECTOR_INDEX_PATH, index_type=VECTOR_INDEX_TYPE):
+        if index_type not in ("hnsw", "ivf", "flat"):
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        os.makedirs(path, exist_ok=True)
+        self.dimension = dimension
+        self.index_type = index_type
+        self.db_path = os.path.join(path, "metadata.sqlite3")
+        self.index_path = os.path.join(path, f"{index_type}.faiss")
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._retraining = False
+        self._snapshot_pid = None
+        self._mmapped = False
+
+        self._init_db()
+        self._load()
+        self._catch_up()
+
+    # -- storage ------------------------------------------------------------
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL,"
+                " chunk INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _state(self, conn, name, default=0):
+        row = conn.execute("SELECT value FROM state WHERE name = ?", (f"{self.index_type}:{name}",)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, **values):
+        conn.executemany(
+            "INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)",
+            [(f"{self.index_type}:{k}", v) for k, v in values.items()],
+        )
+
+    def _iter_vectors(self, after_id=0, up_to_id=None):
+        """Yield (ids, vectors) batches from the table in id order."""
+        with self._connect() as conn:
+            while True:
+                query = "SELECT id, vector FROM vectors WHERE id > ?"
+                args = [after_id]
+                if up_to_id is not None:
+                    query += " AND id <= ?"
+                    args.append(up_to_id)
+                rows = conn.execute(query + " ORDER BY id LIMIT ?", [*args, BATCH_ROWS]).fetchall()
+                if not rows:
+                    return
+                ids = np.array([r[0] for r in rows], dtype=np.int64)
+                vectors = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), self.dimension)
+                yield ids, vectors
+                after_id = int(ids[-1])
+
+    # -- index lifecycle ----------------------------------------------------
+
+    def _new_index(self, train_vectors=None):
+        if self.index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dimension, VECTOR_INDEX_HNSW_M)
+            hnsw.hnsw.efSearch = VECTOR_INDEX_EF_SEARCH
+            return faiss.IndexIDMap(hnsw)
+        if self.index_type == "ivf" and train_vectors is not None:
+            nlist = ivf_lists(len(train_vectors))
+            quantizer = faiss.IndexFlatL2(self.dimension)
+            ivf = faiss.IndexIVFFlat(quantizer, self.dimension, nlist)
+            ivf.train(train_vectors)
+            ivf.nprobe = VECTOR_INDEX_NPROBE
+            return ivf
+        # Exact search; also the bootstrap index for IVF until there is enough data to train.
+        return faiss.IndexIDMap(faiss.IndexFlatL2(self.dimension))
+
+    def _load(self):
+        with self._connect() as conn:
+            self._synced_id = self._state(conn, "snapshot_max_id")
+            self._trained_size = self._state(conn, "trained_size")
+        if os.path.exists(self.index_path):
+            try:
+                self.index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._mmapped = True
+            except RuntimeError:
+                self.index = faiss.read_index(self.index_path)
+            logger.info(f"Loaded {self.index_type} vector index with {self.index.ntotal} vectors")
+        else:
+            self.index = self._new_index()
+            self._synced_id = 0
+            self._trained_size = 0
+
+    def _writable(self):
+        # A memory-mapped snapshot is shared read-only; load a private copy before the first write.
+        if self._mmapped:
+            with self._connect() as conn:
+                self._synced_id = self._state(conn, "snapshot_max_id")
+            self.index = faiss.read_index(self.index_path)
+            self._mmapped = False
+
+    def _catch_up(self):
+        """Add rows inserted since this index last synced (by this or another worker)."""
+        with self._connect() as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM vectors").fetchone()[0]
+        if max_id <= self._synced_id:
+            return
+        with self._lock:
+            self._writable()
+            for ids, vectors in self._iter_vectors(after_id=self._synced_id):
+                self.index.add_with_ids(vectors, ids)
+                self._synced_id = int(ids[-1])
+            self._dirty = True
+        self._maybe_retrain()
+
+    # -- public API ---------------------------------------------------------
+
+    def add(self, vectors, filename):
+        """Store vectors (one per chunk of ``filename``) and index them. Returns their ids."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._connect() as conn:
+            ids = [
+                conn.execute(
+                    "INSERT INTO vectors (filename, chunk, vector) VALUES (?, ?, ?)",
+                    (filename, chunk, vector.tobytes()),
+                ).lastrowid
+                for chunk, vector in enumerate(vectors)
+            ]
+        self._ensure_snapshots()
+        self._catch_up()
+        return ids
+
+    def search(self, vector, k=5):
+        """Return up to k (distance, {"id", "filename", "chunk"}) nearest to ``vector``."""
+        self._catch_up()
+        query = np.ascontiguousarray(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            distances, ids = self.index.search(query, k)
+        hits, seen = [], set()
+        for d, i in zip(distances[0], ids[0]):
+            # A crash between writing a snapshot and recording it can re-add a row on catch-up.
+            if i != -1 and i not in seen:
+                seen.add(int(i))
+                hits.append((float(d), int(i)))
+        if not hits:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, filename, chunk FROM vectors WHERE id IN ({','.join('?' * len(hits))})",
+                [i for _, i in hits],
+            )
+            meta = {row[0]: {"id": row[0], "filename": row[1], "chunk": row[2]} for row in rows}
+        return [(d, meta[i]) for d, i in hits if i in meta]
+
+    def __len__(self):
+        return self.index.ntotal
+
+    # -- background work ----------------------------------------------------
+
+    def snapshot(self):
+        """Write the index to disk atomically and record which rows it contains."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = faiss.serialize_index(self.index)
+            synced_id, trained_size = self._synced_id, self._trained_size
+            self._dirty = False
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data.tobytes())
+        os.replace(tmp_path, self.index_path)
+        with self._connect() as conn:
+            self._set_state(conn, snapshot_max_id=synced_id, trained_size=trained_size)
+
+    def _ensure_snapshots(self):
+        if self._snapshot_pid == os.getpid():
+            return
+        self._snapshot_pid = os.getpid()
+        threading.Thread(target=self._snapshot_loop, daemon=True, name="vector-index-snapshot").start()
+
+    def _snapshot_loop(self):
+        while True:
+            time.sleep(VECTOR_INDEX_SNAPSHOT_INTERVAL)
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Vector index snapshot failed: {e}")
+
+    def _maybe_retrain(self):
+        if self.index_type != "ivf" or self._retraining:
+            return
+        total = self._synced_id
+        threshold = max(IVF_MIN_LISTS * IVF_POINTS_PER_LIST, self._trained_size * VECTOR_INDEX_RETRAIN_GROWTH)
+        if total < threshold:
+            return
+        self._retraining = True
+        threading.Thread(target=self._retrain, daemon=True, name="vector-index-retrain").start()
+
+    def _retrain(self):
+        try:
+            build_max_id = self._synced_id
+            sample_size = ivf_lists(build_max_id) * IVF_MAX_TRAIN_POINTS_PER_LIST
+            sample = []
+            for _, vectors in self._iter_vectors(up_to_id=build_max_id):
+                sample.append(vectors)
+                if sum(len(v) for v in sample) >= sample_size:
+                    break
+            train_vectors = np.concatenate(sample)[:sample_size]
+            started = time.perf_counter()
+            index = self._new_index(train_vectors)
+            for ids, vectors in self._iter_vectors(up_to_id=build_max_id):
+                index.add_with_ids(vectors, ids)
+            with self._lock:
+                # Rows added while training ran are copied over before the swap.
+                for ids, vectors in self._iter_vectors(after_id=build_max_id, up_to_id=self._synced_id):
+                    index.add_with_ids(vectors, ids)
+                self.index = index
+                self._mmapped = False
+                self._trained_size = build_max_id
+                self._dirty = True
+            logger.info(f"Retrained IVF index on {len(train_vectors)} of {build_max_id} vectors "
+                        f"({index.nlist} lists) in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Vector index retraining failed: {e}")
+        finally:
+            self._retraining = False
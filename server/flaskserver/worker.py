@@ -0,0 +1,20 @@
+"""Run the background job workers.
+
+    python worker.py [num_workers]
+
+Workers share the app's Redis queue; start the Flask server with
+JOB_SYNC_MODE=queue to have the synchronous endpoints use them as well.
+The process also pre-warms recommendations for topics the Node server
+reports as new (RECOMMENDATION_PREWARM=0 disables it).
+"""
+import os
+import sys
+import threading
+
+from app import job_queue, recommendation_cache
+
+if __name__ == '__main__':
+    num_workers = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("JOB_WORKERS", 2))
+    if os.getenv("RECOMMENDATION_PREWARM", "1") == "1":
+        threading.Thread(target=recommendation_cache.run_prewarmer, daemon=True, name="recommendation-prewarm").start()
+    job_queue.run_workers(num_workers)
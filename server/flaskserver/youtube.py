@@ -0,0 +1,73 @@
+"""YouTube URL parsing and transcript language resolution."""
+import re
+from urllib.parse import parse_qs, urlparse
+
+from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api._errors import CouldNotRetrieveTranscript
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+PATH_PREFIXES = ("embed", "shorts", "live", "v", "e")
+
+
+def parse_video_id(url):
+    """Return the 11-character video id of any common YouTube URL form, or None.
+
+    Handles watch?v=, youtu.be/<id>, /embed/, /shorts/, /live/ and /v/ URLs on
+    any youtube.com subdomain (www, m, music) and youtube-nocookie.com, with
+    or without a scheme, plus bare video ids.
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if VIDEO_ID_RE.match(url):
+        return url
+    if "://" not in url:
+        url = "https://" + url
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if not any(host == h or host.endswith("." + h) for h in YOUTUBE_HOSTS):
+        return None
+
+    segments = [s for s in parsed.path.split("/") if s]
+    if host.endswith("youtu.be"):
+        candidate = segments[0] if segments else None
+    elif segments[:1] == ["watch"] or not segments:
+        candidate = parse_qs(parsed.query).get("v", [None])[0]
+    elif segments[0] in PATH_PREFIXES and len(segments) > 1:
+        candidate = segments[1]
+    else:
+        candidate = parse_qs(parsed.query).get("v", [None])[0]
+
+    return candidate if candidate and VIDEO_ID_RE.match(candidate) else None
+
+
+def pick_transcript(transcripts, languages):
+    """Choose from a TranscriptList by language preference, manual before generated within a language.
+
+    This is the order youtube-transcript-api's own find_transcript uses.
+    """
+    available = list(transcripts)
+    for language in languages:
+        for generated in (False, True):
+            for transcript in available:
+                if transcript.is_generated == generated and transcript.language_code == language:
+                    return transcript
+    return None
+
+
+def resolve_transcript(video_id, languages):
+    """Fetch caption entries in the preferred language with a single listing request.
+
+    Returns (entries, language), or (None, None) when the video has no
+    transcript in any of ``languages``.
+    """
+    try:
+        transcripts = YouTubeTranscriptApi.list_transcripts(video_id)
+        transcript = pick_transcript(transcripts, languages)
+        if transcript is None:
+            return None, None
+        return transcript.fetch(), transcript.language_code
+    except CouldNotRetrieveTranscript:
+        return None, None
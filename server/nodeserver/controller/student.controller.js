@@ -10,6 +10,18 @@ const Teacher = require('../models/teacher.model');
 const Doubt = require('../models/doubt.model');
 const redis = require('../redis.connection');
 const { ChatGroq } = require("@langchain/groq");
+
+// Topics waiting for the flask worker to pre-generate their recommendations. If the
+// worker is down the list would grow without bound, so only the newest are kept.
+const PREWARM_MAX_TOPICS = parseInt(process.env.RECOMMENDATION_PREWARM_MAX || '1000', 10);
+
+async function queuePrewarm(topic) {
+    await redis.multi()
+        .lpush('recommendation:prewarm', topic)
+        .ltrim('recommendation:prewarm', 0, PREWARM_MAX_TOPICS - 1)
+        .exec();
+}
+
 async function storestatics(req, res) {
     try {
         const userId = req.userId;
@@ -33,11 +45,14 @@ async function storestatics(req, res) {
             studentStatistics[topic].push({ pasturl, score, totalscore });
             } else {
             studentStatistics[topic] = [{ pasturl, score, totalscore }];
+            // new topic for this student: let the flask worker pre-generate its recommendations
+            await queuePrewarm(topic);
             }
             await redis.hset(`student:${userId}`, 'statistics', JSON.stringify(studentStatistics));
         } else {
             const studentStatistics = { [topic]: [{ pasturl, score, totalscore }] };
             await redis.hset(`student:${userId}`, 'statistics', JSON.stringify(studentStatistics));
+            await queuePrewarm(topic);
         }
         await redis.expire(`student:${userId}`, 86400); // Set expiration to 1 day (86400 seconds)
 